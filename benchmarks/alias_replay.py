@@ -0,0 +1,137 @@
+"""Replay the weather requests of a log and compare cache hit ratios by key scheme.
+
+Reads the "Weather request for <city>, <country> from IP ..." lines the
+weather view logs and simulates the cache (WEATHER_CACHE_TIMEOUT) under:
+
+  raw      the old keys (lowercased and stripped input)
+  folded   accents, case and whitespace folded
+  aliases  folded, plus the input -> canonical place mapping learned on
+           every miss, with both the input and canonical keys filled
+
+The log does not record which place upstream returned, so for "aliases" a
+country-less input is assumed to resolve to the country most often given
+with the same folded name in the log (the input itself when never given).
+
+Both the JSON lines the file handler writes now and the older text format
+are read. Request lines are sampled (WEATHER_LOG_SAMPLE_RATE), so record
+the log to replay with the rate at 1.
+
+    python benchmarks/alias_replay.py weather_api.log [more.log ...]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather_api.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from weather import locations  # noqa: E402
+
+REQUEST_LINE = re.compile(
+    r'^\w+ (?P<ts>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d+) .*?Weather request for (?P<city>.*), (?P<country>.*?) from IP '
+)
+REQUEST_MESSAGE = re.compile(r'^Weather request for (?P<city>.*), (?P<country>.*?) from IP ')
+
+
+def parse_line(line):
+    """(timestamp, city, country) of a request line, JSON or text, else None"""
+    if line.startswith('{'):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        match = REQUEST_MESSAGE.match(entry.get('message', ''))
+        if match:
+            return datetime.fromisoformat(entry['ts']).timestamp(), match['city'], match['country']
+        return None
+    match = REQUEST_LINE.match(line)
+    if match:
+        ts = datetime.strptime(match['ts'], '%Y-%m-%d %H:%M:%S,%f').timestamp()
+        return ts, match['city'], match['country']
+    return None
+
+
+def read_requests(paths):
+    requests = []
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                request = parse_line(line)
+                if request:
+                    requests.append(request)
+    requests.sort()
+    return requests
+
+
+def raw_key(city, country):
+    key = f"weather:{city.strip().lower()}"
+    if country:
+        key += f":{country.strip().lower()}"
+    return key
+
+
+def simulate(requests, key_for, timeout, canonical_for=None):
+    """Number of hits when every miss fills its key (and its canonical key) for timeout seconds"""
+    expires = {}
+    aliases = {}
+    hits = 0
+    for ts, city, country in requests:
+        query = locations.split_query(city, country)
+        key = aliases.get(query) or key_for(city, country)
+        if expires.get(key, 0) > ts:
+            hits += 1
+            continue
+        expires[key] = ts + timeout
+        if canonical_for is not None:
+            canonical = canonical_for(*query)
+            canonical_key = locations.cache_key(*canonical)
+            expires[canonical_key] = ts + timeout
+            aliases[query] = aliases[canonical] = canonical_key
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('logs', nargs='*', default=['weather_api.log'])
+    parser.add_argument('--timeout', type=float, default=settings.WEATHER_CACHE_TIMEOUT)
+    args = parser.parse_args()
+
+    requests = read_requests(args.logs)
+    if not requests:
+        print("No weather requests found")
+        return
+
+    countries = defaultdict(Counter)
+    for _, city, country in requests:
+        name, folded_country = locations.split_query(city, country)
+        if folded_country:
+            countries[name][folded_country] += 1
+
+    def canonical_for(name, country):
+        if not country and countries[name]:
+            country = countries[name].most_common(1)[0][0]
+        return name, country
+
+    def folded_key(city, country):
+        return locations.cache_key(*locations.split_query(city, country))
+
+    print(f"{len(requests)} requests, cache timeout {args.timeout:.0f}s")
+    for label, key_for, canonical in (('raw', raw_key, None),
+                                      ('folded', folded_key, None),
+                                      ('aliases', folded_key, canonical_for)):
+        hits = simulate(requests, key_for, args.timeout, canonical)
+        print(f"{label:8} hits {hits:6}  misses {len(requests) - hits:6}  hit ratio {hits / len(requests):6.1%}")
+
+
+if __name__ == '__main__':
+    main()
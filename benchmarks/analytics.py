@@ -0,0 +1,116 @@
+"""Per-city report over the weather history: NumPy columnar load vs an ORM loop.
+
+Both compute per-city mean/min/max/std, a trailing rolling mean and z-score
+anomaly flags. Rows go into a throwaway test database (created and dropped
+by the benchmark), spread over --cities cities at 10-minute intervals.
+
+    python benchmarks/analytics.py --rows 1000000
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather_api.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from weather import analytics  # noqa: E402
+from weather.models import WeatherQuery  # noqa: E402
+
+START = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def populate(rows: int, cities: int, batch: int = 20000) -> None:
+    rng = random.Random(42)
+    names = [f"BenchCity{i}" for i in range(cities)]
+    for offset in range(0, rows, batch):
+        WeatherQuery.objects.bulk_create([
+            WeatherQuery(city=names[i % cities], country='BR', temperature=round(rng.gauss(22, 5), 1),
+                         description='bench', humidity=60, pressure=1013, wind_speed=3.0,
+                         timestamp=START + timedelta(minutes=10 * (i // cities)))
+            for i in range(offset, min(offset + batch, rows))
+        ])
+
+
+def naive_report(window: int, threshold: float) -> dict:
+    """What the analytics module replaces: one model instance per row, Python arithmetic"""
+    samples = defaultdict(list)
+    for query in WeatherQuery.objects.order_by('city', 'country', 'timestamp'):
+        samples[(query.city, query.country or '')].append(query.temperature)
+
+    report = {}
+    for place, values in samples.items():
+        mean = sum(values) / len(values)
+        std = math.sqrt(sum((v - mean) ** 2 for v in values) / len(values))
+        recent, total = deque(), 0.0
+        for value in values:
+            recent.append(value)
+            total += value
+            if len(recent) > window:
+                total -= recent.popleft()
+        anomalies = sum(1 for v in values if std and abs(v - mean) / std >= threshold)
+        report[place] = (len(values), mean, min(values), max(values), std, total / len(recent), anomalies)
+    return report
+
+
+def vectorized_report(window: int, threshold: float) -> dict:
+    result = analytics.report(analytics.load_history(), window, threshold)
+    return {
+        (row['city'], row['country']): (
+            row['samples'], row['temperature']['avg'], row['temperature']['min'], row['temperature']['max'],
+            row['temperature']['std'], row['rolling_avg'], row['anomalies'],
+        )
+        for row in result['cities']
+    }
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--cities', type=int, default=200)
+    parser.add_argument('--window', type=int, default=24)
+    parser.add_argument('--threshold', type=float, default=3.0)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        elapsed, _ = timed(populate, args.rows, args.cities)
+        print(f"{args.rows} rows, {args.cities} cities, {connection.vendor} (inserted in {elapsed:.1f}s)")
+
+        naive_s, naive = timed(naive_report, args.window, args.threshold)
+        load_s, history = timed(analytics.load_history)
+        report_s, _ = timed(analytics.report, history, args.window, args.threshold)
+        vector_s, vector = timed(vectorized_report, args.window, args.threshold)
+
+        for place, expected in naive.items():
+            got = vector[place]
+            assert all(math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9) for a, b in zip(expected, got)), place
+
+        print(f"{'ORM loop':22} {naive_s:7.2f}s")
+        print(f"{'NumPy load + report':22} {vector_s:7.2f}s  ({naive_s / vector_s:.1f}x)")
+        print(f"{'  columnar load':22} {load_s:7.2f}s")
+        print(f"{'  vectorized report':22} {report_s:7.2f}s")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
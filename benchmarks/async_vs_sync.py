@@ -0,0 +1,100 @@
+"""Compare sync (WSGI) and async (ASGI) throughput of the weather endpoint.
+
+Every request is a cache miss for a distinct city, so each one waits on the
+mock upstream. The sync path runs through Django's WSGI handler on a fixed
+pool of threads (like gunicorn --threads); the async path runs through the
+ASGI handler on one event loop.
+
+    python benchmarks/async_vs_sync.py --requests 400 --threads 8 --concurrency 200 --latency 0.1
+
+Uses a throwaway test database for the configured DATABASES backend.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather_api.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import AsyncClient, Client  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from benchmarks.mock_upstream import MockUpstream  # noqa: E402
+from weather.throttling import SlidingWindowThrottle  # noqa: E402
+
+PAYLOAD_CITY = 'BenchCity{}'
+
+
+def run_sync(n: int, threads: int, offset: int) -> float:
+    local = threading.local()
+
+    def post(i):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        response = local.client.post('/api/v1/weather/', {'city': PAYLOAD_CITY.format(offset + i)},
+                                     content_type='application/json')
+        assert response.status_code == 200, response.content
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(post, range(n)))
+    return time.perf_counter() - started
+
+
+async def run_async(n: int, concurrency: int, offset: int) -> float:
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(i):
+        async with semaphore:
+            response = await client.post('/api/v1/weather/async/', {'city': PAYLOAD_CITY.format(offset + i)},
+                                         content_type='application/json')
+            assert response.status_code == 200, response.content
+
+    started = time.perf_counter()
+    await asyncio.gather(*(post(i) for i in range(n)))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=8, help='sync worker threads')
+    parser.add_argument('--concurrency', type=int, default=200, help='async requests in flight')
+    parser.add_argument('--latency', type=float, default=0.1, help='mock upstream latency (s)')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with MockUpstream(latency=args.latency) as upstream, \
+                patch.object(SlidingWindowThrottle, 'allow_request', return_value=True):
+            settings.OPENWEATHER_BASE_URL = upstream.base_url
+            settings.OPENWEATHER_API_KEY = 'benchmark'
+            cache.clear()
+
+            sync_elapsed = run_sync(args.requests, args.threads, 0)
+            async_elapsed = asyncio.run(run_async(args.requests, args.concurrency, args.requests))
+
+            print(f"upstream latency {args.latency * 1000:.0f} ms, {args.requests} misses each")
+            print(f"sync  WSGI  ({args.threads} threads):     {args.requests / sync_elapsed:8.1f} req/s")
+            print(f"async ASGI  ({args.concurrency} in flight):  {args.requests / async_elapsed:8.1f} req/s")
+            print(f"upstream calls: {upstream.hits}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
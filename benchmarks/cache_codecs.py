@@ -0,0 +1,65 @@
+"""Size and speed of the weather cache codecs against plain pickle.
+
+"stored" is what the Django cache backend keeps after pickling the value
+it is given (django_redis and LocMemCache both pickle non-int values).
+
+    python benchmarks/cache_codecs.py --entries 10000
+"""
+import argparse
+import os
+import pickle
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather_api.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.utils import timezone  # noqa: E402
+
+from benchmarks.mock_upstream import fake_weather  # noqa: E402
+from weather import cache_codecs, caching  # noqa: E402
+from weather.services import WeatherService  # noqa: E402
+
+
+def timed(fn, values) -> float:
+    started = time.perf_counter()
+    for value in values:
+        fn(value)
+    return (time.perf_counter() - started) / len(values) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=10000)
+    args = parser.parse_args()
+
+    parse = WeatherService()._parse_weather
+    entries = []
+    for i in range(args.entries):
+        data = parse(fake_weather(f"BenchCity{i}"))
+        data['timestamp'] = timezone.now()
+        entries.append(caching.make_entry(data, 600, 0.1))
+
+    print(f"{args.entries} entries; per entry averages")
+    print(f"{'codec':8} {'stored B':>9} {'encode us':>10} {'decode us':>10}")
+    for name in ('pickle', 'struct', 'msgpack'):
+        try:
+            codec = cache_codecs.get_codec(name)
+        except ImportError:
+            print(f"{name:8} (not installed)")
+            continue
+        encoded = [codec.encode(entry) for entry in entries]
+        # The backend pickles whatever it is given, so that is the stored size and the real cost
+        stored = [pickle.dumps(value, pickle.HIGHEST_PROTOCOL) for value in encoded]
+        size = sum(len(value) for value in stored) / len(stored)
+        encode_us = timed(lambda entry: pickle.dumps(codec.encode(entry), pickle.HIGHEST_PROTOCOL), entries)
+        decode_us = timed(lambda value: codec.decode(pickle.loads(value)), stored)
+        print(f"{name:8} {size:9.1f} {encode_us:10.2f} {decode_us:10.2f}")
+
+
+if __name__ == '__main__':
+    main()
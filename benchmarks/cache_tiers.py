@@ -0,0 +1,67 @@
+"""Hit-path latency of the two weather cache tiers.
+
+Reads the same envelopes through the TieredCache once with L1 populated
+(L1 hits) and once with L1 disabled (L2 hits on the configured Django cache
+backend: LocMemCache in development, Redis in production).
+
+    python benchmarks/cache_tiers.py --keys 200 --reads 20000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather_api.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache import cache, caches  # noqa: E402
+
+from weather import caching  # noqa: E402
+from weather.services import WeatherService  # noqa: E402
+from benchmarks.mock_upstream import fake_weather  # noqa: E402
+
+
+def measure(tiered: caching.TieredCache, keys, reads: int):
+    samples = []
+    for _ in range(reads):
+        key = random.choice(keys)
+        started = time.perf_counter()
+        assert tiered.get(key) is not None
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=200)
+    parser.add_argument('--reads', type=int, default=20000)
+    args = parser.parse_args()
+
+    keys = [f"weather:benchcity{i}:" for i in range(args.keys)]
+    parse = WeatherService()._parse_weather
+    entries = {key: caching.make_entry(parse(fake_weather(f"BenchCity{i}")), 600, 0.1) for i, key in enumerate(keys)}
+    cache.set_many(entries, 600)
+    try:
+        l1 = caching.LocalCache(max_entries=args.keys, max_bytes=64 * 1024 * 1024, ttl=600)
+        with_l1 = caching.TieredCache(cache, l1)
+        with_l1.get_many(keys)  # warm L1
+        l2_only = caching.TieredCache(cache)
+
+        print(f"{args.reads} reads over {args.keys} keys, backend {caches['default'].__class__.__name__}")
+        for label, tiered in (('L1 hit', with_l1), ('L2 hit', l2_only)):
+            p50, p99 = measure(tiered, keys, args.reads)
+            print(f"{label}:  p50 {p50:8.2f} us   p99 {p99:8.2f} us")
+        print(f"L1 stats: {with_l1.stats()}")
+    finally:
+        cache.delete_many(keys)
+
+
+if __name__ == '__main__':
+    main()
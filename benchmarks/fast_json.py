@@ -0,0 +1,76 @@
+"""Throughput of cache hits on /weather/ with and without WEATHER_FAST_JSON.
+
+Requests go through the full WSGI stack (middleware, DRF, throttling
+patched out) for a city already in the cache, one thread.
+
+    python benchmarks/fast_json.py --requests 5000
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather_api.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from benchmarks.mock_upstream import fake_weather  # noqa: E402
+from weather import caching  # noqa: E402
+from weather.services import WeatherService  # noqa: E402
+from weather.throttling import SlidingWindowThrottle  # noqa: E402
+
+
+def run(client: Client, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        response = client.post('/api/v1/weather/', {'city': 'BenchCity', 'country': 'BR'},
+                               content_type='application/json')
+        assert response.status_code == 200, response.content
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    logging.disable(logging.INFO)  # one log line per request would dominate both runs
+    settings.WEATHER_ACCESS_LOG_SINK = 'off'
+    settings.OPENWEATHER_API_KEY = settings.OPENWEATHER_API_KEY or 'benchmark'
+    cache.clear()
+
+    service = WeatherService()
+    data = service._parse_weather(fake_weather('BenchCity,BR'))
+    data['timestamp'] = timezone.now()
+    caching.get_weather_cache().set(
+        service._get_cache_key('BenchCity', 'BR'), caching.make_entry(data, 3600, 0.1), 3600
+    )
+
+    client = Client()
+    with patch.object(SlidingWindowThrottle, 'allow_request', return_value=True):
+        results = {}
+        for fast in (False, True, False, True):
+            settings.WEATHER_FAST_JSON = fast
+            run(client, min(200, args.requests))  # warm up
+            results.setdefault(fast, []).append(run(client, args.requests))
+
+    print(f"{args.requests} cache hits per run, best of 2")
+    for fast, label in ((False, 'serializer + Response'), (True, 'pre-encoded JSON')):
+        elapsed = min(results[fast])
+        print(f"{label:22} {args.requests / elapsed:8.1f} req/s  {elapsed / args.requests * 1e6:7.1f} us/req")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Upstream calls for coordinate traffic, with and without nearby-city reuse.
+
+--cities cities are fetched by name first (their coordinates come from the
+mock upstream), then --requests coordinate lookups are replayed: most within
+--spread km of one of those cities (GPS fixes around town), the rest random
+points over the same area. The baseline is caching per exact coordinate
+(4 decimals), which is what a key on lat/lon without snapping would give.
+
+    python benchmarks/geo_replay.py --cities 100 --requests 20000
+
+Uses a throwaway test database for the configured DATABASES backend.
+"""
+import argparse
+import logging
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather_api.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from benchmarks.mock_upstream import MockUpstream, fake_weather  # noqa: E402
+from weather.geo import KM_PER_DEGREE  # noqa: E402
+from weather.services import WeatherService  # noqa: E402
+
+
+def workload(cities, requests: int, spread_km: float, near_share: float, rng: random.Random):
+    centers = [fake_weather(f"{name},BR")['coord'] for name in cities]
+    lats = [c['lat'] for c in centers]
+    lons = [c['lon'] for c in centers]
+    for _ in range(requests):
+        if rng.random() < near_share:
+            center = rng.choice(centers)
+            distance, bearing = spread_km * math.sqrt(rng.random()), rng.uniform(0, 2 * math.pi)
+            lat = center['lat'] + distance * math.cos(bearing) / KM_PER_DEGREE
+            lon = center['lon'] + distance * math.sin(bearing) / KM_PER_DEGREE / math.cos(math.radians(lat))
+        else:
+            lat, lon = rng.uniform(min(lats), max(lats)), rng.uniform(min(lons), max(lons))
+        yield round(lat, 4), round(lon, 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cities', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--spread', type=float, default=5.0, help='km around a city for nearby requests')
+    parser.add_argument('--near-share', type=float, default=0.9, help='share of requests near a known city')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    logging.disable(logging.INFO)
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with MockUpstream(latency=0) as upstream:
+            settings.OPENWEATHER_BASE_URL = upstream.base_url
+            settings.OPENWEATHER_API_KEY = 'benchmark'
+            settings.WEATHER_ACCESS_LOG_SINK = 'off'
+            settings.WEATHER_GROUP_WINDOW = 0
+            cache.clear()
+
+            service = WeatherService()
+            cities = [f"BenchCity{i}" for i in range(args.cities)]
+            for city in cities:
+                service.get_weather(city, 'BR')
+            warm_hits = upstream.hits
+
+            points = list(workload(cities, args.requests, args.spread, args.near_share, random.Random(7)))
+            cached = sum(service.get_weather_at(lat, lon)[1] for lat, lon in points)
+            geo_calls = upstream.hits - warm_hits
+
+        print(f"{args.requests} coordinate requests, {args.near_share:.0%} within {args.spread} km of "
+              f"{args.cities} known cities; radius {settings.WEATHER_GEO_RADIUS_KM} km, "
+              f"geohash precision {settings.WEATHER_GEO_PRECISION}")
+        print(f"{'per exact coordinate':24} {len(set(points)):7} upstream calls")
+        print(f"{'snapped + nearby reuse':24} {geo_calls:7} upstream calls  "
+              f"({cached / args.requests:.1%} served from cache)")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""Load scenarios against the weather API, with the mock upstream standing in.
+
+Requests go through the full Django stack (test client, WSGI handler) from
+--threads threads; city popularity follows a Zipf distribution over
+--cities cities (exponent --zipf), like real traffic where a few cities
+take most requests. Scenarios:
+
+  cold-start    empty caches, a burst of requests: misses, single-flight
+  sync-view     POST /weather/ from empty caches, misses turning into hits
+  cache-hit     POST /weather/ with every city already cached
+  expiry-storm  every cached city goes stale at the same moment, then a burst
+  history       GET /weather/history/
+
+Each reports throughput, p50/p95/p99/max latency, non-200 responses and
+upstream calls made while the measured requests ran. SQLite serializes
+writers, so point DATABASES at Postgres for representative numbers.
+--output saves the results as JSON (with the git commit), --compare prints
+the change against a previous file:
+
+    python benchmarks/load.py --requests 2000 --output before.json
+    python benchmarks/load.py --requests 2000 --compare before.json
+    python benchmarks/load.py --scenarios cache-hit history --latency 0.2 --error-rate 0.05
+
+Uses a throwaway test database for the configured DATABASES backend.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from itertools import accumulate
+from unittest.mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather_api.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from benchmarks.mock_upstream import MockUpstream  # noqa: E402
+from weather import access_log, caching, locations  # noqa: E402
+from weather.throttling import SlidingWindowThrottle  # noqa: E402
+
+WEATHER_URL = '/api/v1/weather/'
+HISTORY_URL = '/api/v1/weather/history/'
+SCENARIOS = ('cold-start', 'sync-view', 'cache-hit', 'expiry-storm', 'history')
+# Compared between runs, with whether a higher value is better
+COMPARED = (('throughput_rps', True), ('p50_ms', False), ('p95_ms', False), ('p99_ms', False))
+
+
+def zipf_cities(cities: int, requests: int, exponent: float, rng: random.Random):
+    names = [f"BenchCity{rank}" for rank in range(cities)]
+    weights = list(accumulate(1 / (rank + 1) ** exponent for rank in range(cities)))
+    return rng.choices(names, cum_weights=weights, k=requests)
+
+
+def reset_caches() -> None:
+    cache.clear()
+    caching._weather_cache = None
+    locations.clear_local()
+
+
+def warm(cities) -> None:
+    client = Client()
+    for city in sorted(set(cities)):
+        response = client.post(WEATHER_URL, {'city': city}, content_type='application/json')
+        assert response.status_code == 200, response.content
+
+
+def run(items, threads: int, send) -> dict:
+    """Send every item from a pool of threads; latency of each request and the wall time"""
+    local = threading.local()
+    latencies = [0.0] * len(items)
+    failures = [0] * len(items)
+
+    def one(i):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        started = time.perf_counter()
+        status = send(local.client, items[i])
+        latencies[i] = time.perf_counter() - started
+        failures[i] = status != 200
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(len(items))))
+    elapsed = time.perf_counter() - started
+
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(items),
+        'errors': sum(failures),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(items) / elapsed, 1),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'p50_ms': round(cuts[49] * 1000, 3),
+        'p95_ms': round(cuts[94] * 1000, 3),
+        'p99_ms': round(cuts[98] * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3),
+    }
+
+
+def post_weather(client, city) -> int:
+    return client.post(WEATHER_URL, {'city': city}, content_type='application/json').status_code
+
+
+def get_history(client, _) -> int:
+    return client.get(HISTORY_URL).status_code
+
+
+def prepare(name: str, args, cities):
+    """Set up the caches for the scenario; returns the measured requests and how to send them"""
+    reset_caches()
+    if name == 'cold-start':
+        return cities[:args.burst], post_weather
+    if name == 'sync-view':
+        return cities, post_weather
+    if name == 'cache-hit':
+        warm(cities)
+        return cities, post_weather
+    if name == 'expiry-storm':
+        timeout = settings.WEATHER_CACHE_TIMEOUT
+        settings.WEATHER_CACHE_TIMEOUT = 1
+        try:
+            warm(cities)
+        finally:
+            settings.WEATHER_CACHE_TIMEOUT = timeout
+        time.sleep(1.1)
+        return cities[:args.burst], post_weather
+    if name == 'history':
+        warm(cities)
+        return range(args.requests), get_history
+    raise ValueError(name)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def compare(results: dict, baseline: dict) -> None:
+    print(f"\nagainst {baseline['meta'].get('commit')} ({baseline['meta'].get('started_at')})")
+    for name, current in results['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+        if not previous:
+            continue
+        changes = []
+        for key, higher_is_better in COMPARED:
+            before, after = previous[key], current[key]
+            change = (after - before) / before if before else 0.0
+            worse = change < 0 if higher_is_better else change > 0
+            changes.append(f"{key} {before:g} -> {after:g} ({change:+.1%}{' !' if worse and abs(change) > 0.1 else ''})")
+        print(f"{name:13} " + ', '.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=2000, help='requests per scenario')
+    parser.add_argument('--burst', type=int, default=500, help='requests in the cold-start and expiry-storm bursts')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--cities', type=int, default=200)
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of city popularity')
+    parser.add_argument('--latency', type=float, default=0.05, help='mock upstream latency (s)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random upstream latency, up to (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of upstream requests failing')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='results JSON of an earlier run to compare with')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    logging.disable(logging.INFO)
+    cities = zipf_cities(args.cities, args.requests, args.zipf, random.Random(args.seed))
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'started_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'distinct_cities': len(set(cities)),
+            'args': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        },
+        'scenarios': {},
+    }
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with tempfile.TemporaryDirectory() as access_log_dir, \
+                MockUpstream(args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed) as upstream, \
+                patch.object(SlidingWindowThrottle, 'allow_request', return_value=True):
+            settings.OPENWEATHER_BASE_URL = upstream.base_url
+            settings.OPENWEATHER_API_KEY = 'benchmark'
+            settings.WEATHER_ACCESS_LOG_SINK = 'file'
+            settings.WEATHER_ACCESS_LOG_DIR = access_log_dir
+
+            print(f"{args.requests} requests over {len(set(cities))} of {args.cities} cities (zipf {args.zipf}), "
+                  f"{args.threads} threads, upstream {args.latency * 1000:.0f} ms, "
+                  f"{args.error_rate:.0%} errors, {connection.vendor}")
+            for name in args.scenarios:
+                items, send = prepare(name, args, cities)
+                hits = upstream.hits
+                stats = run(items, args.threads, send)
+                stats['upstream_calls'] = upstream.hits - hits
+                results['scenarios'][name] = stats
+                print(f"{name:13} {stats['throughput_rps']:9.1f} req/s  p50 {stats['p50_ms']:8.2f} ms  "
+                      f"p95 {stats['p95_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms  "
+                      f"errors {stats['errors']:4}  upstream {stats['upstream_calls']}")
+            sink = access_log.get_access_sink()
+            if sink:
+                sink.flush()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Local stand-in for the OpenWeatherMap /weather and /group endpoints.
+
+Serves deterministic weather for any ``q=City[,CC]`` after a configurable
+delay (plus optional random jitter), so benchmarks exercise the real HTTP
+client without a network. A share of requests (error_rate) can be answered
+with error_status instead, to exercise retries and the circuit breaker.
+/group answers for IDs previously returned by /weather, and ``lat=..&lon=..``
+with a place named after the 0.1 degree square of the point.
+
+Run on its own to point a real server at it (OPENWEATHER_BASE_URL):
+
+    python benchmarks/mock_upstream.py --port 8081 --latency 0.2 --error-rate 0.01
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_weather(query: str) -> dict:
+    name, _, country = query.partition(',')
+    seed = zlib.crc32(query.lower().encode())
+    return {
+        'id': seed % 10_000_000,
+        'name': name.strip(),
+        'sys': {'country': (country.strip() or 'BR').upper()},
+        'main': {'temp': 10 + seed % 250 / 10, 'humidity': seed % 100, 'pressure': 1000 + seed % 30},
+        'weather': [{'description': 'clear sky'}],
+        'wind': {'speed': seed % 150 / 10},
+        # Somewhere in Brazil, stable per query
+        'coord': {'lat': -30 + seed % 2500 / 100, 'lon': -70 + seed // 2500 % 3500 / 100},
+    }
+
+
+def fake_weather_at(lat: float, lon: float) -> dict:
+    payload = fake_weather(f"Place {lat:.1f} {lon:.1f}")
+    payload['coord'] = {'lat': lat, 'lon': lon}
+    return payload
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits += 1
+            delay = server.latency + (server.rng.uniform(0, server.jitter) if server.jitter else 0)
+            failed = server.error_rate and server.rng.random() < server.error_rate
+            if failed:
+                server.errors += 1
+        time.sleep(delay)
+
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if failed:
+            status, payload = server.error_status, {'cod': server.error_status, 'message': 'injected error'}
+        elif url.path.endswith('/group'):
+            ids = [int(i) for i in params.get('id', [''])[0].split(',') if i]
+            items = [fake_weather(server.known_ids[i]) for i in ids if i in server.known_ids]
+            status, payload = 200, {'cnt': len(items), 'list': items}
+        elif 'lat' in params:
+            status, payload = 200, fake_weather_at(float(params['lat'][0]), float(params['lon'][0]))
+        else:
+            query = params.get('q', [''])[0]
+            status, payload = 200, fake_weather(query)
+            server.known_ids[payload['id']] = query
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MockUpstream:
+    """Threaded fake OpenWeatherMap server running in the background"""
+
+    def __init__(self, latency: float = 0.1, host: str = '127.0.0.1', port: int = 0,
+                 jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 503, seed: int = None):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.request_queue_size = 1024
+        self.server.latency = latency
+        self.server.jitter = jitter
+        self.server.error_rate = error_rate
+        self.server.error_status = error_status
+        self.server.rng = random.Random(seed)
+        self.server.lock = threading.Lock()
+        self.server.hits = 0
+        self.server.errors = 0
+        self.server.known_ids = {}
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def hits(self) -> int:
+        return self.server.hits
+
+    @property
+    def errors(self) -> int:
+        return self.server.errors
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.1, help='seconds per request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with --error-status')
+    parser.add_argument('--error-status', type=int, default=503)
+    args = parser.parse_args()
+
+    upstream = MockUpstream(args.latency, args.host, args.port, jitter=args.jitter,
+                            error_rate=args.error_rate, error_status=args.error_status)
+    print(f"Serving on {upstream.base_url}")
+    try:
+        upstream.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        upstream.server.server_close()
+        print(f"{upstream.hits} requests, {upstream.errors} injected errors")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+"""Gunicorn settings loaded by scripts/start.sh"""
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    # Counters and histograms of a dead worker stay in the totals; only its live gauges go
+    multiprocess.mark_process_dead(worker.pid)
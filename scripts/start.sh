@@ -10,8 +10,19 @@ done
 echo "Banco disponível! Rodando migrações..."
 python3 manage.py migrate --noinput
 
+# Antes do Gunicorn, para o tráfego já encontrar o cache quente. --no-wait para
+# quando o orçamento por minuto da API acaba; o beat completa o restante depois.
+echo "Aquecendo o cache com as cidades mais consultadas..."
+python3 manage.py warm_cache --no-wait || echo "Falha ao aquecer o cache, seguindo com o cache frio"
+
+# Métricas Prometheus: cada worker grava num diretório compartilhado e /metrics soma todos
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 echo "Iniciando Gunicorn..."
 exec gunicorn weather_api.wsgi:application \
+  --config "$(dirname "$0")/gunicorn.conf.py" \
   --bind 0.0.0.0:8000 \
   --workers 3 \
   --log-level info \
@@ -0,0 +1,21 @@
+import pytest
+from weather import access_log, caching, locations
+
+
+@pytest.fixture(autouse=True)
+def clear_local_cache():
+    """Descarta os caches do processo (L1 e aliases), que cache.clear() não alcança"""
+    caching._weather_cache = None
+    locations.clear_local()
+    yield
+    caching._weather_cache = None
+    locations.clear_local()
+
+
+@pytest.fixture(autouse=True)
+def access_log_off(settings):
+    """Sem sink de access log por padrão; os testes que precisam usam um diretório temporário"""
+    settings.WEATHER_ACCESS_LOG_SINK = 'off'
+    access_log._sink = None
+    yield
+    access_log._sink = None
@@ -0,0 +1,141 @@
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from weather import access_log
+from weather.access_log import FileAccessSink
+from weather.models import WeatherAccess
+from weather.services import WeatherService
+
+WEATHER_DATA = {
+    'city': 'São Paulo',
+    'country': 'BR',
+    'temperature': 25.5,
+    'description': 'Clear Sky',
+    'humidity': 60,
+    'pressure': 1013,
+    'wind_speed': 5.2,
+}
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Limpa o cache antes e depois de cada teste"""
+    cache.clear()
+    yield
+    cache.clear()
+
+@pytest.fixture
+def sink(tmp_path):
+    """Sink em arquivo num diretório temporário"""
+    return FileAccessSink(str(tmp_path), buffer_size=1000, flush_interval=3600)
+
+def drain_all(sink):
+    """Drain as if the current time bucket were already closed"""
+    sink.flush()
+    with patch.object(sink, '_bucket', return_value=sink._bucket() + 2):
+        return [entry for batch in sink.drain(100) for entry in batch]
+
+def test_entries_are_buffered_until_full(tmp_path):
+    """Test nothing is written until the buffer fills up"""
+    sink = FileAccessSink(str(tmp_path), buffer_size=3, flush_interval=3600)
+    sink.append({'n': 1})
+    sink.append({'n': 2})
+    assert list(tmp_path.iterdir()) == []
+
+    sink.append({'n': 3})
+    assert len(list(tmp_path.iterdir())) == 1
+
+def test_idle_buffer_is_flushed_in_the_background(tmp_path):
+    """Test buffered entries are written after flush_interval without another append"""
+    sink = FileAccessSink(str(tmp_path), buffer_size=1000, flush_interval=0.05)
+    sink.append({'n': 1})
+
+    deadline = time.monotonic() + 2
+    while not list(tmp_path.iterdir()) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert drain_all(sink) == [{'n': 1}]
+
+def test_file_sink_needs_a_shared_directory(settings):
+    """Test the file sink refuses to start without an explicit WEATHER_ACCESS_LOG_DIR"""
+    settings.WEATHER_ACCESS_LOG_SINK = 'file'
+    settings.WEATHER_ACCESS_LOG_DIR = ''
+    with pytest.raises(ImproperlyConfigured):
+        access_log.get_access_sink()
+
+def test_drain_skips_open_buckets(sink, tmp_path):
+    """Test files of the current bucket are left for later and drained ones removed"""
+    sink.append({'n': 1})
+    assert [batch for batch in sink.drain(100)] == []
+
+    assert drain_all(sink) == [{'n': 1}]
+    assert list(tmp_path.iterdir()) == []
+
+def test_append_is_cheap(sink):
+    """Test the hit path cost of appending an entry stays well under 1 ms"""
+    started = time.perf_counter()
+    with patch('weather.access_log.get_access_sink', return_value=sink):
+        for _ in range(1000):
+            access_log.record(WEATHER_DATA, 'fresh', '127.0.0.1')
+    assert (time.perf_counter() - started) / 1000 < 0.001
+
+def test_async_record_writes_off_the_event_loop(tmp_path):
+    """Test arecord buffers like record and hands the due write to a thread"""
+    sink = FileAccessSink(str(tmp_path), buffer_size=2, flush_interval=3600)
+    writers = []
+    write = sink._write
+
+    def spy(lines):
+        writers.append(threading.get_ident())
+        write(lines)
+
+    async def run():
+        loop_thread = threading.get_ident()
+        with patch('weather.access_log.get_access_sink', return_value=sink), patch.object(sink, '_write', spy):
+            await access_log.arecord(WEATHER_DATA, 'fresh', '127.0.0.1')
+            assert writers == []
+            await access_log.arecord(WEATHER_DATA, 'stale', '127.0.0.1')
+        return loop_thread
+
+    loop_thread = async_to_sync(run)()
+    assert len(writers) == 1 and writers[0] != loop_thread
+    assert [entry['cache_status'] for entry in drain_all(sink)] == ['fresh', 'stale']
+
+@pytest.mark.django_db
+@patch.object(WeatherService, '_fetch_from_api', side_effect=lambda city, country='': dict(WEATHER_DATA))
+def test_hits_and_misses_are_compacted(mock_fetch, sink):
+    """Test every served request ends up in WeatherAccess after compaction"""
+    with patch('weather.access_log.get_access_sink', return_value=sink):
+        service = WeatherService()
+        service.get_weather('São Paulo', 'BR', '127.0.0.1')
+        service.get_weather('São Paulo', 'BR', '127.0.0.2')
+        service.get_weather('São Paulo', 'BR', '127.0.0.3')
+
+        sink.flush()
+        with patch.object(sink, '_bucket', return_value=sink._bucket() + 2):
+            assert access_log.compact() == 3
+
+    statuses = list(WeatherAccess.objects.order_by('id').values_list('cache_status', flat=True))
+    assert statuses == ['refreshed', 'fresh', 'fresh']
+    assert WeatherAccess.objects.filter(ip_address='127.0.0.3').exists()
+
+@pytest.mark.django_db
+def test_failed_compaction_keeps_file_without_duplicates(sink, tmp_path):
+    """Test a file whose insert fails is kept whole and inserted exactly once later"""
+    entry = {'city': 'Recife', 'country': 'BR', 'cache_status': 'fresh', 'ip_address': None, 'ts': time.time()}
+    for _ in range(5):
+        sink.append(entry)
+    sink.flush()
+
+    with patch('weather.access_log.get_access_sink', return_value=sink), \
+            patch.object(sink, '_bucket', return_value=sink._bucket() + 2):
+        with patch.object(WeatherAccess.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+            with pytest.raises(RuntimeError):
+                access_log.compact(batch_size=2)
+        assert len(list(tmp_path.iterdir())) == 1
+
+        assert access_log.compact(batch_size=2) == 5
+    assert WeatherAccess.objects.count() == 5
+    assert list(tmp_path.iterdir()) == []
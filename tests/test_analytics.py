@@ -0,0 +1,107 @@
+import io
+import pytest
+import warnings
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from weather import locations
+from weather.models import WeatherQuery
+
+np = pytest.importorskip('numpy')
+from weather import analytics  # noqa: E402
+
+START = datetime(2025, 7, 30, 12, 0, tzinfo=dt_timezone.utc)
+RECIFE = [28.0, 29.0, 28.0, 29.0, 28.0, 29.0, 28.0, 29.0, 28.0, 40.0]
+
+@pytest.fixture
+def rows():
+    def make(city, hours, temperature):
+        return WeatherQuery(city=city, country='BR', temperature=temperature, description='Test',
+                            humidity=50, pressure=1000, wind_speed=2.0, timestamp=START + timedelta(hours=hours))
+    # Inserted out of order, and interleaved between cities
+    WeatherQuery.objects.bulk_create(
+        [make('Recife', hour, t) for hour, t in reversed(list(enumerate(RECIFE)))]
+        + [make('Curitiba', day * 24, 10.0 + 2 * day) for day in range(3)]
+    )
+
+@pytest.mark.django_db
+def test_load_history_sorted_columns(rows):
+    """Testa o carregamento em arrays ordenados por cidade e horário"""
+    history = analytics.load_history()
+
+    assert len(history) == 13
+    assert history.places == [('Recife', 'BR'), ('Curitiba', 'BR')]
+    assert list(history.counts) == [10, 3]
+    assert list(history.temperature[:10]) == RECIFE
+    assert history.timestamp[0] == START.timestamp()
+    assert np.all(np.diff(history.timestamp[:10]) == 3600)
+
+@pytest.mark.django_db
+def test_group_stats_rolling_mean_and_zscores(rows):
+    """Testa estatísticas por cidade, média móvel sem cruzar cidades e z-scores contra o cálculo ingênuo"""
+    history = analytics.load_history()
+    stats = analytics.group_stats(history)
+
+    assert stats['mean'][0] == pytest.approx(sum(RECIFE) / 10)
+    assert stats['std'][0] == pytest.approx(np.std(RECIFE))
+    assert (stats['min'][1], stats['max'][1]) == (10.0, 14.0)
+    assert stats['trend'][1] == pytest.approx(2.0)
+
+    rolling = analytics.rolling_mean(history, 3)
+    assert rolling[:3] == pytest.approx([28.0, 28.5, 85 / 3])
+    assert rolling[10:] == pytest.approx([10.0, 11.0, 12.0])  # Curitiba starts its own window
+
+    z = analytics.zscores(history, stats)
+    assert z[9] == pytest.approx((40.0 - np.mean(RECIFE)) / np.std(RECIFE))
+
+@pytest.mark.django_db
+def test_report_flags_anomalies(rows):
+    """Testa o relatório com a anomalia de temperatura mais forte"""
+    result = analytics.report(analytics.load_history(city='Recife'), window=3, threshold=2.5)
+
+    [recife] = result['cities']
+    assert (recife['samples'], recife['anomalies']) == (10, 1)
+    [anomaly] = result['anomalies']
+    assert (anomaly['temperature'], anomaly['timestamp']) == (40.0, START + timedelta(hours=9))
+    assert anomaly['rolling_avg'] == pytest.approx(97 / 3)
+
+@pytest.mark.django_db
+def test_analytics_endpoint_and_command(rows):
+    """Testa o endpoint restrito a staff e o comando de análise"""
+    params = {'from': START.isoformat(), 'threshold': 2.5}
+    response = APIClient().get(reverse('weather-analytics'), params)
+    assert response.status_code in (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN)
+
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+    response = client.get(reverse('weather-analytics'), params)
+    assert response.status_code == status.HTTP_200_OK
+    assert [c['city'] for c in response.data['cities']] == ['Recife', 'Curitiba']
+    assert response.data['anomalies'][0]['temperature'] == 40.0
+
+    out = io.StringIO()
+    call_command('analyze_weather_history', '--threshold', '2.5', stdout=out)
+    assert '13 rows, 2 cities' in out.getvalue()
+    assert 'Recife, BR: 40.0' in out.getvalue()
+
+@pytest.mark.django_db
+def test_analyze_command_naive_bounds_and_alias(rows, settings):
+    """Testa o comando com datas sem fuso (no TIME_ZONE) e cidade resolvida pelos aliases"""
+    settings.TIME_ZONE = 'UTC'
+    locations.learn('recife', '', {'id': 3390760, 'name': 'Recife', 'sys': {'country': 'BR'}})
+    out = io.StringIO()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        call_command('analyze_weather_history', '--city', 'recife', '--from', '2025-07-30T14:00:00',
+                     '--to', '2025-07-30T18:00:00', stdout=out)
+
+    assert '4 rows, 1 cities' in out.getvalue()
+
+def test_empty_history():
+    """Testa que um histórico vazio gera um relatório vazio"""
+    history = analytics.History([], np.empty(0, np.int32), np.empty(0), np.empty(0))
+    assert analytics.report(history) == {'cities': [], 'anomalies': []}
@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import AsyncClient
+from django.urls import reverse
+from weather.models import WeatherQuery
+from weather.services import AsyncWeatherService
+from weather.throttling import SlidingWindowThrottle
+
+WEATHER_DATA = {
+    'city': 'São Paulo',
+    'country': 'BR',
+    'temperature': 25.5,
+    'description': 'Clear Sky',
+    'humidity': 60,
+    'pressure': 1013,
+    'wind_speed': 5.2,
+}
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Limpa o cache antes e depois de cada teste"""
+    cache.clear()
+    yield
+    cache.clear()
+
+async def slow_fetch(city, country=''):
+    await asyncio.sleep(0.05)
+    return dict(WEATHER_DATA)
+
+@pytest.mark.django_db
+@patch.object(AsyncWeatherService, '_afetch_from_api', side_effect=slow_fetch)
+def test_async_get_weather_with_cache(mock_fetch):
+    """Test async weather retrieval stores history and then hits the cache"""
+    service = AsyncWeatherService()
+
+    data1, cached1 = async_to_sync(service.get_weather)('São Paulo', 'BR')
+    data2, cached2 = async_to_sync(service.get_weather)('São Paulo', 'BR')
+
+    assert (cached1, cached2) == (False, True)
+    assert data1['temperature'] == data2['temperature'] == 25.5
+    assert mock_fetch.await_count == 1
+    assert WeatherQuery.objects.count() == 1
+
+@pytest.mark.django_db
+@patch.object(AsyncWeatherService, '_afetch_from_api', side_effect=slow_fetch)
+def test_async_concurrent_misses_are_coalesced(mock_fetch):
+    """Test concurrent coroutines for one city make a single upstream call"""
+    async def run():
+        service = AsyncWeatherService()
+        return await asyncio.gather(*(service.get_weather('São Paulo', 'BR') for _ in range(20)))
+
+    results = async_to_sync(run)()
+
+    assert mock_fetch.await_count == 1
+    assert sum(1 for _, cached in results if not cached) == 1
+
+@pytest.mark.django_db
+@patch('weather.views.AsyncWeatherService.get_weather', new_callable=AsyncMock)
+def test_async_view_success(mock_get_weather):
+    """Testa o endpoint assíncrono de clima"""
+    mock_get_weather.return_value = ({**WEATHER_DATA, 'timestamp': '2024-01-01T12:00:00Z'}, False)
+
+    response = async_to_sync(AsyncClient().post)(
+        reverse('current-weather-async'), {'city': 'São Paulo', 'country': 'BR'}, content_type='application/json'
+    )
+
+    assert response.status_code == 200
+    assert response.json()['city'] == 'São Paulo'
+    assert response.json()['cached'] is False
+
+@pytest.mark.django_db
+def test_async_view_invalid_data():
+    """Testa o endpoint assíncrono com dados inválidos"""
+    response = async_to_sync(AsyncClient().post)(
+        reverse('current-weather-async'), {'city': ''}, content_type='application/json'
+    )
+    assert response.status_code == 400
+
+@pytest.mark.django_db
+@patch('weather.views.AsyncWeatherService.get_weather', new_callable=AsyncMock)
+def test_async_view_throttled(mock_get_weather):
+    """Testa que todos os throttles registram a requisição e o 429 traz Retry-After"""
+    mock_get_weather.return_value = ({**WEATHER_DATA, 'timestamp': '2024-01-01T12:00:00Z'}, False)
+    post = async_to_sync(AsyncClient().post)
+    url = reverse('current-weather-async')
+
+    with patch.object(SlidingWindowThrottle, 'parse_rate', return_value=(1, 60)), \
+            patch.object(SlidingWindowThrottle, 'allow_request', autospec=True,
+                         side_effect=SlidingWindowThrottle.allow_request) as allow_request:
+        assert post(url, {'city': 'São Paulo'}, content_type='application/json').status_code == 200
+        response = post(url, {'city': 'São Paulo'}, content_type='application/json')
+
+    assert response.status_code == 429
+    assert 0 < int(response['Retry-After']) <= 60
+    assert 'detail' in response.json()
+    assert allow_request.call_count == 4
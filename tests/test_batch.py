@@ -0,0 +1,117 @@
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from django.core.cache import cache
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+from weather.models import WeatherQuery
+from weather.services import WeatherService
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Limpa o cache antes e depois de cada teste"""
+    cache.clear()
+    yield
+    cache.clear()
+
+def fake_fetch(city, country=''):
+    if city == 'Atlantis':
+        raise ValueError(f"City '{city}' not found")
+    return {
+        'city': city,
+        'country': country or 'BR',
+        'temperature': 20.0 + len(city),
+        'description': 'Clear Sky',
+        'humidity': 60,
+        'pressure': 1013,
+        'wind_speed': 5.2,
+    }
+
+@pytest.mark.django_db
+@patch.object(WeatherService, '_fetch_from_api', side_effect=fake_fetch)
+def test_batch_mixes_hits_misses_and_errors(mock_fetch):
+    """Test batch results keep request order with one fetch per distinct miss"""
+    service = WeatherService()
+    service.get_weather('Recife', 'BR')
+    mock_fetch.reset_mock()
+
+    locations = [
+        {'city': 'Santos', 'country': 'BR'},
+        {'city': 'Recife', 'country': 'BR'},
+        {'city': 'Atlantis'},
+        {'city': 'Santos', 'country': 'BR'},
+        {'city': 'Natal', 'country': 'BR'},
+    ]
+    with patch('weather.services.cache.get_many', wraps=cache.get_many) as mock_get_many:
+        results = service.get_weather_batch(locations)
+
+    # One lookup for every city, one more for the misses once their locks are held
+    assert mock_get_many.call_count == 2
+    assert mock_fetch.call_count == 3  # Santos, Atlantis, Natal
+    assert [r[0]['city'] if isinstance(r, tuple) else None for r in results] == [
+        'Santos', 'Recife', None, 'Santos', 'Natal'
+    ]
+    assert [r[1] for r in results if isinstance(r, tuple)] == [False, True, False, False]
+    assert isinstance(results[2], ValueError)
+    assert results[0][0] is not results[3][0]
+    assert WeatherQuery.objects.count() == 3  # Recife earlier plus Santos and Natal
+
+    # Misses are now cached
+    data, cached = service.get_weather('Natal', 'BR')
+    assert cached is True
+    assert data['timestamp'] is not None
+
+@pytest.mark.django_db(transaction=True)
+@patch.object(WeatherService, '_fetch_from_api')
+def test_concurrent_batches_share_misses(mock_fetch):
+    """Test overlapping batches and single requests make one upstream call and one row per city"""
+    def slow_fetch(city, country=''):
+        time.sleep(0.1)
+        return fake_fetch(city, country)
+    mock_fetch.side_effect = slow_fetch
+    queries = [{'city': 'Santos', 'country': 'BR'}, {'city': 'Natal', 'country': 'BR'}]
+    results = []
+
+    def batch():
+        results.extend(WeatherService().get_weather_batch(queries))
+        connection.close()
+
+    def single():
+        results.append(WeatherService().get_weather('Natal', 'BR'))
+        connection.close()
+
+    threads = [threading.Thread(target=target) for target in (batch, batch, single)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(call.args[0] for call in mock_fetch.call_args_list) == ['Natal', 'Santos']
+    assert sorted(WeatherQuery.objects.values_list('city', flat=True)) == ['Natal', 'Santos']
+    assert len(results) == 5 and all(isinstance(result, tuple) for result in results)
+    assert sum(1 for _, cached in results if not cached) == 2
+
+@pytest.mark.django_db
+@patch.object(WeatherService, '_fetch_from_api', side_effect=fake_fetch)
+def test_batch_endpoint(mock_fetch):
+    """Testa o endpoint de consulta em lote"""
+    response = APIClient().post(
+        reverse('weather-batch'),
+        {'items': [{'city': 'Santos', 'country': 'BR'}, {'city': 'Atlantis'}]},
+        format='json'
+    )
+
+    assert response.status_code == 200
+    assert [item['status'] for item in response.data] == [200, 404]
+    assert response.data[0]['data']['city'] == 'Santos'
+    assert response.data[0]['data']['cached'] is False
+    assert 'not found' in response.data[1]['error']
+
+@pytest.mark.django_db
+def test_batch_endpoint_rejects_too_many_items(settings):
+    """Testa o limite de itens por requisição em lote"""
+    items = [{'city': f'City{i}'} for i in range(settings.WEATHER_BATCH_MAX_ITEMS + 1)]
+    response = APIClient().post(reverse('weather-batch'), {'items': items}, format='json')
+    assert response.status_code == 400
@@ -0,0 +1,62 @@
+import pickle
+import pytest
+from unittest.mock import patch
+from django.utils import timezone
+from weather import cache_codecs, caching
+
+WEATHER_DATA = {
+    'city': 'São Paulo',
+    'country': 'BR',
+    'temperature': 25.5,
+    'description': 'Clear Sky',
+    'humidity': 60,
+    'pressure': 1013,
+    'wind_speed': 5.2,
+}
+
+def make_entry(**data):
+    return caching.make_entry({**WEATHER_DATA, 'timestamp': timezone.now(), **data}, 600, 0.25)
+
+def test_struct_round_trip_is_compact():
+    """Test the struct codec restores the entry exactly in far fewer bytes than pickle"""
+    codec = cache_codecs.StructCodec()
+    entry = make_entry(temperature=-3.7)
+
+    encoded = codec.encode(entry)
+
+    assert encoded[0] == cache_codecs.STRUCT_V1
+    assert codec.decode(encoded) == entry
+    assert len(encoded) * 3 < len(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+
+def test_struct_falls_back_to_pickle_for_other_shapes():
+    """Test entries outside the fixed layout still round-trip"""
+    codec = cache_codecs.StructCodec()
+    entry = make_entry(temperature=25.55, extra='field')
+
+    encoded = codec.encode(entry)
+
+    assert encoded[0] == cache_codecs.PICKLE_V0
+    assert codec.decode(encoded) == entry
+
+def test_decode_reads_legacy_and_rejects_unknown_versions():
+    """Test entries stored before codecs pass through and unknown formats are misses"""
+    entry = make_entry()
+
+    assert cache_codecs.decode(entry) == entry
+    assert cache_codecs.decode(None) is None
+    assert cache_codecs.decode(bytes([255]) + b'future') is None
+
+def test_msgpack_entries_are_misses_without_msgpack():
+    """Test a worker without msgpack treats msgpack entries as misses"""
+    with patch.object(cache_codecs, 'msgpack', None):
+        assert cache_codecs.decode(bytes([cache_codecs.MSGPACK_V1]) + b'\x81') is None
+        with pytest.raises(ImportError):
+            cache_codecs.MsgpackCodec()
+
+def test_msgpack_round_trip():
+    """Test the msgpack codec when the package is installed"""
+    pytest.importorskip('msgpack')
+    codec = cache_codecs.MsgpackCodec()
+    entry = make_entry()
+
+    assert codec.decode(codec.encode(entry)) == entry
@@ -0,0 +1,149 @@
+import time
+import pytest
+from unittest.mock import patch
+from django.core.cache import cache
+from weather import cache_codecs, caching
+from weather.services import WeatherService
+
+WEATHER_DATA = {
+    'city': 'São Paulo',
+    'country': 'BR',
+    'temperature': 25.5,
+    'description': 'Clear Sky',
+    'humidity': 60,
+    'pressure': 1013,
+    'wind_speed': 5.2,
+}
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Limpa o cache antes e depois de cada teste"""
+    cache.clear()
+    yield
+    cache.clear()
+
+def expire(cache_key):
+    """Move the soft expiry of a cached entry into the past"""
+    entry = caching.get_weather_cache().codec.decode(cache.get(cache_key))
+    entry['soft_expires_at'] = time.time() - 1
+    caching.get_weather_cache().set(cache_key, entry, 600)
+
+def test_should_refresh_early():
+    """Test XFetch only fires close to expiry and never with beta 0"""
+    far = caching.make_entry(WEATHER_DATA, 600, 0.1)
+    near = caching.make_entry(WEATHER_DATA, 0, 0.1)
+
+    assert caching.should_refresh_early(far, 1.0) is False
+    assert caching.should_refresh_early(near, 1.0) is True
+    assert caching.should_refresh_early(near, 0) is False
+
+@pytest.mark.django_db
+@patch.object(WeatherService, '_fetch_from_api')
+def test_fresh_hit_reports_status(mock_fetch):
+    """Test cache statuses for a miss followed by a hit"""
+    mock_fetch.side_effect = lambda city, country='': dict(WEATHER_DATA)
+    service = WeatherService()
+
+    data1, cached1 = service.get_weather('São Paulo', 'BR')
+    data2, cached2 = service.get_weather('São Paulo', 'BR')
+
+    assert (data1['cache_status'], cached1) == ('refreshed', False)
+    assert (data2['cache_status'], cached2) == ('fresh', True)
+    assert mock_fetch.call_count == 1
+
+@pytest.mark.django_db
+@patch('weather.tasks.refresh_weather_cache.delay')
+@patch.object(WeatherService, '_fetch_from_api')
+def test_stale_hit_served_and_refresh_scheduled(mock_fetch, mock_delay, settings):
+    """Test a stale entry is returned at once and one refresh is scheduled"""
+    settings.WEATHER_REFRESH_BACKEND = 'celery'
+    mock_fetch.side_effect = lambda city, country='': dict(WEATHER_DATA)
+    service = WeatherService()
+    service.get_weather('São Paulo', 'BR')
+    expire(service._get_cache_key('São Paulo', 'BR'))
+
+    data1, cached1 = service.get_weather('São Paulo', 'BR')
+    data2, _ = service.get_weather('São Paulo', 'BR')
+
+    assert cached1 is True
+    assert data1['cache_status'] == data2['cache_status'] == 'stale'
+    assert mock_fetch.call_count == 1
+    mock_delay.assert_called_once_with('São Paulo', 'BR')
+
+    # Only the scheduled refresh clears the marker; a pre-warm refresh leaves it alone
+    refresh_key = service._refresh_key(service._get_cache_key('São Paulo', 'BR'))
+    service.refresh('São Paulo', 'BR')
+    assert cache.get(refresh_key) == 1
+    service.refresh('São Paulo', 'BR', scheduled=True)
+    assert cache.get(refresh_key) is None
+
+@pytest.mark.django_db
+@patch.object(WeatherService, '_fetch_from_api')
+def test_refresh_replaces_stale_entry(mock_fetch):
+    """Test a background refresh stores a new fresh entry"""
+    mock_fetch.side_effect = lambda city, country='': dict(WEATHER_DATA)
+    service = WeatherService()
+    cache_key = service._get_cache_key('São Paulo', 'BR')
+    service.get_weather('São Paulo', 'BR')
+    expire(cache_key)
+
+    mock_fetch.side_effect = lambda city, country='': {**WEATHER_DATA, 'temperature': 30.0}
+    service.refresh('São Paulo', 'BR')
+
+    data, cached = service.get_weather('São Paulo', 'BR')
+    assert mock_fetch.call_count == 2
+    assert (data['temperature'], data['cache_status']) == (30.0, 'fresh')
+
+def test_local_cache_evicts_least_recently_used():
+    """Test the L1 cache keeps at most max_entries, dropping the least recently used"""
+    l1 = caching.LocalCache(max_entries=2, max_bytes=1024 * 1024, ttl=60)
+    l1.set('a', 1)
+    l1.set('b', 2)
+    l1.get('a')
+    l1.set('c', 3)
+
+    assert (l1.get('a'), l1.get('b'), l1.get('c')) == (1, None, 3)
+
+def test_local_cache_ttl_and_memory_cap():
+    """Test L1 entries expire after the TTL and the byte budget is enforced"""
+    l1 = caching.LocalCache(max_entries=100, max_bytes=200, ttl=60)
+    l1.set('big', 'x' * 500, size=500)
+    l1.set('a', 'x' * 80, size=80)
+    l1.set('b', 'x' * 80, size=80)
+    l1.set('c', 'x' * 80, size=80)
+
+    assert l1.get('big') is None
+    assert l1.get('a') is None
+    assert len(l1) == 2
+
+    with patch('weather.caching.time.monotonic', return_value=time.monotonic() + 61):
+        assert l1.get('b') is None
+
+def test_tiered_cache_counts_hits_per_tier():
+    """Test reads are served by L1 after the first L2 hit and counted per tier"""
+    cache.set('k', {'v': 1})
+    tiered = caching.TieredCache(cache, caching.LocalCache(10, 1024 * 1024, 60))
+
+    assert tiered.get('k') == {'v': 1}
+    cache.delete('k')
+    assert tiered.get('k') == {'v': 1}
+    assert tiered.get('missing') is None
+
+    stats = tiered.stats()
+    assert (stats['l1_hits'], stats['l2_hits'], stats['misses']) == (1, 1, 1)
+    assert stats['l1_hit_ratio'] == pytest.approx(1 / 3)
+
+def test_tiered_cache_sizes_l1_entries_from_l2_bytes():
+    """Test L1 charges promoted entries the encoded L2 size instead of pickling them"""
+    codec = cache_codecs.StructCodec()
+    entry = caching.make_entry(dict(WEATHER_DATA), 600, 0.1)
+    cache.set('k', codec.encode(entry))
+    l1 = caching.LocalCache(10, 1024 * 1024, 60)
+    tiered = caching.TieredCache(cache, l1, codec=codec)
+
+    with patch('pickle.dumps', side_effect=AssertionError):
+        assert tiered.get('k') == entry
+    assert l1._bytes == len(codec.encode(entry))
+
+    tiered.set('plain', {'v': 1}, 600)
+    assert l1._bytes == len(codec.encode(entry)) + len(codec.encode({'v': 1}))
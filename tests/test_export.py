@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+import pytest
+import warnings
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from weather import export, locations
+from weather.models import WeatherQuery
+
+START = datetime(2025, 7, 30, 12, 0, tzinfo=dt_timezone.utc)
+
+@pytest.fixture
+def rows():
+    WeatherQuery.objects.bulk_create([
+        WeatherQuery(city=city, country='BR', temperature=20 + i, description='Test', humidity=50,
+                     pressure=1000, wind_speed=2.0, ip_address='10.0.0.1', timestamp=START + timedelta(hours=i))
+        for i, city in enumerate(['São Paulo', 'Recife', 'São Paulo'])
+    ])
+
+@pytest.fixture
+def admin_client(db):
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+    return client
+
+def content(response):
+    return b''.join(response.streaming_content)
+
+@pytest.mark.django_db
+def test_export_requires_staff(rows):
+    """Testa que a exportação é restrita a usuários staff"""
+    response = APIClient().get(reverse('weather-export'))
+    assert response.status_code in (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN)
+
+@pytest.mark.django_db
+def test_export_csv(rows, admin_client):
+    """Testa exportação CSV com cabeçalho e todas as linhas"""
+    response = admin_client.get(reverse('weather-export'))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Content-Type'] == 'text/csv'
+    assert 'weather_history.csv' in response['Content-Disposition']
+    lines = list(csv.reader(io.StringIO(content(response).decode())))
+    assert lines[0] == export.COLUMNS
+    assert [line[1] for line in lines[1:]] == ['São Paulo', 'Recife', 'São Paulo']
+
+@pytest.mark.django_db
+def test_export_ndjson_filters(rows, admin_client):
+    """Testa exportação NDJSON filtrada por cidade e período"""
+    response = admin_client.get(reverse('weather-export'), {
+        'output': 'ndjson', 'city': 'São Paulo', 'from': (START + timedelta(minutes=1)).isoformat(),
+    })
+
+    records = [json.loads(line) for line in content(response).decode().splitlines()]
+    assert [(r['city'], r['temperature']) for r in records] == [('São Paulo', 22.0)]
+    assert records[0]['timestamp'] == (START + timedelta(hours=2)).isoformat()
+
+@pytest.mark.django_db
+def test_export_resolves_city_aliases(rows, admin_client):
+    """Testa que a cidade da exportação passa pelos aliases aprendidos"""
+    locations.learn('sao paulo', '', {'id': 3448439, 'name': 'São Paulo', 'sys': {'country': 'BR'}})
+
+    response = admin_client.get(reverse('weather-export'), {'output': 'ndjson', 'city': 'sao paulo'})
+
+    records = [json.loads(line) for line in content(response).decode().splitlines()]
+    assert [r['temperature'] for r in records] == [20.0, 22.0]
+
+@pytest.mark.django_db
+def test_export_command(rows, tmp_path, settings):
+    """Testa o comando de exportação gravando em arquivo, com datas sem fuso no TIME_ZONE"""
+    settings.TIME_ZONE = 'UTC'
+    locations.learn('sao paulo', '', {'id': 3448439, 'name': 'São Paulo', 'sys': {'country': 'BR'}})
+    path = tmp_path / 'history.csv'
+    call_command('export_weather_history', str(path), '--city', 'Recife', stdout=io.StringIO())
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2 and 'Recife' in lines[1]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        call_command('export_weather_history', str(path), '--city', 'sao paulo',
+                     '--from', '2025-07-30T12:30:00', stdout=io.StringIO())
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2 and '22.0' in lines[1]
+
+@pytest.mark.django_db
+def test_export_unavailable_output_is_server_error(admin_client):
+    """Testa que um formato sem a dependência instalada responde 501, não erro do cliente"""
+    with patch.object(export, 'check_output', side_effect=ImportError):
+        response = admin_client.get(reverse('weather-export'), {'output': 'parquet'})
+    assert response.status_code == status.HTTP_501_NOT_IMPLEMENTED
+
+@pytest.mark.django_db
+def test_export_parquet(rows):
+    """Testa exportação Parquet quando o pyarrow está instalado"""
+    pq = pytest.importorskip('pyarrow.parquet')
+    data = b''.join(export.export_chunks('parquet', export.export_rows()))
+
+    table = pq.read_table(io.BytesIO(data))
+    assert table.num_rows == 3
+    assert table.column('city').to_pylist() == ['São Paulo', 'Recife', 'São Paulo']
@@ -0,0 +1,113 @@
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from weather import geo, locations
+from weather.services import AsyncWeatherService, WeatherService
+
+SAO_PAULO = (-23.5475, -46.6361)
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Limpa o cache antes e depois de cada teste"""
+    cache.clear()
+    yield
+    cache.clear()
+
+def payload(name, lat, lon, country='BR'):
+    return {
+        'id': 1, 'name': name, 'sys': {'country': country}, 'coord': {'lat': lat, 'lon': lon},
+        'main': {'temp': 25.0, 'humidity': 60, 'pressure': 1013},
+        'weather': [{'description': 'clear sky'}], 'wind': {'speed': 3.5},
+    }
+
+def test_geohash_round_trip():
+    """Testa o geohash conhecido e o centro da célula"""
+    assert geo.geohash(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    lat, lon = geo.cell_center(geo.geohash(*SAO_PAULO, 5))
+    assert geo.distance_km(lat, lon, *SAO_PAULO) < 3.5
+
+def test_spatial_index_nearest():
+    """Testa a busca do lugar mais próximo dentro do raio, inclusive cruzando o antimeridiano"""
+    index = geo.SpatialIndex(10)
+    index.add(*SAO_PAULO, {'city': 'São Paulo', 'country': 'BR'})
+    index.add(-23.65, -46.53, {'city': 'Santo André', 'country': 'BR'})
+    index.add(-17.0, 179.99, {'city': 'Fiji', 'country': 'FJ'})
+
+    assert index.nearest(-23.56, -46.64, 10)['city'] == 'São Paulo'
+    assert index.nearest(-23.64, -46.54, 10)['city'] == 'Santo André'
+    assert index.nearest(-22.9, -43.2, 10) is None
+    assert index.nearest(-17.0, -179.99, 10)['city'] == 'Fiji'
+
+    index.add(0.0, 0.0, {'city': 'São Paulo', 'country': 'BR'})  # moved, indexed once
+    assert len(index) == 3 and index.nearest(*SAO_PAULO, 10) is None
+
+@pytest.mark.django_db
+@patch('weather.services.get_client')
+def test_coordinates_reuse_nearby_city(mock_client):
+    """Testa que coordenadas próximas a uma cidade já buscada usam o cache sem chamar a API"""
+    mock_client.return_value.get.return_value = Mock(status_code=200, json=Mock(
+        return_value=payload('São Paulo', *SAO_PAULO)
+    ))
+    service = WeatherService()
+    service.get_weather('sao paulo', 'BR')
+
+    data, is_cached = service.get_weather_at(-23.56, -46.61)
+    assert (data['city'], is_cached) == ('São Paulo', True)
+    assert mock_client.return_value.get.call_count == 1
+
+    # Another worker learns the cell from the shared cache alone
+    locations.clear_local()
+    data, is_cached = service.get_weather_at(-23.56, -46.61)
+    assert (data['city'], is_cached) == ('São Paulo', True)
+    assert mock_client.return_value.get.call_count == 1
+
+@pytest.mark.django_db
+@patch('weather.services.get_client')
+def test_unknown_area_fetched_once_per_cell(mock_client):
+    """Testa que uma área desconhecida busca pelas coordenadas do centro da célula uma única vez"""
+    mock_get = mock_client.return_value.get
+    mock_get.return_value = Mock(status_code=200, json=Mock(return_value=payload('Manaus', -3.1, -60.02)))
+    service = WeatherService()
+
+    data, is_cached = service.get_weather_at(-3.1, -60.02)
+    assert (data['city'], is_cached) == ('Manaus', False)
+    params = mock_get.call_args.kwargs['params']
+    assert geo.geohash(params['lat'], params['lon'], 5) == geo.geohash(-3.1, -60.02, 5)
+
+    assert service.get_weather_at(-3.101, -60.021)[1] is True
+    assert service.get_weather('Manaus', 'BR')[1] is True
+    assert mock_get.call_count == 1
+
+@pytest.mark.django_db
+@patch('weather.services.get_async_client')
+def test_async_coordinates(mock_client):
+    """Testa coordenadas no serviço assíncrono: busca da célula e depois cache"""
+    mock_get = mock_client.return_value.get = AsyncMock(return_value=Mock(status_code=200, json=Mock(
+        return_value=payload('Manaus', -3.1, -60.02)
+    )))
+    service = AsyncWeatherService()
+
+    assert async_to_sync(service.get_weather_at)(-3.1, -60.02)[1] is False
+    data, is_cached = async_to_sync(service.get_weather_at)(-3.11, -60.03)
+    assert (data['city'], is_cached) == ('Manaus', True)
+    assert mock_get.await_count == 1
+
+@pytest.mark.django_db
+@patch('weather.services.get_client')
+def test_coordinates_without_place(mock_client):
+    """Testa que coordenadas sem cidade próxima (mar aberto) retornam 404"""
+    mock_client.return_value.get.return_value = Mock(status_code=200, json=Mock(
+        return_value=payload('', -30.0, -30.0, country='')
+    ))
+    response = APIClient().post(reverse('current-weather'), {'lat': -30.0, 'lon': -30.0}, format='json')
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_request_serializer_needs_city_or_coordinates():
+    """Testa a validação de cidade ou latitude e longitude"""
+    client = APIClient()
+    for data in ({}, {'lat': 10}, {'lat': 91, 'lon': 0}):
+        assert client.post(reverse('current-weather'), data, format='json').status_code == status.HTTP_400_BAD_REQUEST
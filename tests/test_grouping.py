@@ -0,0 +1,125 @@
+import threading
+import time
+import pytest
+from unittest.mock import Mock, patch
+from django.core.cache import cache
+from weather.grouping import GroupBatcher
+from weather.services import WeatherService
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Limpa o cache antes e depois de cada teste"""
+    cache.clear()
+    yield
+    cache.clear()
+
+def city_payload(city_id, name='São Paulo'):
+    return {
+        'id': city_id,
+        'name': name,
+        'sys': {'country': 'BR'},
+        'main': {'temp': 25.5, 'humidity': 60, 'pressure': 1013},
+        'weather': [{'description': 'clear sky'}],
+        'wind': {'speed': 5.2}
+    }
+
+def fetch_concurrently(batcher, city_ids):
+    results = {}
+
+    def worker(city_id):
+        try:
+            results[city_id] = batcher.fetch(city_id, timeout=5)
+        except LookupError as e:
+            results[city_id] = e
+
+    threads = [threading.Thread(target=worker, args=(city_id,)) for city_id in city_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+def blocking_group_fetch(calls, missing=()):
+    """fetch_group whose first call is held until release is set"""
+    started, release = threading.Event(), threading.Event()
+
+    def fetch_group(ids):
+        calls.append(sorted(ids))
+        if not started.is_set():
+            started.set()
+            release.wait(5)
+        return {city_id: city_payload(city_id) for city_id in ids if city_id not in missing}
+
+    return fetch_group, started, release
+
+def test_lone_lookup_is_sent_at_once():
+    """Test a lookup with no group call in flight does not wait for the window"""
+    calls = []
+    batcher = GroupBatcher(lambda ids: calls.append(ids) or {i: city_payload(i) for i in ids}, window=10)
+
+    started = time.monotonic()
+    assert batcher.fetch(1, timeout=5)['id'] == 1
+    assert time.monotonic() - started < 1
+    assert calls == [[1]]
+
+def test_lookups_queued_behind_a_call_share_one():
+    """Test lookups arriving while a call is in flight are merged into the next one"""
+    calls = []
+    fetch_group, started, release = blocking_group_fetch(calls, missing=(99,))
+    batcher = GroupBatcher(fetch_group, window=5)
+
+    first = threading.Thread(target=batcher.fetch, args=(1, 5))
+    first.start()
+    assert started.wait(5)
+    results = {}
+    others = threading.Thread(target=lambda: results.update(fetch_concurrently(batcher, [2, 3, 99])))
+    others.start()
+    while len(batcher._pending) < 3:
+        time.sleep(0.001)
+    release.set()
+    first.join()
+    others.join()
+
+    assert calls == [[1], [2, 3, 99]]
+    assert results[2]['id'] == 2
+    assert isinstance(results[99], LookupError)
+
+def test_full_batch_is_sent_without_waiting():
+    """Test batches are capped at max_size IDs"""
+    calls = []
+    fetch_group, started, release = blocking_group_fetch(calls)
+    batcher = GroupBatcher(fetch_group, window=0.2, max_size=20)
+
+    first = threading.Thread(target=batcher.fetch, args=(0, 5))
+    first.start()
+    assert started.wait(5)
+    results = fetch_concurrently(batcher, range(1, 45))
+    release.set()
+    first.join()
+
+    assert len(results) == 44
+    assert sorted(len(ids) for ids in calls) == [1, 4, 20, 20]
+
+@pytest.mark.django_db
+@patch('weather.services.get_client')
+def test_known_city_id_uses_group_endpoint(mock_client):
+    """Test the ID learned from /weather is used for later /group lookups"""
+    def get(url, params=None):
+        response = Mock(status_code=200)
+        if url.endswith('/group'):
+            response.json.return_value = {'cnt': 1, 'list': [city_payload(3448439)]}
+        else:
+            response.json.return_value = city_payload(3448439)
+        return response
+
+    mock_client.return_value.get.side_effect = get
+    service = WeatherService()
+
+    service._fetch_from_api('São Paulo', 'BR')
+    result = service._fetch_from_api('São Paulo', 'BR')
+
+    urls = [call.args[0] for call in mock_client.return_value.get.call_args_list]
+    assert urls[0].endswith('/weather')
+    assert urls[1].endswith('/group')
+    assert mock_client.return_value.get.call_args.kwargs['params']['id'] == '3448439'
+    assert result['city'] == 'São Paulo'
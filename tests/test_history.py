@@ -0,0 +1,110 @@
+import pytest
+from datetime import timedelta
+from unittest.mock import patch
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from weather import history
+from weather.models import WeatherQuery
+from weather.services import WeatherService
+
+WEATHER_DATA = {
+    'city': 'São Paulo',
+    'country': 'BR',
+    'temperature': 25.5,
+    'description': 'Clear Sky',
+    'humidity': 60,
+    'pressure': 1013,
+    'wind_speed': 5.2,
+}
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Limpa o cache antes e depois de cada teste"""
+    cache.clear()
+    yield
+    cache.clear()
+
+@pytest.fixture
+def buffer():
+    """Buffer em memória que só grava quando flush() é chamado"""
+    return history.MemoryHistoryBuffer(batch_size=1000, flush_interval=3600, max_size=10000)
+
+@pytest.mark.django_db
+def test_record_sync_mode_inserts_immediately():
+    """Test sync mode writes the row inline with the app-generated timestamp"""
+    timestamp = history.record(dict(WEATHER_DATA))
+
+    assert WeatherQuery.objects.get().timestamp == timestamp
+
+@pytest.mark.django_db
+def test_memory_buffer_writes_on_flush(buffer):
+    """Test buffered rows are bulk inserted on flush, keeping their timestamps"""
+    earlier = timezone.now() - timedelta(minutes=5)
+    buffer.put([{**WEATHER_DATA, 'timestamp': earlier}, {**WEATHER_DATA, 'city': 'Recife'}])
+
+    assert WeatherQuery.objects.count() == 0
+    assert buffer.flush() == 2
+    assert WeatherQuery.objects.count() == 2
+    assert WeatherQuery.objects.get(city='São Paulo').timestamp == earlier
+    assert buffer.flush() == 0
+
+@pytest.mark.django_db
+def test_memory_buffer_keeps_rows_when_insert_fails(buffer):
+    """Test rows are re-queued if the database write fails"""
+    buffer.put([dict(WEATHER_DATA)])
+
+    with patch.object(WeatherQuery.objects, 'bulk_create', side_effect=Exception('db down')):
+        assert buffer.flush() == 0
+
+    assert buffer.flush() == 1
+
+@pytest.mark.django_db
+@patch.object(WeatherService, '_fetch_from_api', side_effect=lambda city, country='': dict(WEATHER_DATA))
+def test_get_weather_write_behind(mock_fetch, buffer):
+    """Test a miss answers before the history row is written"""
+    with patch('weather.history.get_history_writer', return_value=buffer):
+        data, cached = WeatherService().get_weather('São Paulo', 'BR', '127.0.0.1')
+
+    assert cached is False
+    assert data['timestamp'] is not None
+    assert WeatherQuery.objects.count() == 0
+
+    buffer.flush()
+    query = WeatherQuery.objects.get()
+    assert query.timestamp == data['timestamp']
+    assert query.ip_address == '127.0.0.1'
+
+@pytest.mark.django_db
+def test_history_payload_is_cached_until_insert(django_assert_num_queries):
+    """Test the pre-encoded history is reused until a new row is recorded"""
+    history.record(dict(WEATHER_DATA))
+    first = history.recent_payload()
+
+    with django_assert_num_queries(0):
+        assert history.recent_payload()['body'] == first['body']
+
+    history.record({**WEATHER_DATA, 'city': 'Recife'})
+    second = history.recent_payload()
+    assert second['etag'] != first['etag']
+    assert b'Recife' in second['body']
+
+@pytest.mark.django_db
+def test_history_conditional_get(django_assert_num_queries):
+    """Testa ETag/Last-Modified e resposta 304 sem consultar o banco"""
+    client = APIClient()
+    url = reverse('weather-history')
+    history.record(dict(WEATHER_DATA))
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.json()[0]['city'] == 'São Paulo'
+    etag, last_modified = response['ETag'], response['Last-Modified']
+
+    with django_assert_num_queries(0):
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+        assert client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code == 304
+
+    history.record({**WEATHER_DATA, 'city': 'Recife'})
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
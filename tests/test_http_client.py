@@ -0,0 +1,114 @@
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from asgiref.sync import async_to_sync
+from weather import http_client
+from weather.http_client import (
+    CircuitBreaker, CircuitOpenError, OpenWeatherClient, UpstreamUnavailable, get_async_client
+)
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Replies with the next scripted status code (200 once the script is empty)"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits += 1
+            server.clients.add(self.client_address)
+            status = server.script.pop(0) if server.script else 200
+        body = json.dumps({'status': status}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    """Servidor HTTP local que simula a OpenWeatherMap"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.lock = threading.Lock()
+    server.hits = 0
+    server.clients = set()
+    server.script = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/weather"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def make_client(**kwargs):
+    options = dict(max_retries=2, backoff_base=0.01, backoff_max=0.02)
+    options.update(kwargs)
+    return OpenWeatherClient(**options)
+
+def test_connections_are_reused(stub_server):
+    """Test keep-alive: sequential requests share one pooled connection"""
+    client = make_client()
+    for _ in range(5):
+        assert client.get(stub_server.url).status_code == 200
+
+    assert stub_server.hits == 5
+    assert len(stub_server.clients) == 1
+
+def test_retries_on_server_errors(stub_server):
+    """Test 429/5xx responses are retried until success"""
+    stub_server.script = [503, 429]
+    response = make_client().get(stub_server.url)
+
+    assert response.status_code == 200
+    assert stub_server.hits == 3
+
+def test_client_errors_are_not_retried(stub_server):
+    """Test 404 is returned to the caller without retries"""
+    stub_server.script = [404]
+    response = make_client().get(stub_server.url)
+
+    assert response.status_code == 404
+    assert stub_server.hits == 1
+
+def test_circuit_opens_and_fails_fast(stub_server):
+    """Test the breaker opens after repeated failures and stops calling upstream"""
+    stub_server.script = [500] * 4
+    client = make_client(max_retries=1, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailable):
+            client.get(stub_server.url)
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        client.get(stub_server.url)
+    assert stub_server.hits == 4
+
+def test_circuit_half_open_recovers(stub_server):
+    """Test a successful trial call closes the circuit"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    make_client(breaker=breaker).get(stub_server.url)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_async_client_closed_with_its_loop(stub_server, monkeypatch):
+    """Test each event loop gets one async client, closed when the loop shuts down"""
+    monkeypatch.setattr(http_client, '_client', None)  # a fresh shared circuit breaker
+
+    async def run():
+        client = get_async_client()
+        assert get_async_client() is client
+        assert (await client.get(stub_server.url)).status_code == 200
+        return client
+
+    first = async_to_sync(run)()
+    second = async_to_sync(run)()
+
+    assert first is not second
+    assert first.client.is_closed and second.client.is_closed
+    assert len(http_client._async_clients) == len(http_client._async_closers) == 0
@@ -0,0 +1,86 @@
+import json
+import logging
+import sys
+import pytest
+from unittest.mock import patch
+from weather.log import HOT, JsonFormatter, QueueingHandler, SampleFilter
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+@pytest.fixture
+def sink():
+    """Logger de saída isolado, com um handler que guarda os registros"""
+    logger = logging.getLogger('weather_test_output')
+    handler = ListHandler()
+    logger.addHandler(handler)
+    yield handler
+    logger.removeHandler(handler)
+
+def make_record(msg, *args, level=logging.INFO, **extra):
+    record = logging.LogRecord('weather', level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+def test_json_formatter_includes_extra_fields():
+    """Testa uma linha JSON por registro, com campos de extra= e traceback"""
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        record = logging.LogRecord('weather', logging.ERROR, __file__, 1, "Failed for %s", ('Recife',), sys.exc_info())
+    record.city = 'Recife'
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['message'] == 'Failed for Recife'
+    assert entry['level'] == 'ERROR'
+    assert entry['logger'] == 'weather'
+    assert entry['city'] == 'Recife'
+    assert 'ValueError: boom' in entry['exc']
+    assert 'msg' not in entry and 'args' not in entry
+
+def test_sample_filter_thins_hot_info_only():
+    """Testa que só mensagens INFO marcadas como HOT são amostradas"""
+    dropping = SampleFilter(rate=0.0)
+    assert not dropping.filter(make_record("Cache hit for %s", 'Recife', **HOT))
+    assert dropping.filter(make_record("API call successful for %s", 'Recife'))
+    assert dropping.filter(make_record("Upstream unavailable", level=logging.WARNING, **HOT))
+
+    with patch('weather.log.random.random', return_value=0.05):
+        record = make_record("Cache hit for %s", 'Recife', **HOT)
+        assert SampleFilter(rate=0.1).filter(record)
+        assert record.sample_rate == 0.1
+    assert SampleFilter(rate=1.0).filter(make_record("Cache hit for %s", 'Recife', **HOT))
+
+def test_queueing_handler_writes_through_sink(sink):
+    """Testa que os registros são formatados e escritos pela thread do listener"""
+    handler = QueueingHandler('weather_test_output')
+    logger = logging.getLogger('weather.test_queue')
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        logger.warning("Upstream returned %s", 503)
+        handler.stop()
+    finally:
+        logger.removeHandler(handler)
+        logger.propagate = True
+
+    assert [r.getMessage() for r in sink.records] == ['Upstream returned 503']
+    assert handler.listener is None
+
+def test_queueing_handler_drops_when_full(sink):
+    """Testa que a fila cheia descarta registros em vez de bloquear"""
+    handler = QueueingHandler('weather_test_output', maxsize=2)
+    handler._start()
+    handler.listener.stop()  # nothing drains the queue now
+    handler.listener = None
+
+    for i in range(5):
+        handler.emit(make_record("Cache hit %s", i))
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+import pytest
+from unittest.mock import Mock, patch
+from django.core.cache import cache
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+from weather import metrics
+from weather.throttling import SlidingWindowThrottle
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Limpa o cache antes e depois de cada teste"""
+    cache.clear()
+    yield
+    cache.clear()
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+@pytest.mark.django_db
+@patch('weather.services.get_client')
+def test_lookups_and_request_time_counted(mock_client):
+    """Testa contadores de hit/miss e os histogramas de requisição, upstream e banco"""
+    mock_client.return_value.get.return_value = Mock(status_code=200, json=Mock(return_value={
+        'id': 1, 'name': 'Recife', 'sys': {'country': 'BR'},
+        'main': {'temp': 30.0, 'humidity': 70, 'pressure': 1010},
+        'weather': [{'description': 'sunny'}], 'wind': {'speed': 4.0},
+    }))
+    before = {
+        'miss': sample('weather_cache_lookups_total', result='miss'),
+        'fresh': sample('weather_cache_lookups_total', result='fresh'),
+        'requests': sample('weather_http_request_seconds_count', view='current-weather', method='POST', status='200'),
+        'inserts': sample('weather_db_insert_seconds_count', path='inline'),
+        'serialize': sample('weather_serialize_seconds_count', view='current-weather'),
+    }
+
+    client = APIClient()
+    for _ in range(2):
+        assert client.post(reverse('current-weather'), {'city': 'Recife'}, format='json').status_code == 200
+
+    assert sample('weather_cache_lookups_total', result='miss') == before['miss'] + 1
+    assert sample('weather_cache_lookups_total', result='fresh') == before['fresh'] + 1
+    assert sample('weather_http_request_seconds_count', view='current-weather', method='POST', status='200') == before['requests'] + 2
+    assert sample('weather_db_insert_seconds_count', path='inline') == before['inserts'] + 1
+    assert sample('weather_serialize_seconds_count', view='current-weather') == before['serialize'] + 2
+
+@pytest.mark.django_db
+@patch('weather.services.get_client')
+def test_errors_and_throttles_counted(mock_client):
+    """Testa contadores de erros por tipo e de requisições limitadas"""
+    mock_client.return_value.get.return_value = Mock(status_code=404)
+    errors = sample('weather_errors_total', type='ValueError')
+    throttled = sample('weather_throttled_requests_total', scope='anon')
+
+    client = APIClient()
+    with patch.object(SlidingWindowThrottle, 'parse_rate', return_value=(1, 60)):
+        assert client.post(reverse('current-weather'), {'city': 'Nowhere'}, format='json').status_code == 404
+        assert client.post(reverse('current-weather'), {'city': 'Nowhere'}, format='json').status_code == 429
+
+    assert sample('weather_errors_total', type='ValueError') == errors + 1
+    assert sample('weather_throttled_requests_total', scope='anon') == throttled + 1
+
+@pytest.mark.django_db
+def test_metrics_endpoint():
+    """Testa o endpoint /metrics no formato de texto do Prometheus"""
+    response = APIClient().get('/metrics')
+
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain')
+    assert b'# TYPE weather_upstream_request_seconds histogram' in response.content
+
+def test_multiprocess_totals(tmp_path):
+    """Testa que /metrics soma as amostras gravadas por vários processos"""
+    env = {**os.environ, metrics.MULTIPROC_DIR_ENV: str(tmp_path)}
+    script = "from weather import metrics; metrics.CACHE_LOOKUPS.labels(result='fresh').inc(3)"
+    for _ in range(2):
+        subprocess.run([sys.executable, '-c', script], env=env, check=True,
+                       cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    with patch.dict(os.environ, {metrics.MULTIPROC_DIR_ENV: str(tmp_path)}):
+        body, _ = metrics.render()
+    assert b'weather_cache_lookups_total{result="fresh"} 6.0' in body
@@ -0,0 +1,88 @@
+import pytest
+from io import StringIO
+from unittest.mock import patch
+from django.core.cache import cache
+from django.core.management import call_command
+from weather import caching, prewarm, rollups
+from weather.models import WeatherAccess, WeatherQuery
+from weather.services import WeatherService
+
+WEATHER_DATA = {
+    'city': 'São Paulo',
+    'country': 'BR',
+    'temperature': 25.5,
+    'description': 'Clear Sky',
+    'humidity': 60,
+    'pressure': 1013,
+    'wind_speed': 5.2,
+}
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Limpa o cache antes e depois de cada teste"""
+    cache.clear()
+    yield
+    cache.clear()
+
+def fake_fetch(city, country=''):
+    return {**WEATHER_DATA, 'city': city, 'country': country}
+
+@pytest.mark.django_db
+def test_popular_cities_ranked_by_requests():
+    """Test cities are ranked by rolled-up access counts, falling back to client history rows"""
+    WeatherQuery.objects.create(city='Recife', country='BR', temperature=30, description='Sun',
+                                humidity=70, pressure=1010, wind_speed=3, ip_address='10.0.0.1')
+    WeatherQuery.objects.create(city='Warmed', country='BR', temperature=30, description='Sun',
+                                humidity=70, pressure=1010, wind_speed=3, ip_address=None)
+    assert prewarm.popular_cities(10, 7) == [('Recife', 'BR')]
+
+    WeatherAccess.objects.bulk_create(
+        [WeatherAccess(city='Lima', country='PE', cache_status='fresh')] * 3
+        + [WeatherAccess(city='Porto', country='PT', cache_status='fresh')] * 5
+    )
+    assert prewarm.popular_cities(10, 7) == [('Recife', 'BR')]  # not rolled up yet
+
+    rollups.update('weather_access', lag=False)
+    assert prewarm.popular_cities(1, 7) == [('Porto', 'PT')]
+    assert prewarm.popular_cities(10, 7) == [('Porto', 'PT'), ('Lima', 'PE')]
+
+@pytest.mark.django_db
+@patch.object(WeatherService, '_fetch_from_api', side_effect=fake_fetch)
+def test_warm_skips_fresh_entries_and_respects_budget(mock_fetch):
+    """Test only missing or expiring entries are fetched, within the per-minute budget"""
+    WeatherService().get_weather('Lima', 'PE')
+    mock_fetch.reset_mock()
+
+    cities = [('Lima', 'PE'), ('Porto', 'PT'), ('Recife', 'BR'), ('Natal', 'BR')]
+    stats = prewarm.warm(cities, prewarm.UpstreamBudget(2), horizon=60)
+
+    assert stats == {'refreshed': 2, 'skipped': 1, 'failed': 0, 'deferred': 1}
+    assert [call.args[0] for call in mock_fetch.call_args_list] == ['Porto', 'Recife']
+    key = WeatherService()._get_cache_key('Porto', 'PT')
+    assert caching.unwrap(caching.get_weather_cache().get(key))['data']['city'] == 'Porto'
+
+@pytest.mark.django_db
+@patch.object(prewarm, 'cache_is_shared', return_value=True)
+@patch.object(WeatherService, '_fetch_from_api', side_effect=fake_fetch)
+def test_warm_cache_command(mock_fetch, mock_shared):
+    """Test the startup command warms the most requested cities"""
+    WeatherAccess.objects.bulk_create([WeatherAccess(city='Porto', country='PT', cache_status='fresh')] * 2)
+    rollups.update('weather_access', lag=False)
+    out = StringIO()
+
+    call_command('warm_cache', '--no-wait', stdout=out)
+
+    assert mock_fetch.call_count == 1
+    assert 'Refreshed 1' in out.getvalue()
+
+@pytest.mark.django_db
+@patch.object(WeatherService, '_fetch_from_api', side_effect=fake_fetch)
+def test_warm_cache_command_skips_process_local_cache(mock_fetch, settings):
+    """Test the startup command does nothing when the workers cannot share the cache"""
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    out = StringIO()
+
+    call_command('warm_cache', '--no-wait', stdout=out)
+
+    assert not mock_fetch.called
+    assert 'process-local' in out.getvalue()
@@ -0,0 +1,105 @@
+import pytest
+from datetime import timedelta
+from unittest.mock import patch
+from django.utils import timezone
+from weather import retention, rollups
+from weather.models import WeatherQuery
+from weather.retention import prune
+from weather.tasks import cleanup_old_weather_queries
+
+def fold():
+    """Dobra tudo nos rollups; a tarefa de retenção só apaga linhas já dobradas"""
+    rollups.update('weather_query', lag=False)
+
+def create_queries(count, age_days=0):
+    timestamp = timezone.now() - timedelta(days=age_days)
+    WeatherQuery.objects.bulk_create([
+        WeatherQuery(
+            city=f'City{i}',
+            country='BR',
+            temperature=20,
+            description='Test',
+            humidity=50,
+            pressure=1000,
+            wind_speed=1.0,
+            timestamp=timestamp
+        )
+        for i in range(count)
+    ])
+
+@pytest.mark.django_db
+def test_prune_keeps_newest_rows_in_chunks():
+    """Test row-based retention deleting in small id ranges"""
+    create_queries(20)
+    newest = list(WeatherQuery.objects.order_by('-id').values_list('id', flat=True)[:5])
+
+    assert prune(WeatherQuery, keep_rows=5, chunk_size=3) == 15
+    assert sorted(WeatherQuery.objects.values_list('id', flat=True)) == sorted(newest)
+
+@pytest.mark.django_db
+def test_prune_by_age():
+    """Test age-based retention removes only rows older than the limit"""
+    create_queries(4, age_days=10)
+    create_queries(3, age_days=1)
+
+    assert prune(WeatherQuery, max_age_days=7) == 4
+    assert WeatherQuery.objects.count() == 3
+
+@pytest.mark.django_db
+def test_prune_within_limits_deletes_nothing():
+    """Test nothing is deleted when retention already holds"""
+    create_queries(3)
+
+    assert prune(WeatherQuery, keep_rows=10, max_age_days=7) == 0
+    assert prune(WeatherQuery) == 0
+    assert WeatherQuery.objects.count() == 3
+
+@pytest.mark.django_db
+def test_cleanup_task_applies_settings(settings):
+    """Test the Celery cleanup task uses the configured retention"""
+    settings.WEATHER_HISTORY_RETENTION_ROWS = 2
+    settings.WEATHER_RETENTION_CHUNK_PAUSE = 0
+    create_queries(6)
+    fold()
+
+    result = cleanup_old_weather_queries()
+
+    assert result['deleted'] == 4
+    assert WeatherQuery.objects.count() == 2
+
+@pytest.mark.django_db
+def test_prune_by_age_follows_timestamps_not_ids():
+    """Test rows inserted late with an old timestamp are pruned and newer, lower ids kept"""
+    create_queries(3, age_days=1)
+    create_queries(2, age_days=10)  # write-behind rows: higher ids, older timestamps
+    kept = set(WeatherQuery.objects.filter(timestamp__gte=timezone.now() - timedelta(days=7)).values_list('id', flat=True))
+
+    assert prune(WeatherQuery, max_age_days=7, chunk_size=1) == 2
+    assert set(WeatherQuery.objects.values_list('id', flat=True)) == kept
+
+@pytest.mark.django_db
+def test_prune_keeps_rows_not_rolled_up():
+    """Test keep_unrolled holds rows above the rollup watermark back, with a warning"""
+    create_queries(4, age_days=10)
+    fold()
+    create_queries(3, age_days=10)
+
+    with patch.object(retention.logger, 'warning') as warning:
+        assert prune(WeatherQuery, keep_rows=1, max_age_days=7, keep_unrolled=True) == 4
+    assert WeatherQuery.objects.count() == 3
+    assert warning.call_count == 1
+
+    fold()
+    with patch.object(retention.logger, 'warning') as warning:
+        assert prune(WeatherQuery, max_age_days=7, keep_unrolled=True) == 3
+    assert not warning.called
+
+@pytest.mark.django_db
+def test_cleanup_task_waits_for_rollups(settings):
+    """Test the task deletes nothing before the first rollup run, unlike cleanup_old_queries"""
+    settings.WEATHER_HISTORY_RETENTION_ROWS = 2
+    settings.WEATHER_RETENTION_CHUNK_PAUSE = 0
+    create_queries(6)
+
+    assert cleanup_old_weather_queries()['deleted'] == 0
+    assert WeatherQuery.cleanup_old_queries(keep_last=2) == 4
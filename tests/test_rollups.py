@@ -0,0 +1,94 @@
+import io
+import pytest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from weather import rollups
+from weather.models import WeatherAccess, WeatherQuery, WeatherRollup
+
+START = datetime(2025, 7, 30, 12, 0, tzinfo=dt_timezone.utc)
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Limpa o cache antes e depois de cada teste"""
+    cache.clear()
+    yield
+    cache.clear()
+
+def add_queries(city, *samples):
+    WeatherQuery.objects.bulk_create([
+        WeatherQuery(city=city, country='BR', temperature=temperature, description='Test', humidity=50,
+                     pressure=1000, wind_speed=2.0, timestamp=START + timedelta(minutes=minutes))
+        for minutes, temperature in samples
+    ])
+
+def add_accesses(city, *minutes):
+    WeatherAccess.objects.bulk_create([
+        WeatherAccess(city=city, country='BR', cache_status='fresh', timestamp=START + timedelta(minutes=m))
+        for m in minutes
+    ])
+
+def hourly(city):
+    return list(WeatherRollup.objects.filter(city=city, period=WeatherRollup.HOUR).order_by('bucket'))
+
+@pytest.mark.django_db
+def test_update_lags_one_run():
+    """Testa que cada execução só consolida as linhas vistas pela execução anterior"""
+    add_queries('Recife', (0, 20.0), (30, 24.0))
+    add_accesses('Recife', 0, 1, 2)
+
+    assert rollups.update_all() == {'weather_query': 0, 'weather_access': 0}
+    assert rollups.update_all() == {'weather_query': 2, 'weather_access': 3}
+
+    [rollup] = hourly('Recife')
+    assert (rollup.requests, rollup.samples) == (3, 2)
+    assert (rollup.temperature_avg, rollup.temperature_min, rollup.temperature_max) == (22.0, 20.0, 24.0)
+
+@pytest.mark.django_db
+def test_update_merges_into_existing_buckets():
+    """Testa que novas linhas são somadas aos buckets existentes, em lotes, sem contar duas vezes"""
+    add_queries('Recife', (0, 20.0))
+    rollups.update('weather_query', lag=False)
+    add_queries('Recife', (10, 30.0), (70, 10.0), (80, 12.0))
+    rollups.update('weather_query', batch_size=1, lag=False)
+    rollups.update('weather_query', lag=False)
+
+    assert [(r.samples, r.temperature_min, r.temperature_max) for r in hourly('Recife')] == [(2, 20.0, 30.0), (2, 10.0, 12.0)]
+    [day] = WeatherRollup.objects.filter(period=WeatherRollup.DAY)
+    assert (day.samples, day.temperature_avg) == (4, 18.0)
+
+@pytest.mark.django_db
+def test_stats_endpoint_reads_rollups():
+    """Testa o endpoint de estatísticas por cidade e o ranking sem cidade"""
+    add_queries('Recife', (0, 20.0), (70, 26.0))
+    add_accesses('Recife', 0, 70, 71)
+    add_accesses('Natal', 5)
+    rollups.rebuild()
+    WeatherQuery.objects.all().delete()  # the endpoint must not need the raw rows
+
+    params = {'from': START.isoformat(), 'to': (START + timedelta(hours=3)).isoformat()}
+    response = APIClient().get(reverse('weather-stats'), {'city': 'Recife', **params})
+    assert response.status_code == status.HTTP_200_OK
+    assert [(b['requests'], b['samples'], b['temperature']['avg']) for b in response.data['buckets']] == [(1, 1, 20.0), (2, 1, 26.0)]
+
+    response = APIClient().get(reverse('weather-stats'), params)
+    assert [(c['city'], c['requests']) for c in response.data['cities']] == [('Recife', 3), ('Natal', 1)]
+    assert response.data['cities'][0]['temperature'] == {'avg': 23.0, 'min': 20.0, 'max': 26.0}
+
+    response = APIClient().get(reverse('weather-stats'), {'period': 'week'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.django_db
+def test_rebuild_command():
+    """Testa que o comando de rebuild recalcula os rollups do zero"""
+    add_queries('Recife', (0, 20.0))
+    rollups.update('weather_query', lag=False)
+    WeatherRollup.objects.update(samples=99)
+
+    call_command('rebuild_weather_rollups', stdout=io.StringIO())
+
+    [rollup] = hourly('Recife')
+    assert rollup.samples == 1
@@ -0,0 +1,77 @@
+import json
+import pytest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from weather import locations, series
+from weather.models import WeatherQuery
+
+START = datetime(2025, 7, 30, 12, 0, tzinfo=dt_timezone.utc)
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Limpa o cache antes e depois de cada teste"""
+    cache.clear()
+    yield
+    cache.clear()
+
+@pytest.fixture
+def rows():
+    def make(city, minutes, temperature):
+        return WeatherQuery(city=city, country='BR', temperature=temperature, description='Test',
+                            humidity=50, pressure=1000, wind_speed=2.0,
+                            timestamp=START + timedelta(minutes=minutes))
+    WeatherQuery.objects.bulk_create([
+        make('São Paulo', 0, 20.0),
+        make('São Paulo', 30, 22.0),
+        make('São Paulo', 70, 25.0),
+        make('São Paulo', 200, 30.0),  # outside the range below
+        make('Recife', 10, 31.0),
+    ])
+
+def get_series(**params):
+    response = APIClient().get(reverse('weather-series'), params)
+    return response, json.loads(b''.join(response.streaming_content)) if response.status_code == 200 else None
+
+@pytest.mark.django_db
+def test_series_buckets_by_hour(rows):
+    """Test rows are aggregated per hour bucket for the city and range only"""
+    response, body = get_series(city='São Paulo', country='BR', bucket='1h',
+                                **{'from': START.isoformat(), 'to': (START + timedelta(hours=2)).isoformat()})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Content-Type'] == 'application/json'
+    assert (body['city'], body['country'], body['bucket']) == ('São Paulo', 'BR', '1h')
+    assert [point['samples'] for point in body['points']] == [2, 1]
+    assert body['points'][0]['temperature'] == {'avg': 21.0, 'min': 20.0, 'max': 22.0}
+    assert body['points'][1]['temperature']['avg'] == 25.0
+
+@pytest.mark.django_db
+def test_series_day_bucket_and_empty_range(rows):
+    """Test coarser buckets, inputs resolved through learned aliases and ranges without rows"""
+    locations.learn('sao paulo', '', {'id': 3448439, 'name': 'São Paulo', 'sys': {'country': 'BR'}})
+    _, body = get_series(city='sao paulo', bucket='1d', **{'from': (START - timedelta(days=1)).isoformat()})
+    assert body['city'] == 'São Paulo'
+    assert sum(point['samples'] for point in body['points']) == 4
+
+    _, body = get_series(city='Recife', **{'from': '2020-01-01T00:00:00Z', 'to': '2020-01-02T00:00:00Z'})
+    assert body['points'] == []
+
+@pytest.mark.django_db
+def test_series_validation():
+    """Test invalid buckets and reversed ranges are rejected"""
+    response, _ = get_series(city='Recife', bucket='5m', **{'from': START.isoformat()})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response, _ = get_series(city='Recife', **{'from': START.isoformat(), 'to': (START - timedelta(hours=1)).isoformat()})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_stream_json_batches():
+    """Test the streamed document is valid JSON whatever the batch boundaries"""
+    point = {'bucket': START, 'samples': 1, 'temperature_avg': 1.0, 'temperature_min': 1.0, 'temperature_max': 1.0,
+             'humidity_avg': 1.0, 'pressure_avg': 1.0, 'wind_speed_avg': 1.0}
+    for count in (0, 1, 2, 5):
+        body = b''.join(series.stream_json({'city': 'X'}, [point] * count, batch_size=2))
+        assert len(json.loads(body)['points']) == count
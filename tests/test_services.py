@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import patch, Mock
 from django.core.cache import cache
+from weather import locations
 from weather.services import WeatherService
 from weather.models import WeatherQuery
 
@@ -12,8 +13,8 @@ def clear_cache():
     cache.clear()
 
 @pytest.mark.django_db
-@patch('weather.services.requests.get')
-def test_fetch_from_api_success(mock_get):
+@patch('weather.services.get_client')
+def test_fetch_from_api_success(mock_client):
     """Test successful API call"""
     service = WeatherService()
 
@@ -30,6 +31,7 @@ def test_fetch_from_api_success(mock_get):
         'weather': [{'description': 'clear sky'}],
         'wind': {'speed': 5.2}
     }
+    mock_get = mock_client.return_value.get
     mock_get.return_value = mock_response
 
     result = service._fetch_from_api('São Paulo', 'BR')
@@ -40,20 +42,21 @@ def test_fetch_from_api_success(mock_get):
     assert result['description'] == 'Clear Sky'
 
 @pytest.mark.django_db
-@patch('weather.services.requests.get')
-def test_fetch_from_api_city_not_found(mock_get):
+@patch('weather.services.get_client')
+def test_fetch_from_api_city_not_found(mock_client):
     """Test API call with city not found"""
     service = WeatherService()
     mock_response = Mock()
     mock_response.status_code = 404
+    mock_get = mock_client.return_value.get
     mock_get.return_value = mock_response
 
     with pytest.raises(ValueError, match="not found"):
         service._fetch_from_api('InvalidCity')
 
 @pytest.mark.django_db
-@patch('weather.services.requests.get')
-def test_get_weather_with_cache(mock_get):
+@patch('weather.services.get_client')
+def test_get_weather_with_cache(mock_client):
     """Test weather retrieval with caching"""
     service = WeatherService()
 
@@ -66,6 +69,7 @@ def test_get_weather_with_cache(mock_get):
         'weather': [{'description': 'clear sky'}],
         'wind': {'speed': 5.2}
     }
+    mock_get = mock_client.return_value.get
     mock_get.return_value = mock_response
 
     # First call - hits API
@@ -87,9 +91,52 @@ def test_get_cache_key():
     key2 = service._get_cache_key('são paulo', 'br')
     key3 = service._get_cache_key('São Paulo')
 
-    assert key1 == 'weather:são paulo:br'
+    assert key1 == 'weather:sao paulo:br'
     assert key1 == key2  # Case insensitive
-    assert key3 == 'weather:são paulo'
+    assert key3 == 'weather:sao paulo'
+
+def test_get_cache_key_folds_accents_and_whitespace():
+    """Test spelling variants of the same input share a key"""
+    service = WeatherService()
+
+    assert service._get_cache_key('  Sao   Paulo ') == service._get_cache_key('São Paulo')
+    assert service._get_cache_key('sao paulo,BR') == service._get_cache_key('São Paulo', 'BR')
+
+@pytest.mark.django_db
+@patch('weather.services.get_client')
+def test_variants_share_entry_after_alias_learned(mock_client):
+    """Test an input without country reuses the entry of the place upstream returned"""
+    mock_response = Mock(status_code=200)
+    mock_response.json.return_value = {
+        'id': 3448439,
+        'name': 'São Paulo',
+        'sys': {'country': 'BR'},
+        'main': {'temp': 25.5, 'humidity': 60, 'pressure': 1013},
+        'weather': [{'description': 'clear sky'}],
+        'wind': {'speed': 5.2}
+    }
+    mock_client.return_value.get.return_value = mock_response
+    service = WeatherService()
+
+    _, cached1 = service.get_weather('Sao Paulo')
+    _, cached2 = service.get_weather('São Paulo', 'BR')
+    _, cached3 = service.get_weather('sao  paulo')
+
+    assert (cached1, cached2, cached3) == (False, True, True)
+    assert mock_client.return_value.get.call_count == 1
+    assert service._get_cache_key('Sao Paulo') == 'weather:sao paulo:br'
+
+def test_unknown_alias_lookup_is_cached_locally():
+    """Test an input not learned yet only asks the shared cache again after learn"""
+    data = {'id': 3397277, 'name': 'Natal', 'sys': {'country': 'BR'}}
+
+    with patch('weather.locations.cache.get', return_value=None) as mock_get:
+        assert locations.resolve('Natal') is None
+        assert locations.resolve('natal') is None
+        assert mock_get.call_count == 1
+
+    locations.learn('Natal', '', data)
+    assert locations.resolve('natal')['country'] == 'BR'
 
 @pytest.mark.django_db
 def test_get_query_history():
@@ -0,0 +1,103 @@
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from django.core.cache import cache
+from weather.services import WeatherService
+from weather.singleflight import SingleFlight, cache_lock
+from weather.models import WeatherQuery
+
+WEATHER_DATA = {
+    'city': 'São Paulo',
+    'country': 'BR',
+    'temperature': 25.5,
+    'description': 'Clear Sky',
+    'humidity': 60,
+    'pressure': 1013,
+    'wind_speed': 5.2,
+}
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Limpa o cache antes e depois de cada teste"""
+    cache.clear()
+    yield
+    cache.clear()
+
+def test_single_flight_shares_result():
+    """Test concurrent calls for the same key run the function once"""
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        release.wait(2)
+        return 42
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do('k', slow)))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert [value for value, _ in results] == [42] * 5
+    assert sum(1 for _, shared in results if not shared) == 1
+
+def test_single_flight_propagates_errors():
+    """Test the leader's exception is raised and the key is released"""
+    flight = SingleFlight()
+
+    def failing():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        flight.do('k', failing)
+
+    assert flight.do('k', lambda: 1) == (1, False)
+
+def test_cache_lock_is_exclusive():
+    """Test the cross-worker lock can only be held once"""
+    with cache_lock('weather:test:lock', 5) as first:
+        with cache_lock('weather:test:lock', 5) as second:
+            assert first is True
+            assert second is False
+    assert cache.get('weather:test:lock') is None
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_misses_make_one_upstream_call():
+    """Test N simultaneous cache misses produce a single API call and insert"""
+    n = 10
+    barrier = threading.Barrier(n)
+    calls = []
+
+    def fake_fetch(city, country=''):
+        calls.append(city)
+        time.sleep(0.2)
+        return dict(WEATHER_DATA)
+
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(WeatherService().get_weather('São Paulo', 'BR'))
+
+    with patch.object(WeatherService, '_fetch_from_api', side_effect=fake_fetch):
+        threads = [threading.Thread(target=worker) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    assert len(calls) == 1
+    assert len(results) == n
+    assert WeatherQuery.objects.count() == 1
+    assert all(data['temperature'] == 25.5 for data, _ in results)
+    assert sum(1 for _, cached in results if not cached) == 1
@@ -0,0 +1,62 @@
+import pytest
+from unittest.mock import patch
+from django.core.cache import cache
+from rest_framework.test import APIRequestFactory
+from weather.throttling import AnonWindowThrottle
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Limpa o cache antes e depois de cada teste"""
+    cache.clear()
+    yield
+    cache.clear()
+
+@pytest.fixture
+def make_request():
+    factory = APIRequestFactory()
+    def make(ip='10.0.0.1'):
+        request = factory.get('/api/v1/weather/history/', REMOTE_ADDR=ip)
+        request.user = None
+        return request
+    return make
+
+def hit(throttle_class, request, now):
+    throttle = throttle_class()
+    with patch.object(throttle, 'timer', return_value=now):
+        return throttle.allow_request(request, None), throttle
+
+@patch.object(AnonWindowThrottle, 'THROTTLE_RATES', {'anon': '3/min'})
+def test_limit_per_client_and_wait(make_request):
+    """Test the rate applies per client and wait points past the window"""
+    results = [hit(AnonWindowThrottle, make_request(), 6000 + i)[0] for i in range(4)]
+    allowed, throttle = hit(AnonWindowThrottle, make_request(), 6005)
+
+    assert results == [True, True, True, False]
+    assert allowed is False
+    assert 0 < throttle.wait() <= 60
+    assert hit(AnonWindowThrottle, make_request('10.0.0.2'), 6005)[0] is True
+
+@patch.object(AnonWindowThrottle, 'THROTTLE_RATES', {'anon': '4/min'})
+def test_previous_window_is_weighted(make_request):
+    """Test requests of the previous window count in proportion to their overlap"""
+    for i in range(4):
+        hit(AnonWindowThrottle, make_request(), 6030 + i)
+
+    # 15s into the next window the previous one still weighs 3/4: 4 * 0.75 = 3
+    assert hit(AnonWindowThrottle, make_request(), 6075)[0] is True
+    assert hit(AnonWindowThrottle, make_request(), 6075)[0] is False
+    # At 45s in it weighs 1/4, leaving room for two more
+    assert [hit(AnonWindowThrottle, make_request(), 6105)[0] for _ in range(3)] == [True, True, False]
+
+@patch.object(AnonWindowThrottle, 'THROTTLE_RATES', {'anon': None})
+def test_no_rate_allows_everything(make_request):
+    """Test a scope without a rate is never throttled"""
+    assert all(hit(AnonWindowThrottle, make_request(), 6000)[0] for _ in range(10))
+
+@patch.object(AnonWindowThrottle, 'THROTTLE_RATES', {'anon': '0/min'})
+def test_zero_rate_waits_a_full_window(make_request):
+    """Test a '0/min' rate denies every request and waits the whole window"""
+    allowed, throttle = hit(AnonWindowThrottle, make_request(), 6010)
+
+    assert allowed is False
+    assert throttle.wait() == 60
@@ -3,7 +3,9 @@ from unittest.mock import patch
 from rest_framework.test import APIClient
 from rest_framework import status
 from weather.models import WeatherQuery
+from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils import timezone
 
 @pytest.fixture
 def api_client():
@@ -40,6 +42,57 @@ def test_get_current_weather_success(mock_get_weather, api_client, urls):
     assert response.data['temperature'] == 25.5
     assert response.data['cached'] is False
 
+@pytest.mark.django_db
+@patch('weather.services.WeatherService.get_weather')
+def test_get_current_weather_fast_json_matches_serializer(mock_get_weather, api_client, urls, settings):
+    """Testa que a resposta pré-codificada de um acerto de cache é idêntica à do serializer"""
+    timestamp = timezone.now()
+    mock_get_weather.side_effect = lambda *args: ({
+        'city': 'São Paulo',
+        'country': 'BR',
+        'temperature': 25.5,
+        'description': 'Clear Sky',
+        'humidity': 60,
+        'pressure': 1013,
+        'wind_speed': 5.2,
+        'cache_status': 'stale',
+        'timestamp': timestamp
+    }, True)
+
+    settings.WEATHER_FAST_JSON = False
+    expected = api_client.post(urls["weather"], {'city': 'São Paulo'}, format='json')
+    settings.WEATHER_FAST_JSON = True
+    first = api_client.post(urls["weather"], {'city': 'São Paulo'}, format='json')
+    second = api_client.post(urls["weather"], {'city': 'São Paulo'}, format='json')
+
+    assert first.content == second.content == expected.content
+    assert first['Content-Type'] == expected['Content-Type']
+    assert first.json()['cached'] is True
+
+@pytest.mark.django_db
+@patch('weather.renderers._MARKER', b'"cached":true,"no_such_field":1')
+@patch('weather.services.WeatherService.get_weather')
+def test_get_current_weather_fast_json_falls_back_without_marker(mock_get_weather, api_client, urls, settings):
+    """Testa que, sem o marcador no JSON pré-codificado, a resposta volta ao serializer"""
+    mock_get_weather.return_value = ({
+        'city': 'Recife',
+        'country': 'BR',
+        'temperature': 30.0,
+        'description': 'Sun',
+        'humidity': 70,
+        'pressure': 1010,
+        'wind_speed': 3.0,
+        'cache_status': 'fresh',
+        'timestamp': timezone.now()
+    }, True)
+
+    settings.WEATHER_FAST_JSON = True
+    response = api_client.post(urls["weather"], {'city': 'Recife'}, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['city'] == 'Recife'
+    assert response.json()['cached'] is True
+
 @pytest.mark.django_db
 def test_get_current_weather_invalid_data(api_client, urls):
     """Testa requisição de clima com dados inválidos"""
@@ -73,8 +126,8 @@ def test_get_weather_history(api_client, urls):
 
     response = api_client.get(urls["history"])
     assert response.status_code == status.HTTP_200_OK
-    assert len(response.data) == 5
-    assert response.data[0]['city'] == 'City4'
+    assert len(response.json()) == 5
+    assert response.json()[0]['city'] == 'City4'
 
 @pytest.mark.django_db
 def test_health_check(api_client, urls):
@@ -85,6 +138,17 @@ def test_health_check(api_client, urls):
     assert 'timestamp' in response.data
     assert 'version' in response.data
 
+@pytest.mark.django_db
+def test_cache_stats(api_client):
+    """Testa endpoint restrito a staff com as taxas de acerto dos caches L1 e L2"""
+    response = api_client.get(reverse('cache-stats'))
+    assert response.status_code in (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN)
+
+    api_client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+    response = api_client.get(reverse('cache-stats'))
+    assert response.status_code == status.HTTP_200_OK
+    assert {'l1_hits', 'l2_hits', 'misses', 'l1_hit_ratio', 'l2_hit_ratio'} <= set(response.data)
+
 @pytest.mark.django_db
 def test_rate_limiting_basic(api_client, urls):
     """Testa rate limiting básico (simples)"""
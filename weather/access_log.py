@@ -0,0 +1,245 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterator, List, Optional
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from .models import WeatherAccess
+
+logger = logging.getLogger('weather')
+
+
+class BufferedAccessSink(ABC):
+    """Append-only access log, buffered in memory.
+
+    append() only serializes the entry and adds it to a list; the buffer is
+    written out when it reaches buffer_size entries, when flush_interval
+    seconds have passed since the last write (by a background thread when
+    no request comes in), and at process exit.
+    """
+
+    def __init__(self, buffer_size: int, flush_interval: float):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def append(self, entry: Dict) -> None:
+        lines = self._buffered(entry)
+        if lines:
+            self._write_safely(lines)
+
+    async def aappend(self, entry: Dict) -> None:
+        """Async variant of append: the write, when one is due, runs in a thread"""
+        lines = self._buffered(entry)
+        if lines:
+            await sync_to_async(self._write_safely, thread_sensitive=False)(lines)
+
+    def _buffered(self, entry: Dict) -> Optional[List[str]]:
+        """Add the entry to the buffer; returns the lines to write out when a write is due"""
+        line = json.dumps(entry, separators=(',', ':'))
+        with self._lock:
+            self._buffer.append(line)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='weather-access-log-writer', daemon=True)
+                self._thread.start()
+            if len(self._buffer) < self.buffer_size and time.monotonic() - self._last_flush < self.flush_interval:
+                return None
+            lines, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        return lines
+
+    def flush(self) -> None:
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        if lines:
+            self._write_safely(lines)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            if self._buffer and time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def _write_safely(self, lines: List[str]) -> None:
+        try:
+            self._write(lines)
+        except Exception:
+            # Losing access entries must never fail a request
+            logger.exception("Error writing %s access log entries", len(lines))
+
+    @abstractmethod
+    def _write(self, lines: List[str]) -> None:
+        """Persist serialized entries"""
+
+    @abstractmethod
+    def drain(self, batch_size: int) -> Iterator[List[Dict]]:
+        """Yield batches of entries ready to be compacted, removing them once consumed"""
+
+
+class FileAccessSink(BufferedAccessSink):
+    """NDJSON files, one per process and time bucket.
+
+    A process only appends to the file of the current bucket, so files of
+    older buckets are complete and can be compacted and deleted without
+    coordinating with the writers.
+    """
+
+    def __init__(self, directory: str, buffer_size: int, flush_interval: float, bucket_seconds: int = 60):
+        super().__init__(buffer_size, flush_interval)
+        self.directory = directory
+        self.bucket_seconds = bucket_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def _bucket(self) -> int:
+        return int(time.time() // self.bucket_seconds)
+
+    def _write(self, lines: List[str]) -> None:
+        path = os.path.join(self.directory, f"access-{self._bucket()}-{os.getpid()}.ndjson")
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def drain(self, batch_size: int) -> Iterator[List[Dict]]:
+        # One batch per file: compact() inserts it in a single transaction and
+        # the file is removed only after that, so a failure never leaves part
+        # of a file inserted and still on disk. Files hold one bucket of one
+        # process, so batch_size is left to the inserts.
+        self.flush()
+        # Leave the previous bucket alone too, a writer may still be finishing it
+        ready_before = self._bucket() - 1
+        for path in sorted(glob.glob(os.path.join(self.directory, 'access-*.ndjson'))):
+            if int(os.path.basename(path).split('-')[1]) >= ready_before:
+                continue
+            with open(path, encoding='utf-8') as f:
+                batch = [json.loads(line) for line in f if line.strip()]
+            if batch:
+                yield batch
+            os.remove(path)
+
+
+class RedisAccessSink(BufferedAccessSink):
+    """Redis stream shared by all workers; entries are pipelined XADDs.
+
+    Needs the django_redis cache backend.
+    """
+
+    stream = 'weather:access'
+
+    def __init__(self, buffer_size: int, flush_interval: float, max_length: int):
+        super().__init__(buffer_size, flush_interval)
+        self.max_length = max_length
+
+    def _connection(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+
+    def _write(self, lines: List[str]) -> None:
+        pipe = self._connection().pipeline(transaction=False)
+        for line in lines:
+            pipe.xadd(self.stream, {'e': line}, maxlen=self.max_length, approximate=True)
+        pipe.execute()
+
+    def drain(self, batch_size: int) -> Iterator[List[Dict]]:
+        self.flush()
+        connection = self._connection()
+        while True:
+            items = connection.xrange(self.stream, '-', '+', count=batch_size)
+            if not items:
+                return
+            yield [json.loads(fields[b'e']) for _, fields in items]
+            connection.xdel(self.stream, *[entry_id for entry_id, _ in items])
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_access_sink():
+    """Return the sink for WEATHER_ACCESS_LOG_SINK, None when disabled"""
+    global _sink
+    kind = settings.WEATHER_ACCESS_LOG_SINK
+    if kind == 'off':
+        return None
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                if kind == 'file':
+                    if not settings.WEATHER_ACCESS_LOG_DIR:
+                        raise ImproperlyConfigured(
+                            "WEATHER_ACCESS_LOG_SINK 'file' needs WEATHER_ACCESS_LOG_DIR, "
+                            "a directory shared with the Celery worker running compact_access_log"
+                        )
+                    _sink = FileAccessSink(
+                        settings.WEATHER_ACCESS_LOG_DIR,
+                        settings.WEATHER_ACCESS_LOG_BUFFER_SIZE,
+                        settings.WEATHER_ACCESS_LOG_FLUSH_INTERVAL,
+                    )
+                elif kind == 'redis':
+                    _sink = RedisAccessSink(
+                        settings.WEATHER_ACCESS_LOG_BUFFER_SIZE,
+                        settings.WEATHER_ACCESS_LOG_FLUSH_INTERVAL,
+                        settings.WEATHER_ACCESS_LOG_STREAM_MAXLEN,
+                    )
+                else:
+                    raise ValueError(f"Unknown WEATHER_ACCESS_LOG_SINK: {kind}")
+    return _sink
+
+
+def _entry(weather_data: Dict, cache_status: str, ip_address: str = None) -> Dict:
+    return {
+        'city': weather_data['city'],
+        'country': weather_data['country'],
+        'cache_status': cache_status,
+        'ip_address': ip_address,
+        'ts': time.time(),
+    }
+
+
+def record(weather_data: Dict, cache_status: str, ip_address: str = None) -> None:
+    """Append one served weather request to the access log"""
+    sink = get_access_sink()
+    if sink is None:
+        return
+    sink.append(_entry(weather_data, cache_status, ip_address))
+
+
+async def arecord(weather_data: Dict, cache_status: str, ip_address: str = None) -> None:
+    """Async variant of record, which never blocks the event loop on file or Redis I/O"""
+    sink = get_access_sink()
+    if sink is None:
+        return
+    await sink.aappend(_entry(weather_data, cache_status, ip_address))
+
+
+def compact(batch_size: int = 5000) -> int:
+    """Move access log entries into WeatherAccess with bulk inserts"""
+    sink = get_access_sink()
+    if sink is None:
+        return 0
+    written = 0
+    for entries in sink.drain(batch_size):
+        # A drained batch is removed from the sink only once this returns,
+        # so it is inserted atomically (bulk_create is one transaction)
+        WeatherAccess.objects.bulk_create([
+            WeatherAccess(
+                city=entry['city'],
+                country=entry['country'],
+                cache_status=entry['cache_status'],
+                ip_address=entry['ip_address'],
+                timestamp=datetime.fromtimestamp(entry['ts'], tz=dt_timezone.utc),
+            )
+            for entry in entries
+        ], batch_size=batch_size)
+        written += len(entries)
+    return written
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import WeatherQuery
+from .models import WeatherAccess, WeatherQuery, WeatherRollup
 
 @admin.register(WeatherQuery)
 class WeatherQueryAdmin(admin.ModelAdmin):
@@ -11,3 +11,24 @@ class WeatherQueryAdmin(admin.ModelAdmin):
     
     def has_add_permission(self, request):
         return False  # Prevent manual creation through admin
+
+@admin.register(WeatherAccess)
+class WeatherAccessAdmin(admin.ModelAdmin):
+    list_display = ['city', 'country', 'cache_status', 'timestamp', 'ip_address']
+    list_filter = ['cache_status', 'country', 'timestamp']
+    search_fields = ['city', 'country']
+    readonly_fields = ['timestamp']
+    ordering = ['-timestamp']
+
+    def has_add_permission(self, request):
+        return False  # Filled from the access log only
+
+@admin.register(WeatherRollup)
+class WeatherRollupAdmin(admin.ModelAdmin):
+    list_display = ['city', 'country', 'period', 'bucket', 'requests', 'samples', 'temperature_min', 'temperature_max']
+    list_filter = ['period', 'country']
+    search_fields = ['city', 'country']
+    ordering = ['-bucket']
+
+    def has_add_permission(self, request):
+        return False  # Maintained by weather.rollups only
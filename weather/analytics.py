@@ -0,0 +1,192 @@
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, List, Optional
+from django.db import connection
+from django.db.models import FloatField, Func
+from .models import WeatherQuery
+
+try:
+    import numpy as np
+except ImportError:  # optional, see check_available()
+    np = None
+
+LOAD_CHUNK_SIZE = 20000
+SECONDS_PER_DAY = 86400.0
+
+
+def check_available() -> None:
+    """Raise ImportError up front when NumPy is not installed"""
+    if np is None:
+        raise ImportError("weather analytics needs numpy")
+
+
+class Epoch(Func):
+    """Seconds since the epoch of a datetime column, computed by the database"""
+    output_field = FloatField()
+    template = 'CAST(EXTRACT(EPOCH FROM %(expressions)s) AS double precision)'
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # Datetimes are stored as UTC text; julianday() parses them, to about 10us
+        return self.as_sql(compiler, connection, template='ROUND((julianday(%(expressions)s) - 2440587.5) * 86400.0, 3)',
+                           **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='UNIX_TIMESTAMP(%(expressions)s)', **extra_context)
+
+
+class History:
+    """WeatherQuery columns as arrays, sorted by place then time.
+
+    place holds an index into places, the (city, country) pairs; the rows
+    of one place are contiguous, so per-city work runs on array segments.
+    """
+
+    def __init__(self, places: List, place, timestamp, temperature):
+        self.places = places
+        self.place = place
+        self.timestamp = timestamp
+        self.temperature = temperature
+        # First row of each place and its row count
+        self.starts = np.flatnonzero(np.r_[True, place[1:] != place[:-1]]) if len(place) else np.empty(0, np.intp)
+        self.counts = np.diff(np.r_[self.starts, len(place)])
+
+    def __len__(self):
+        return len(self.place)
+
+
+def load_history(city: Optional[str] = None, country: Optional[str] = None,
+                 start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 chunk_size: int = LOAD_CHUNK_SIZE) -> History:
+    """Load the selected rows straight from a cursor into NumPy arrays.
+
+    No model instances and no per-value datetime conversion: the database
+    returns epoch seconds, and rows are fetched chunk_size at a time from a
+    server-side cursor where the backend has one. Sorting happens in NumPy.
+    """
+    check_available()
+    queryset = WeatherQuery.objects.all()
+    if city:
+        queryset = queryset.filter(city=city)
+    if country:
+        queryset = queryset.filter(country=country)
+    if start:
+        queryset = queryset.filter(timestamp__gte=start)
+    if end:
+        queryset = queryset.filter(timestamp__lt=end)
+    # Annotations are selected after the model fields, so epoch comes last
+    queryset = queryset.order_by().annotate(epoch=Epoch('timestamp')).values_list('city', 'country', 'temperature', 'epoch')
+    sql, params = queryset.query.sql_with_params()
+
+    codes = {}
+    places, timestamps, temperatures = [], [], []
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            cities, countries, values, seconds = zip(*rows)
+            places.append(np.fromiter(
+                (codes.setdefault((city, country or ''), len(codes)) for city, country in zip(cities, countries)),
+                dtype=np.int32, count=len(rows),
+            ))
+            timestamps.append(np.array(seconds, dtype=np.float64))
+            temperatures.append(np.array(values, dtype=np.float64))
+
+    if not places:
+        return History([], np.empty(0, np.int32), np.empty(0), np.empty(0))
+    place = np.concatenate(places)
+    timestamp = np.concatenate(timestamps)
+    order = np.lexsort((timestamp, place))
+    return History(list(codes), place[order], timestamp[order], np.concatenate(temperatures)[order])
+
+
+def group_stats(history: History) -> Dict:
+    """Per-place sample count, mean, min, max, standard deviation and trend.
+
+    trend is the least-squares slope of temperature over time, in degrees per
+    day (NaN with a single distinct timestamp).
+    """
+    starts, counts = history.starts, history.counts
+    values = history.temperature
+    if not len(history):
+        empty = np.empty(0)
+        return {'samples': counts, 'mean': empty, 'min': empty, 'max': empty, 'std': empty, 'trend': empty}
+
+    mean = np.add.reduceat(values, starts) / counts
+    deviation = values - np.repeat(mean, counts)
+    # Centred per place, so the epoch offset does not swamp the sums
+    days = history.timestamp / SECONDS_PER_DAY
+    days = days - np.repeat(np.add.reduceat(days, starts) / counts, counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        trend = np.add.reduceat(days * deviation, starts) / np.add.reduceat(days * days, starts)
+    return {
+        'samples': counts,
+        'mean': mean,
+        'min': np.minimum.reduceat(values, starts),
+        'max': np.maximum.reduceat(values, starts),
+        'std': np.sqrt(np.add.reduceat(deviation * deviation, starts) / counts),
+        'trend': trend,
+    }
+
+
+def rolling_mean(history: History, window: int):
+    """Mean of each sample and up to window - 1 samples before it of the same place"""
+    index = np.arange(len(history))
+    low = np.maximum(index - window + 1, np.repeat(history.starts, history.counts))
+    totals = np.r_[0.0, np.cumsum(history.temperature)]
+    return (totals[index + 1] - totals[low]) / (index + 1 - low)
+
+
+def zscores(history: History, stats: Optional[Dict] = None):
+    """Distance of each sample from its place's mean, in standard deviations (0 when constant)"""
+    stats = stats or group_stats(history)
+    std = np.repeat(stats['std'], history.counts)
+    deviation = history.temperature - np.repeat(stats['mean'], history.counts)
+    return np.divide(deviation, std, out=np.zeros_like(deviation), where=std > 0)
+
+
+def _float(value) -> Optional[float]:
+    return float(value) if np.isfinite(value) else None
+
+
+def report(history: History, window: int = 24, threshold: float = 3.0, limit: int = 50) -> Dict:
+    """Per-city statistics and the strongest anomalies (|z| >= threshold), most extreme first"""
+    stats = group_stats(history)
+    rolling = rolling_mean(history, window)
+    z = zscores(history, stats)
+    flagged = np.abs(z) >= threshold
+    anomaly_counts = np.add.reduceat(flagged, history.starts) if len(history) else np.empty(0, np.intp)
+
+    cities = []
+    for i, (city, country) in enumerate(history.places):
+        last = history.starts[i] + history.counts[i] - 1
+        cities.append({
+            'city': city,
+            'country': country,
+            'samples': int(stats['samples'][i]),
+            'temperature': {
+                'avg': float(stats['mean'][i]),
+                'min': float(stats['min'][i]),
+                'max': float(stats['max'][i]),
+                'std': float(stats['std'][i]),
+            },
+            'trend_per_day': _float(stats['trend'][i]),
+            'rolling_avg': float(rolling[last]),
+            'anomalies': int(anomaly_counts[i]),
+        })
+    cities.sort(key=lambda row: (-row['samples'], row['city']))
+
+    rows = np.flatnonzero(flagged)
+    rows = rows[np.argsort(-np.abs(z[rows]), kind='stable')][:limit]
+    anomalies = [
+        {
+            'city': history.places[history.place[row]][0],
+            'country': history.places[history.place[row]][1],
+            'timestamp': datetime.fromtimestamp(history.timestamp[row], tz=dt_timezone.utc),
+            'temperature': float(history.temperature[row]),
+            'rolling_avg': float(rolling[row]),
+            'zscore': float(z[row]),
+        }
+        for row in rows
+    ]
+    return {'cities': cities, 'anomalies': anomalies}
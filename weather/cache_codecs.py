@@ -0,0 +1,174 @@
+import math
+import pickle
+import struct
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Optional
+
+try:
+    import msgpack
+except ImportError:  # optional, only MsgpackCodec needs it
+    msgpack = None
+
+# First byte of every encoded entry, so old and new formats can be read side
+# by side while a codec change rolls out
+PICKLE_V0 = 0
+STRUCT_V1 = 1
+MSGPACK_V1 = 2
+
+_FIELDS = {'city', 'country', 'description', 'temperature', 'humidity', 'pressure', 'wind_speed', 'timestamp'}
+
+# soft_expires_at, delta, timestamp (epoch microseconds), temperature and
+# wind_speed (tenths), humidity, pressure; then city, country and description
+# as NUL-separated UTF-8
+_STRUCT = struct.Struct('<ddqhHHH')
+_NO_TIMESTAMP = -2 ** 63
+
+
+def _to_micros(value: Optional[datetime]) -> int:
+    if value is None:
+        return _NO_TIMESTAMP
+    delta = value - datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _from_micros(value: int) -> Optional[datetime]:
+    if value == _NO_TIMESTAMP:
+        return None
+    seconds, micros = divmod(value, 1_000_000)
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc).replace(microsecond=micros)
+
+
+def _tenths(value, low: int, high: int) -> Optional[int]:
+    """value * 10 as an int if that is exact and fits, else None"""
+    if not isinstance(value, (int, float)) or math.isnan(value):
+        return None
+    scaled = round(value * 10)
+    if abs(value * 10 - scaled) > 1e-6 or not low <= scaled <= high:
+        return None
+    return scaled
+
+
+class PickleCodec:
+    """Stores entries as they are; the cache backend pickles them"""
+
+    def encode(self, entry: Dict):
+        return entry
+
+    def decode(self, value):
+        return decode(value)
+
+
+class StructCodec:
+    """Fixed binary layout for weather entries.
+
+    About a quarter of the pickled size. Entries that don't fit the layout
+    (extra fields, unexpected types or ranges) are pickled behind the
+    PICKLE_V0 byte instead.
+    """
+
+    def encode(self, entry: Dict) -> bytes:
+        packed = self._pack(entry)
+        if packed is None:
+            return bytes([PICKLE_V0]) + pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        return packed
+
+    def decode(self, value):
+        return decode(value)
+
+    @staticmethod
+    def _pack(entry: Dict) -> Optional[bytes]:
+        data = entry.get('data')
+        if not isinstance(data, dict) or not set(data) <= _FIELDS or not set(data) >= _FIELDS - {'timestamp'}:
+            return None
+        if set(entry) != {'data', 'soft_expires_at', 'delta'}:
+            return None
+        temperature = _tenths(data['temperature'], -32768, 32767)
+        wind_speed = _tenths(data['wind_speed'], 0, 65535)
+        humidity, pressure = data['humidity'], data['pressure']
+        timestamp = data.get('timestamp')
+        strings = (data['city'], data['country'], data['description'])
+        if (temperature is None or wind_speed is None
+                or type(humidity) is not int or not 0 <= humidity <= 65535
+                or type(pressure) is not int or not 0 <= pressure <= 65535
+                or not (timestamp is None or isinstance(timestamp, datetime) and timestamp.tzinfo is not None)
+                or not all(isinstance(s, str) and '\x00' not in s for s in strings)):
+            return None
+        return bytes([STRUCT_V1]) + _STRUCT.pack(
+            entry['soft_expires_at'], entry['delta'], _to_micros(timestamp),
+            temperature, humidity, pressure, wind_speed,
+        ) + '\x00'.join(strings).encode('utf-8')
+
+    @staticmethod
+    def unpack(value: bytes) -> Dict:
+        soft_expires_at, delta, micros, temperature, humidity, pressure, wind_speed = _STRUCT.unpack_from(value, 1)
+        city, country, description = value[1 + _STRUCT.size:].decode('utf-8').split('\x00')
+        data = {
+            'city': city,
+            'country': country,
+            'temperature': temperature / 10,
+            'description': description,
+            'humidity': humidity,
+            'pressure': pressure,
+            'wind_speed': wind_speed / 10,
+        }
+        timestamp = _from_micros(micros)
+        if timestamp is not None:
+            data['timestamp'] = timestamp
+        return {'data': data, 'soft_expires_at': soft_expires_at, 'delta': delta}
+
+
+class MsgpackCodec:
+    """msgpack maps; needs the msgpack package"""
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("WEATHER_CACHE_CODEC 'msgpack' needs the msgpack package")
+
+    def encode(self, entry: Dict) -> bytes:
+        data = dict(entry['data'])
+        if isinstance(data.get('timestamp'), datetime):
+            data['timestamp'] = _to_micros(data['timestamp'])
+        return bytes([MSGPACK_V1]) + msgpack.packb({**entry, 'data': data}, use_bin_type=True)
+
+    def decode(self, value):
+        return decode(value)
+
+    @staticmethod
+    def unpack(value: bytes) -> Dict:
+        entry = msgpack.unpackb(value[1:], raw=False)
+        if isinstance(entry['data'].get('timestamp'), int):
+            entry['data']['timestamp'] = _from_micros(entry['data']['timestamp'])
+        return entry
+
+
+def decode(value):
+    """Decode a stored entry written by any codec.
+
+    Values that are not bytes were stored by PickleCodec (or before codecs
+    existed) and are returned unchanged. Unknown versions, and msgpack
+    entries on a worker without msgpack, decode to None, i.e. a cache miss.
+    """
+    if not isinstance(value, bytes) or not value:
+        return value
+    version = value[0]
+    if version == STRUCT_V1:
+        return StructCodec.unpack(value)
+    if version == PICKLE_V0:
+        return pickle.loads(value[1:])
+    if version == MSGPACK_V1 and msgpack is not None:
+        return MsgpackCodec.unpack(value)
+    return None
+
+
+CODECS = {
+    'pickle': PickleCodec,
+    'struct': StructCodec,
+    'msgpack': MsgpackCodec,
+}
+
+
+def get_codec(name: str):
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown WEATHER_CACHE_CODEC: {name}")
@@ -0,0 +1,293 @@
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from . import cache_codecs
+
+logger = logging.getLogger('weather')
+
+FRESH = 'fresh'
+STALE = 'stale'
+REFRESHED = 'refreshed'
+
+
+def make_entry(data: Dict, soft_timeout: int, delta: float) -> Dict:
+    """Wrap weather data with its soft expiry and the time it took to compute.
+
+    The entry itself is stored with the hard timeout; between the soft and the
+    hard expiry it is served stale while a refresh runs in the background.
+    """
+    return {
+        'data': data,
+        'soft_expires_at': time.time() + soft_timeout,
+        'delta': delta,
+    }
+
+
+def unwrap(entry) -> Optional[Dict]:
+    """Return the entry if it is a cache envelope, None otherwise"""
+    if isinstance(entry, dict) and 'soft_expires_at' in entry:
+        return entry
+    return None
+
+
+def is_stale(entry: Dict) -> bool:
+    return time.time() >= entry['soft_expires_at']
+
+
+def should_refresh_early(entry: Dict, beta: float) -> bool:
+    """XFetch probabilistic early expiration.
+
+    Refresh before the soft expiry with a probability that grows as it
+    approaches, scaled by how long the last recompute took, so hot keys
+    don't all expire at the same moment.
+    """
+    if beta <= 0:
+        return False
+    jitter = -entry['delta'] * beta * math.log(1.0 - random.random())
+    return time.time() + jitter >= entry['soft_expires_at']
+
+
+# Assumed size of an L1 entry when its encoded size is unknown (PickleCodec
+# leaves encoding to the backend); a weather entry pickles to a few hundred bytes
+ENTRY_SIZE = 1024
+
+
+def _encoded_size(encoded) -> int:
+    return len(encoded) if isinstance(encoded, bytes) else ENTRY_SIZE
+
+
+class LocalCache:
+    """Bounded per-process LRU cache with a TTL and an approximate memory cap.
+
+    Values are kept as live objects (no pickling on hits), so callers must
+    not mutate what they get back. The memory cap counts the size the caller
+    passes for each entry (TieredCache uses the encoded L2 value), else a
+    fixed ENTRY_SIZE.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at, _ = item
+            if time.monotonic() >= expires_at:
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, size: int = ENTRY_SIZE) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _pop(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    """Weather entry cache: a LocalCache (L1) in front of the Django cache (L2).
+
+    Writes go to both tiers. With pub/sub enabled, every write or delete is
+    announced on a Redis channel and the other processes drop their L1 copy;
+    without it L1 entries are only bounded by the L1 TTL. L2 values go
+    through codec (see weather.cache_codecs); L1 keeps decoded entries.
+    """
+
+    channel = 'weather:l1:invalidate'
+
+    def __init__(self, l2, l1: Optional[LocalCache] = None, pubsub: bool = False, codec=None):
+        self.l2 = l2
+        self.l1 = l1
+        self.codec = codec or cache_codecs.PickleCodec()
+        self.pubsub = pubsub and l1 is not None
+        self.origin = uuid.uuid4().hex
+        self._stats = {'l1_hits': 0, 'l2_hits': 0, 'misses': 0}
+        if self.pubsub:
+            threading.Thread(target=self._listen, name='weather-l1-invalidation', daemon=True).start()
+
+    def get(self, key: str):
+        if self.l1 is not None:
+            value = self.l1.get(key)
+            if value is not None:
+                self._stats['l1_hits'] += 1
+                return value
+        encoded = self.l2.get(key)
+        value = self.codec.decode(encoded)
+        self._count_l2(value, key, encoded)
+        return value
+
+    async def aget(self, key: str):
+        if self.l1 is not None:
+            value = self.l1.get(key)
+            if value is not None:
+                self._stats['l1_hits'] += 1
+                return value
+        encoded = await self.l2.aget(key)
+        value = self.codec.decode(encoded)
+        self._count_l2(value, key, encoded)
+        return value
+
+    def get_many(self, keys: List[str]) -> Dict:
+        found = {}
+        if self.l1 is not None:
+            for key in keys:
+                value = self.l1.get(key)
+                if value is not None:
+                    found[key] = value
+            self._stats['l1_hits'] += len(found)
+        remaining = [key for key in keys if key not in found]
+        if remaining:
+            from_l2 = self.l2.get_many(remaining)
+            for key in remaining:
+                value = self.codec.decode(from_l2.get(key))
+                self._count_l2(value, key, from_l2.get(key))
+                if value is not None:
+                    found[key] = value
+        return found
+
+    def set(self, key: str, value, timeout: int) -> None:
+        encoded = self.codec.encode(value)
+        self.l2.set(key, encoded, timeout)
+        self._set_local(key, value, encoded)
+        self._announce([key])
+
+    async def aset(self, key: str, value, timeout: int) -> None:
+        encoded = self.codec.encode(value)
+        await self.l2.aset(key, encoded, timeout)
+        self._set_local(key, value, encoded)
+        if self.pubsub:
+            await sync_to_async(self._announce, thread_sensitive=False)([key])
+
+    def set_many(self, mapping: Dict, timeout: int) -> None:
+        encoded = {key: self.codec.encode(value) for key, value in mapping.items()}
+        self.l2.set_many(encoded, timeout)
+        for key, value in mapping.items():
+            self._set_local(key, value, encoded[key])
+        self._announce(list(mapping))
+
+    async def aset_many(self, mapping: Dict, timeout: int) -> None:
+        encoded = {key: self.codec.encode(value) for key, value in mapping.items()}
+        await self.l2.aset_many(encoded, timeout)
+        for key, value in mapping.items():
+            self._set_local(key, value, encoded[key])
+        if self.pubsub:
+            await sync_to_async(self._announce, thread_sensitive=False)(list(mapping))
+
+    def delete(self, key: str) -> None:
+        self.l2.delete(key)
+        if self.l1 is not None:
+            self.l1.delete(key)
+        self._announce([key])
+
+    def stats(self) -> Dict:
+        """Hit counters and ratios for this process"""
+        stats = dict(self._stats)
+        total = sum(stats.values())
+        stats['l1_hit_ratio'] = stats['l1_hits'] / total if total else 0.0
+        stats['l2_hit_ratio'] = stats['l2_hits'] / total if total else 0.0
+        stats['l1_entries'] = len(self.l1) if self.l1 is not None else 0
+        return stats
+
+    def _count_l2(self, value, key: str, encoded) -> None:
+        if value is None:
+            self._stats['misses'] += 1
+        else:
+            self._stats['l2_hits'] += 1
+            self._set_local(key, value, encoded)
+
+    def _set_local(self, key: str, value, encoded) -> None:
+        """Promote to L1, sized by the encoded L2 value so nothing is pickled here"""
+        if self.l1 is not None:
+            self.l1.set(key, value, _encoded_size(encoded))
+
+    def _redis(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+
+    def _announce(self, keys: List[str]) -> None:
+        if not self.pubsub:
+            return
+        try:
+            pipe = self._redis().pipeline(transaction=False)
+            for key in keys:
+                pipe.publish(self.channel, f"{self.origin} {key}")
+            pipe.execute()
+        except Exception:
+            logger.exception("Error publishing L1 cache invalidation")
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self._redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    origin, _, key = message['data'].decode().partition(' ')
+                    if origin != self.origin:
+                        self.l1.delete(key)
+            except Exception:
+                logger.exception("L1 cache invalidation listener failed, reconnecting")
+                # Invalidations may have been missed while disconnected
+                self.l1.clear()
+                time.sleep(1)
+
+
+_weather_cache = None
+_weather_cache_lock = threading.Lock()
+
+
+def get_weather_cache() -> TieredCache:
+    """Return the process-wide two-tier cache for weather entries"""
+    global _weather_cache
+    if _weather_cache is None:
+        with _weather_cache_lock:
+            if _weather_cache is None:
+                l1 = None
+                if settings.WEATHER_L1_MAX_ENTRIES > 0:
+                    l1 = LocalCache(
+                        settings.WEATHER_L1_MAX_ENTRIES,
+                        settings.WEATHER_L1_MAX_BYTES,
+                        settings.WEATHER_L1_TTL,
+                    )
+                _weather_cache = TieredCache(
+                    cache, l1,
+                    pubsub=settings.WEATHER_L1_PUBSUB,
+                    codec=cache_codecs.get_codec(settings.WEATHER_CACHE_CODEC),
+                )
+    return _weather_cache
@@ -0,0 +1,143 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+from .models import WeatherQuery
+
+COLUMNS = [
+    'id', 'city', 'country', 'temperature', 'description',
+    'humidity', 'pressure', 'wind_speed', 'ip_address', 'timestamp',
+]
+
+EXPORT_CHUNK_SIZE = 5000
+
+# output -> (content type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def export_rows(city: Optional[str] = None, country: Optional[str] = None,
+                start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[Tuple]:
+    """WeatherQuery rows as tuples in COLUMNS order, read with a server-side cursor.
+
+    Ordered by primary key so the scan needs no sort; with a city the
+    (city, -timestamp) index narrows it first.
+    """
+    queryset = WeatherQuery.objects.all()
+    if city:
+        queryset = queryset.filter(city=city)
+    if country:
+        queryset = queryset.filter(country=country)
+    if start:
+        queryset = queryset.filter(timestamp__gte=start)
+    if end:
+        queryset = queryset.filter(timestamp__lt=end)
+    return queryset.order_by('id').values_list(*COLUMNS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _batches(rows: Iterable[Tuple], size: int) -> Iterator[List[Tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def csv_chunks(rows: Iterable[Tuple], batch_size: int = 1000) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for batch in _batches(rows, batch_size):
+        writer.writerows(
+            row[:-1] + (row[-1].isoformat(),) for row in batch
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header only, no rows
+        yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(rows: Iterable[Tuple], batch_size: int = 1000) -> Iterator[bytes]:
+    for batch in _batches(rows, batch_size):
+        yield ''.join(
+            json.dumps(dict(zip(COLUMNS, row[:-1] + (row[-1].isoformat(),))), ensure_ascii=False) + '\n'
+            for row in batch
+        ).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file collecting what the Parquet writer produces until it is taken"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self) -> bytes:
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def parquet_chunks(rows: Iterable[Tuple], row_group_size: int = 50000) -> Iterator[bytes]:
+    """Parquet file, one row group per row_group_size rows. Needs pyarrow."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('city', pa.string()),
+        ('country', pa.string()),
+        ('temperature', pa.float64()),
+        ('description', pa.string()),
+        ('humidity', pa.int32()),
+        ('pressure', pa.int32()),
+        ('wind_speed', pa.float64()),
+        ('ip_address', pa.string()),
+        ('timestamp', pa.timestamp('us', tz='UTC')),
+    ])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in _batches(rows, row_group_size):
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ))
+            yield sink.take()
+    yield sink.take()
+
+
+WRITERS = {
+    'csv': csv_chunks,
+    'ndjson': ndjson_chunks,
+    'parquet': parquet_chunks,
+}
+
+
+def check_output(output: str) -> None:
+    """Raise ImportError up front when the output format needs a missing package"""
+    if output == 'parquet':
+        import pyarrow  # noqa: F401
+
+
+def export_chunks(output: str, rows: Iterable[Tuple]) -> Iterator[bytes]:
+    """Encoded export of rows in the given output format, in constant memory"""
+    return WRITERS[output](rows)
@@ -0,0 +1,133 @@
+import math
+import threading
+from typing import Dict, Optional, Tuple
+from django.conf import settings
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def geohash(lat: float, lon: float, precision: int) -> str:
+    """Geohash of the cell containing the point (precision 5 is about 4.9 x 4.9 km)"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_center(cell: str) -> Tuple[float, float]:
+    """Latitude and longitude of the centre of a geohash cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def snap(lat: float, lon: float, precision: Optional[int] = None) -> Tuple[str, float, float]:
+    """The WEATHER_GEO_PRECISION cell of a point and its centre"""
+    cell = geohash(lat, lon, precision or settings.WEATHER_GEO_PRECISION)
+    return (cell, *cell_center(cell))
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle (haversine) distance"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """Places with known coordinates, bucketed in a grid of cell_km cells.
+
+    nearest() only looks at the cells around the point that can hold a place
+    within the radius, so lookups stay O(places per cell) however many places
+    are indexed. A place is indexed once per (city, country).
+    """
+
+    def __init__(self, cell_km: float):
+        self.cell_deg = max(cell_km, 0.1) / KM_PER_DEGREE
+        self.columns = math.ceil(360 / self.cell_deg)
+        self._cells = {}
+        self._places = {}
+        self._lock = threading.Lock()
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor((lon + 180) / self.cell_deg) % self.columns
+
+    def add(self, lat: float, lon: float, place: Dict) -> None:
+        name = (place['city'], place['country'])
+        cell = self._cell(lat, lon)
+        with self._lock:
+            previous = self._places.get(name)
+            if previous is not None:
+                if previous == cell:
+                    self._cells[cell][name] = (lat, lon, place)
+                    return
+                self._cells[previous].pop(name, None)
+            self._places[name] = cell
+            self._cells.setdefault(cell, {})[name] = (lat, lon, place)
+
+    def nearest(self, lat: float, lon: float, radius_km: float) -> Optional[Dict]:
+        """Closest indexed place within radius_km of the point, if any"""
+        rows = math.ceil(radius_km / KM_PER_DEGREE / self.cell_deg)
+        # Longitude degrees shrink towards the poles, so more columns are in range
+        shrink = max(math.cos(math.radians(min(abs(lat) + rows * self.cell_deg, 89.9))), 1e-6)
+        columns = min(math.ceil(rows / shrink), self.columns // 2)
+        row, column = self._cell(lat, lon)
+
+        best, best_distance = None, radius_km
+        with self._lock:
+            for i in range(row - rows, row + rows + 1):
+                for j in range(column - columns, column + columns + 1):
+                    for place_lat, place_lon, place in self._cells.get((i, j % self.columns), {}).values():
+                        distance = distance_km(lat, lon, place_lat, place_lon)
+                        if distance <= best_distance:
+                            best, best_distance = place, distance
+        return best
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cells.clear()
+            self._places.clear()
+
+    def __len__(self):
+        return len(self._places)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> SpatialIndex:
+    """Return the process-wide index of places seen in upstream responses"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SpatialIndex(settings.WEATHER_GEO_RADIUS_KM)
+    return _index
@@ -0,0 +1,79 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+# OpenWeatherMap's /group endpoint accepts at most 20 city IDs per call
+GROUP_MAX_SIZE = 20
+
+
+class GroupBatcher:
+    """Merge concurrent lookups by city ID into /group requests.
+
+    A lookup that finds no group call in flight is sent at once, alone, so a
+    lone miss never waits. Lookups arriving while a call is in flight queue
+    up and are sent together when it returns, or when ``window`` seconds have
+    passed since the first of them, whichever comes first; a full batch
+    (max_size distinct IDs) is sent at once by the caller that filled it.
+    fetch_group receives the list of IDs and returns a dict of id -> payload.
+    """
+
+    def __init__(self, fetch_group: Callable[[List[int]], Dict[int, Dict]],
+                 window: float, max_size: int = GROUP_MAX_SIZE):
+        self.fetch_group = fetch_group
+        self.window = window
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._generation = 0
+        self._in_flight = 0
+
+    def fetch(self, city_id: int, timeout: float = None) -> Dict:
+        """Return the payload for city_id, raising LookupError if upstream omitted it"""
+        batch = None
+        with self._lock:
+            future = self._pending.get(city_id)
+            if future is None:
+                future = self._pending[city_id] = Future()
+                if not self._in_flight or len(self._pending) >= self.max_size:
+                    batch = self._take()
+                elif len(self._pending) == 1:
+                    timer = threading.Timer(self.window, self._flush, args=(self._generation,))
+                    timer.daemon = True
+                    timer.start()
+        if batch:
+            self._run(batch)
+        return future.result(timeout)
+
+    def _take(self) -> Dict[int, Future]:
+        batch, self._pending = self._pending, {}
+        self._generation += 1
+        self._in_flight += 1
+        return batch
+
+    def _flush(self, generation: int) -> None:
+        with self._lock:
+            # The batch this timer was started for may already have been sent full
+            if generation != self._generation or not self._pending:
+                return
+            batch = self._take()
+        self._run(batch)
+
+    def _run(self, batch: Dict[int, Future]) -> None:
+        try:
+            payloads = self.fetch_group(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+        else:
+            for city_id, future in batch.items():
+                if city_id in payloads:
+                    future.set_result(payloads[city_id])
+                else:
+                    future.set_exception(LookupError(f"City id {city_id} missing from group response"))
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                queued = self._take() if self._pending and not self._in_flight else None
+            if queued:
+                # Send what piled up meanwhile without holding up this caller
+                threading.Thread(target=self._run, args=(queued,), daemon=True).start()
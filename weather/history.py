@@ -0,0 +1,235 @@
+import atexit
+import hashlib
+import json
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, List
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.renderers import JSONRenderer
+from . import metrics, profiling
+from .models import WeatherQuery
+from .serializers import WeatherQuerySerializer
+
+logger = logging.getLogger('weather')
+
+SYNC, MEMORY, REDIS = 'sync', 'memory', 'redis'
+
+RECENT_LIMIT = 10
+RECENT_CACHE_KEY = 'weather:history:recent'
+RECENT_GENERATION_KEY = 'weather:history:generation'
+
+
+def recent_payload() -> Dict:
+    """The last RECENT_LIMIT queries as pre-encoded JSON with validators.
+
+    Returns {'body': bytes, 'etag': str, 'last_modified': epoch or None}.
+    The payload is tagged with the history generation, which every insert
+    bumps, so a payload built from rows read before an insert is never
+    served after it. Fresh payloads cost a single cache round trip.
+    """
+    cached = cache.get_many([RECENT_CACHE_KEY, RECENT_GENERATION_KEY])
+    generation = cached.get(RECENT_GENERATION_KEY, 0)
+    payload = cached.get(RECENT_CACHE_KEY)
+    if payload is not None and payload['generation'] == generation:
+        return payload
+
+    queries = list(WeatherQuery.get_recent_queries(RECENT_LIMIT))
+    body = JSONRenderer().render(WeatherQuerySerializer(queries, many=True).data)
+    payload = {
+        'body': body,
+        'etag': f'"{hashlib.md5(body).hexdigest()}"',
+        'last_modified': max(q.timestamp for q in queries).timestamp() if queries else None,
+        'generation': generation,
+    }
+    cache.set(RECENT_CACHE_KEY, payload, settings.WEATHER_HISTORY_CACHE_TIMEOUT)
+    return payload
+
+
+def invalidate_recent() -> None:
+    """Mark the cached recent-history payload as outdated after an insert"""
+    cache.add(RECENT_GENERATION_KEY, 0, None)
+    try:
+        cache.incr(RECENT_GENERATION_KEY)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(RECENT_GENERATION_KEY, 1, None)
+
+
+class MemoryHistoryBuffer:
+    """Write-behind buffer flushed with bulk_create by a background thread.
+
+    Rows are flushed every flush_interval seconds or as soon as batch_size
+    rows are queued, and once more when the process exits. At most max_size
+    rows are kept; the oldest are dropped if the database falls behind.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_size: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = deque(maxlen=max_size)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def put(self, rows: List[Dict]) -> None:
+        with self._lock:
+            self._queue.extend(rows)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='weather-history-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+            if len(self._queue) >= self.batch_size:
+                self._wakeup.set()
+
+    def flush(self) -> int:
+        """Write every queued row; returns the number of rows inserted"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if not batch:
+                    return written
+                try:
+                    with metrics.timed(metrics.DB_INSERT_SECONDS, path='flush'):
+                        WeatherQuery.objects.bulk_create([WeatherQuery(**row) for row in batch])
+                    invalidate_recent()
+                except Exception:
+                    logger.exception("Error flushing %s weather history rows, will retry", len(batch))
+                    with self._lock:
+                        self._queue.extendleft(reversed(batch))
+                    return written
+                written += len(batch)
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            close_old_connections()
+
+
+class RedisHistoryQueue:
+    """Write-behind queue in a Redis list, shared by all workers.
+
+    Drained by the flush_weather_history Celery task. Needs the django_redis
+    cache backend.
+    """
+
+    key = 'weather:history:queue'
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+
+    def _connection(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+
+    def put(self, rows: List[Dict]) -> None:
+        self._connection().rpush(self.key, *[json.dumps(row, cls=DjangoJSONEncoder) for row in rows])
+
+    def flush(self) -> int:
+        connection = self._connection()
+        written = 0
+        while True:
+            pipe = connection.pipeline(transaction=True)
+            pipe.lrange(self.key, 0, self.batch_size - 1)
+            pipe.ltrim(self.key, self.batch_size, -1)
+            raw_rows, _ = pipe.execute()
+            if not raw_rows:
+                return written
+
+            rows = [json.loads(raw) for raw in raw_rows]
+            for row in rows:
+                row['timestamp'] = parse_datetime(row['timestamp'])
+            try:
+                with metrics.timed(metrics.DB_INSERT_SECONDS, path='flush'):
+                    WeatherQuery.objects.bulk_create([WeatherQuery(**row) for row in rows])
+                invalidate_recent()
+            except Exception:
+                logger.exception("Error flushing %s weather history rows, will retry", len(rows))
+                connection.lpush(self.key, *reversed(raw_rows))
+                return written
+            written += len(rows)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_history_writer():
+    """Return the write-behind queue for WEATHER_HISTORY_WRITE_MODE, None in sync mode"""
+    global _writer
+    mode = settings.WEATHER_HISTORY_WRITE_MODE
+    if mode == SYNC:
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                if mode == MEMORY:
+                    _writer = MemoryHistoryBuffer(
+                        settings.WEATHER_HISTORY_BATCH_SIZE,
+                        settings.WEATHER_HISTORY_FLUSH_INTERVAL,
+                        settings.WEATHER_HISTORY_MAX_BUFFER,
+                    )
+                elif mode == REDIS:
+                    _writer = RedisHistoryQueue(settings.WEATHER_HISTORY_BATCH_SIZE)
+                else:
+                    raise ValueError(f"Unknown WEATHER_HISTORY_WRITE_MODE: {mode}")
+    return _writer
+
+
+def record_many(rows: List[Dict]) -> List[datetime]:
+    """Record WeatherQuery rows; returns their timestamps.
+
+    Timestamps are generated here rather than by the database so they are
+    known before a write-behind flush.
+    """
+    now = timezone.now()
+    for row in rows:
+        row.setdefault('timestamp', now)
+
+    writer = get_history_writer()
+    if writer is None:
+        with metrics.timed(metrics.DB_INSERT_SECONDS, path='inline'), profiling.phase('db'):
+            WeatherQuery.objects.bulk_create([WeatherQuery(**row) for row in rows])
+        invalidate_recent()
+    else:
+        writer.put(rows)
+    return [row['timestamp'] for row in rows]
+
+
+def record(fields: Dict) -> datetime:
+    """Record a single WeatherQuery row; returns its timestamp"""
+    return record_many([fields])[0]
+
+
+async def arecord(fields: Dict) -> datetime:
+    """Async variant of record"""
+    fields.setdefault('timestamp', timezone.now())
+
+    writer = get_history_writer()
+    if writer is None:
+        with metrics.timed(metrics.DB_INSERT_SECONDS, path='inline'), profiling.phase('db'):
+            await WeatherQuery.objects.acreate(**fields)
+        await sync_to_async(invalidate_recent)()
+    elif isinstance(writer, MemoryHistoryBuffer):
+        writer.put([fields])
+    else:
+        await sync_to_async(writer.put, thread_sensitive=False)([fields])
+    return fields['timestamp']
+
+
+def flush() -> int:
+    """Flush pending write-behind rows, if any"""
+    writer = get_history_writer()
+    return writer.flush() if writer is not None else 0
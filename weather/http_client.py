@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import random
+import socket
+import threading
+import time
+import weakref
+from typing import Dict, Optional
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from django.conf import settings
+from . import metrics
+
+logger = logging.getLogger('weather')
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class UpstreamUnavailable(Exception):
+    """OpenWeatherMap could not be reached or keeps failing"""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """Raised without calling the upstream while the circuit is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After failure_threshold failures in a row the circuit opens and calls
+    fail fast for reset_timeout seconds. Then a single trial call is let
+    through (half-open): success closes the circuit, failure reopens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter that enables TCP keep-alive probes on pooled sockets"""
+
+    def __init__(self, keepalive_idle: int = 60, **kwargs):
+        self.keepalive_idle = keepalive_idle
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive_idle))
+        kwargs['socket_options'] = HTTPConnection.default_socket_options + options
+        super().init_poolmanager(*args, **kwargs)
+
+
+class OpenWeatherClient:
+    """Pooled keep-alive HTTP client with retries and a circuit breaker"""
+
+    def __init__(self, pool_size: int = 10, keepalive_idle: int = 60,
+                 connect_timeout: float = 3, read_timeout: float = 5,
+                 max_retries: int = 2, backoff_base: float = 0.2, backoff_max: float = 2,
+                 breaker: CircuitBreaker = None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        adapter = KeepAliveAdapter(
+            keepalive_idle=keepalive_idle,
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=0,
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @classmethod
+    def from_settings(cls) -> 'OpenWeatherClient':
+        return cls(
+            pool_size=settings.OPENWEATHER_POOL_SIZE,
+            keepalive_idle=settings.OPENWEATHER_KEEPALIVE_IDLE,
+            connect_timeout=settings.OPENWEATHER_CONNECT_TIMEOUT,
+            read_timeout=settings.OPENWEATHER_READ_TIMEOUT,
+            max_retries=settings.OPENWEATHER_MAX_RETRIES,
+            backoff_base=settings.OPENWEATHER_BACKOFF_BASE,
+            backoff_max=settings.OPENWEATHER_BACKOFF_MAX,
+            breaker=CircuitBreaker(
+                failure_threshold=settings.OPENWEATHER_BREAKER_THRESHOLD,
+                reset_timeout=settings.OPENWEATHER_BREAKER_RESET_TIMEOUT,
+            ),
+        )
+
+    def get(self, url: str, params: Dict = None) -> requests.Response:
+        """GET with retries on 429/5xx and connection errors.
+
+        4xx responses other than 429 are returned to the caller as-is and do
+        not count against the circuit breaker.
+        """
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("Weather provider temporarily unavailable")
+
+        with metrics.timed(metrics.UPSTREAM_SECONDS, endpoint=url.rsplit('/', 1)[-1]):
+            for attempt in range(self.max_retries + 1):
+                last_attempt = attempt == self.max_retries
+                try:
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+                except requests.RequestException as e:
+                    if last_attempt:
+                        self.breaker.record_failure()
+                        raise UpstreamUnavailable(f"Weather provider unreachable: {e}") from e
+                    self._sleep(attempt)
+                    continue
+
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                if last_attempt:
+                    self.breaker.record_failure()
+                    raise UpstreamUnavailable(f"Weather provider error: {response.status_code}")
+
+                logger.warning("Upstream returned %s, retrying (attempt %s)", response.status_code, attempt + 1)
+                self._sleep(attempt, response.headers.get('Retry-After'))
+
+    def _sleep(self, attempt: int, retry_after: str = None) -> None:
+        time.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max, retry_after))
+
+
+class AsyncOpenWeatherClient:
+    """httpx-based async counterpart of OpenWeatherClient.
+
+    Shares the circuit breaker with the sync client so both paths see the
+    same upstream health.
+    """
+
+    def __init__(self, pool_size: int = 200, keepalive_expiry: float = 60,
+                 connect_timeout: float = 3, read_timeout: float = 5,
+                 max_retries: int = 2, backoff_base: float = 0.2, backoff_max: float = 2,
+                 breaker: CircuitBreaker = None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+
+    @classmethod
+    def from_settings(cls) -> 'AsyncOpenWeatherClient':
+        return cls(
+            pool_size=settings.OPENWEATHER_ASYNC_POOL_SIZE,
+            keepalive_expiry=settings.OPENWEATHER_KEEPALIVE_IDLE,
+            connect_timeout=settings.OPENWEATHER_CONNECT_TIMEOUT,
+            read_timeout=settings.OPENWEATHER_READ_TIMEOUT,
+            max_retries=settings.OPENWEATHER_MAX_RETRIES,
+            backoff_base=settings.OPENWEATHER_BACKOFF_BASE,
+            backoff_max=settings.OPENWEATHER_BACKOFF_MAX,
+            breaker=get_client().breaker,
+        )
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def get(self, url: str, params: Dict = None) -> httpx.Response:
+        """Async GET with the same retry and circuit breaker rules as OpenWeatherClient.get"""
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("Weather provider temporarily unavailable")
+
+        with metrics.timed(metrics.UPSTREAM_SECONDS, endpoint=url.rsplit('/', 1)[-1]):
+            for attempt in range(self.max_retries + 1):
+                last_attempt = attempt == self.max_retries
+                try:
+                    response = await self.client.get(url, params=params)
+                except httpx.HTTPError as e:
+                    if last_attempt:
+                        self.breaker.record_failure()
+                        raise UpstreamUnavailable(f"Weather provider unreachable: {e}") from e
+                    await asyncio.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max))
+                    continue
+
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                if last_attempt:
+                    self.breaker.record_failure()
+                    raise UpstreamUnavailable(f"Weather provider error: {response.status_code}")
+
+                logger.warning("Upstream returned %s, retrying (attempt %s)", response.status_code, attempt + 1)
+                await asyncio.sleep(backoff_delay(
+                    attempt, self.backoff_base, self.backoff_max, response.headers.get('Retry-After')
+                ))
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: str = None) -> float:
+    """Full-jitter exponential backoff, honoring Retry-After up to the cap"""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, min(float(retry_after), cap))
+    return delay
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OpenWeatherClient:
+    """Return the process-wide client shared by every WeatherService"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenWeatherClient.from_settings()
+    return _client
+
+
+# httpx.AsyncClient is bound to the event loop it was first used on
+_async_clients = weakref.WeakKeyDictionary()
+# Tasks closing those clients; the event loop only keeps weak references to tasks
+_async_closers = set()
+
+
+async def _close_at_shutdown(loop: asyncio.AbstractEventLoop, client: AsyncOpenWeatherClient) -> None:
+    """Park until the loop shuts down, then close the loop's client.
+
+    asyncio.run (which uvicorn and asgiref's async_to_sync both use) cancels
+    every pending task before closing the loop, so the pooled connections
+    are closed on the loop that owns them.
+    """
+    try:
+        await loop.create_future()
+    finally:
+        _async_clients.pop(loop, None)
+        _async_closers.discard(asyncio.current_task())
+        await client.aclose()
+
+
+def get_async_client() -> AsyncOpenWeatherClient:
+    """Return the async client for the running event loop, closed when the loop shuts down"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncOpenWeatherClient.from_settings()
+        _async_closers.add(loop.create_task(_close_at_shutdown(loop, client)))
+    return client
@@ -0,0 +1,158 @@
+import re
+import unicodedata
+from typing import Dict, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
+from . import geo
+from .caching import LocalCache
+
+ALIAS_PREFIX = 'weather:alias:'
+
+# Aliases change rarely and are read on every request, keep a copy per process
+_local_aliases = LocalCache(max_entries=10000, max_bytes=4 * 1024 * 1024, ttl=300)
+# Inputs not learned yet, so repeats skip the shared cache; kept short since
+# another worker may learn them at any time
+_local_misses = LocalCache(max_entries=10000, max_bytes=1024 * 1024, ttl=30)
+
+_whitespace = re.compile(r'\s+')
+
+
+def fold(text: str) -> str:
+    """Case- and accent-insensitive form of a place name.
+
+    "  São   Paulo " and "sao paulo" both fold to "sao paulo".
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return _whitespace.sub(' ', stripped).strip().casefold()
+
+
+def split_query(city: str, country: str = '') -> Tuple[str, str]:
+    """Accept "city,CC" in the city field when no country is given"""
+    if not country and ',' in city:
+        city, _, country = city.rpartition(',')
+    return fold(city), fold(country)
+
+
+def cache_key(city: str, country: str = '') -> str:
+    """Weather cache key for an already canonical or folded city/country"""
+    city, country = fold(city), fold(country)
+    return f"weather:{city}:{country}" if country else f"weather:{city}"
+
+
+def _alias_key(city: str, country: str) -> str:
+    return f"{ALIAS_PREFIX}{city}:{country}"
+
+
+def _cell_key(cell: str) -> str:
+    return f"{ALIAS_PREFIX}@{cell}"
+
+
+def _remember(key: str, alias: Dict) -> None:
+    _local_misses.delete(key)
+    _local_aliases.set(key, alias)
+    if alias.get('lat') is not None:
+        geo.get_index().add(alias['lat'], alias['lon'], alias)
+
+
+def _lookup(key: str) -> Optional[Dict]:
+    alias = _local_aliases.get(key)
+    if alias is None and _local_misses.get(key) is None:
+        alias = cache.get(key)
+        if alias is not None:
+            _remember(key, alias)
+        else:
+            _local_misses.set(key, True, len(key))
+    return alias
+
+
+async def _alookup(key: str) -> Optional[Dict]:
+    alias = _local_aliases.get(key)
+    if alias is None and _local_misses.get(key) is None:
+        alias = await cache.aget(key)
+        if alias is not None:
+            _remember(key, alias)
+        else:
+            _local_misses.set(key, True, len(key))
+    return alias
+
+
+def resolve(city: str, country: str = '') -> Optional[Dict]:
+    """Canonical {'city', 'country', 'id', 'lat', 'lon'} learned for this input, if any"""
+    return _lookup(_alias_key(*split_query(city, country)))
+
+
+async def aresolve(city: str, country: str = '') -> Optional[Dict]:
+    """Async variant of resolve"""
+    return await _alookup(_alias_key(*split_query(city, country)))
+
+
+def resolve_cell(cell: str) -> Optional[Dict]:
+    """Place whose weather is served for coordinates in this geohash cell, if known"""
+    return _lookup(_cell_key(cell))
+
+
+async def aresolve_cell(cell: str) -> Optional[Dict]:
+    """Async variant of resolve_cell"""
+    return await _alookup(_cell_key(cell))
+
+
+def key_for(city: str, country: str = '', alias: Optional[Dict] = None) -> str:
+    """Cache key for user input: the canonical one when known, else the folded input"""
+    if alias is not None:
+        return cache_key(alias['city'], alias['country'])
+    return cache_key(*split_query(city, country))
+
+
+def place(data: Dict) -> Dict:
+    """The alias of the place an upstream response describes"""
+    coord = data.get('coord') or {}
+    return {
+        'city': data['name'], 'country': data['sys']['country'], 'id': data.get('id'),
+        'lat': coord.get('lat'), 'lon': coord.get('lon'),
+    }
+
+
+def _aliases(city: str, country: str, data: Dict) -> Dict[str, Dict]:
+    alias = place(data)
+    canonical_city, canonical_country = fold(alias['city']), fold(alias['country'])
+    # The canonical name with its country is unambiguous, so it is learned too
+    return {
+        _alias_key(*split_query(city, country)): alias,
+        _alias_key(canonical_city, canonical_country): alias,
+    }
+
+
+def learn(city: str, country: str, data: Dict) -> None:
+    """Map the input and the canonical name to the place an upstream response describes"""
+    aliases = _aliases(city, country, data)
+    cache.set_many(aliases, settings.WEATHER_CITY_ID_TIMEOUT)
+    for key, alias in aliases.items():
+        _remember(key, alias)
+
+
+async def alearn(city: str, country: str, data: Dict) -> None:
+    """Async variant of learn"""
+    aliases = _aliases(city, country, data)
+    await cache.aset_many(aliases, settings.WEATHER_CITY_ID_TIMEOUT)
+    for key, alias in aliases.items():
+        _remember(key, alias)
+
+
+def learn_cell(cell: str, alias: Dict) -> None:
+    """Serve the weather of this place for coordinates in the cell, in every worker"""
+    cache.set(_cell_key(cell), alias, settings.WEATHER_CITY_ID_TIMEOUT)
+    _remember(_cell_key(cell), alias)
+
+
+async def alearn_cell(cell: str, alias: Dict) -> None:
+    """Async variant of learn_cell"""
+    await cache.aset(_cell_key(cell), alias, settings.WEATHER_CITY_ID_TIMEOUT)
+    _remember(_cell_key(cell), alias)
+
+
+def clear_local() -> None:
+    """Drop this process's copy of the alias index and the spatial index"""
+    _local_aliases.clear()
+    _local_misses.clear()
+    geo.get_index().clear()
@@ -0,0 +1,117 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone as dt_timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# extra= for per-request INFO messages, which SampleFilter thins out
+HOT = {'hot': True}
+
+# LogRecord attributes; anything else on a record came in through extra=
+_RECORD_FIELDS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'hot'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any extra= fields as top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, dt_timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SampleFilter(logging.Filter):
+    """Keep a `rate` share of INFO (and lower) records logged with extra=HOT.
+
+    Kept records carry sample_rate, so counts over the log can be scaled
+    back up. Warnings and errors always pass.
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, 'hot', False) or record.levelno > logging.INFO or self.rate >= 1:
+            return True
+        if random.random() >= self.rate:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class QueueingHandler(QueueHandler):
+    """Hand records to a background thread that writes them out.
+
+    The request thread only puts the record on a bounded queue; message
+    formatting and I/O happen in the listener thread, which passes records
+    to the handlers of the `sink` logger. When the queue is full, records
+    are dropped and counted instead of blocking the request. The listener
+    starts on the first record (again after a fork) and is drained at exit.
+    """
+
+    def __init__(self, sink: str, maxsize: int = 10000):
+        super().__init__(queue.Queue(maxsize))
+        self.sink = sink
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked: the parent's listener thread does not exist here
+                self.queue = queue.Queue(self.maxsize)
+            handlers = logging.getLogger(self.sink).handlers
+            self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+            self.listener.start()
+            self._pid = os.getpid()
+
+    def stop(self) -> None:
+        """Write out queued records and stop the listener thread"""
+        with self._start_lock:
+            if self.listener is not None and self._pid == os.getpid():
+                self.listener.stop()
+            self.listener, self._pid = None, None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Leave msg % args to the listener; only render the traceback now,
+        # so the record does not keep frames alive while queued.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self._pid != os.getpid():
+            self._start()
+        super().emit(record)
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from weather import analytics, series
+
+
+class Command(BaseCommand):
+    help = "Per-city temperature statistics, trends and z-score anomalies over the WeatherQuery history (needs numpy)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--city')
+        parser.add_argument('--country')
+        parser.add_argument('--from', dest='start', help='ISO 8601 datetime, inclusive')
+        parser.add_argument('--to', dest='end', help='ISO 8601 datetime, exclusive')
+        parser.add_argument('--window', type=int, default=24, help='rolling mean window, in samples')
+        parser.add_argument('--threshold', type=float, default=3.0, help='z-score flagged as anomaly')
+        parser.add_argument('--limit', type=int, default=20, help='anomalies listed')
+
+    def handle(self, *args, **options):
+        try:
+            analytics.check_available()
+        except ImportError:
+            raise CommandError("Weather analytics need numpy")
+
+        bounds = {}
+        for name in ('start', 'end'):
+            if options[name]:
+                bounds[name] = parse_datetime(options[name])
+                if bounds[name] is None:
+                    raise CommandError(f"Invalid datetime: {options[name]}")
+                if timezone.is_naive(bounds[name]):
+                    # Same as the API: without an offset, the datetime is in TIME_ZONE
+                    bounds[name] = timezone.make_aware(bounds[name])
+
+        place = {'city': None, 'country': options['country']}
+        if options['city']:
+            place = series.resolve_city(options['city'], options['country'] or '')
+        history = analytics.load_history(place['city'], place['country'], bounds.get('start'), bounds.get('end'))
+        result = analytics.report(history, options['window'], options['threshold'], options['limit'])
+
+        self.stdout.write(f"{len(history)} rows, {len(result['cities'])} cities")
+        self.stdout.write(f"{'city':30} {'samples':>8} {'avg':>7} {'min':>7} {'max':>7} {'std':>6} {'trend/d':>8} {'anomalies':>9}")
+        for row in result['cities']:
+            temperature = row['temperature']
+            trend = '-' if row['trend_per_day'] is None else f"{row['trend_per_day']:+.2f}"
+            place = f"{row['city']}, {row['country']}" if row['country'] else row['city']
+            self.stdout.write(
+                f"{place:30} {row['samples']:8} {temperature['avg']:7.2f} "
+                f"{temperature['min']:7.2f} {temperature['max']:7.2f} {temperature['std']:6.2f} {trend:>8} {row['anomalies']:9}"
+            )
+
+        if result['anomalies']:
+            self.stdout.write(f"\nAnomalies (|z| >= {options['threshold']}):")
+        for row in result['anomalies']:
+            self.stdout.write(
+                f"{row['timestamp'].isoformat()} {row['city']}, {row['country']}: "
+                f"{row['temperature']:.1f} (rolling {row['rolling_avg']:.1f}, z {row['zscore']:+.2f})"
+            )
@@ -0,0 +1,51 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from weather import export, series
+
+
+class Command(BaseCommand):
+    help = "Stream the WeatherQuery history to a CSV, NDJSON or Parquet file in constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="output file, or - for stdout")
+        parser.add_argument('--output', choices=list(export.EXPORT_FORMATS), default='csv')
+        parser.add_argument('--city')
+        parser.add_argument('--country')
+        parser.add_argument('--from', dest='start', help='ISO 8601 datetime, inclusive')
+        parser.add_argument('--to', dest='end', help='ISO 8601 datetime, exclusive')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        try:
+            export.check_output(output)
+        except ImportError:
+            raise CommandError(f"{output} export needs pyarrow")
+
+        bounds = {}
+        for name in ('start', 'end'):
+            if options[name]:
+                bounds[name] = parse_datetime(options[name])
+                if bounds[name] is None:
+                    raise CommandError(f"Invalid datetime: {options[name]}")
+                if timezone.is_naive(bounds[name]):
+                    # Same as the API: without an offset, the datetime is in TIME_ZONE
+                    bounds[name] = timezone.make_aware(bounds[name])
+
+        place = {'city': None, 'country': options['country']}
+        if options['city']:
+            place = series.resolve_city(options['city'], options['country'] or '')
+        rows = export.export_rows(place['city'], place['country'], bounds.get('start'), bounds.get('end'))
+        written = 0
+        target = sys.stdout.buffer if options['path'] == '-' else open(options['path'], 'wb')
+        try:
+            for chunk in export.export_chunks(output, rows):
+                target.write(chunk)
+                written += len(chunk)
+        finally:
+            if target is not sys.stdout.buffer:
+                target.close()
+
+        if options['path'] != '-':
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['path']}"))
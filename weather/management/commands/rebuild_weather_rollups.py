@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from weather import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the hourly and daily weather rollups from the raw tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.WEATHER_ROLLUP_BATCH_SIZE,
+                            help='raw rows folded per transaction')
+
+    def handle(self, *args, **options):
+        folded = rollups.rebuild(options['batch_size'])
+        for source, rows in folded.items():
+            self.stdout.write(f"{source}: {rows} rows")
+        self.stdout.write(self.style.SUCCESS("Weather rollups rebuilt"))
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from weather import prewarm
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the weather cache for the most requested cities before serving traffic. "
+        "Waits for the next minute when the upstream budget is spent."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=settings.WEATHER_PREWARM_TOP_N,
+                            help='number of cities to warm')
+        parser.add_argument('--budget', type=int, default=settings.WEATHER_PREWARM_BUDGET_PER_MINUTE,
+                            help='upstream calls per minute')
+        parser.add_argument('--window-days', type=float, default=settings.WEATHER_PREWARM_WINDOW_DAYS,
+                            help='rank cities by requests over this many days')
+        parser.add_argument('--no-wait', action='store_true',
+                            help='stop instead of waiting when the budget is spent')
+
+    def handle(self, *args, **options):
+        if not prewarm.cache_is_shared():
+            self.stdout.write("Skipping: the cache backend is process-local, the server workers would not see it")
+            return
+        cities = prewarm.popular_cities(options['top'], options['window_days'])
+        self.stdout.write(f"Warming {len(cities)} cities")
+        stats = prewarm.warm(
+            cities,
+            prewarm.UpstreamBudget(options['budget']),
+            horizon=settings.WEATHER_PREWARM_INTERVAL + 30,
+            block=not options['no_wait'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed {stats['refreshed']}, already fresh {stats['skipped']}, "
+            f"failed {stats['failed']}, deferred {stats['deferred']}"
+        ))
@@ -0,0 +1,56 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Tuple
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# With PROMETHEUS_MULTIPROC_DIR set before the workers start (scripts/start.sh),
+# every gunicorn worker writes its samples to files in that directory and
+# /metrics sums them; without it the samples are per process.
+MULTIPROC_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+UPSTREAM_SECONDS = Histogram(
+    'weather_upstream_request_seconds', 'OpenWeatherMap request time, retries included', ['endpoint'],
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_INSERT_SECONDS = Histogram(
+    'weather_db_insert_seconds', 'WeatherQuery insert time, inline or write-behind flush', ['path'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+SERIALIZE_SECONDS = Histogram(
+    'weather_serialize_seconds', 'Response payload serialization time', ['view'],
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025),
+)
+REQUEST_SECONDS = Histogram(
+    'weather_http_request_seconds', 'Request time through the Django stack', ['view', 'method', 'status'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+CACHE_LOOKUPS = Counter('weather_cache_lookups', 'Weather cache lookups by result (fresh, stale, miss)', ['result'])
+ERRORS = Counter('weather_errors', 'Failed weather lookups by exception type', ['type'])
+THROTTLED = Counter('weather_throttled_requests', 'Requests rejected by a throttle', ['scope'])
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """Observe the time spent in the block, also when it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - started)
+
+
+def count_error(exc: Exception) -> None:
+    ERRORS.labels(type=type(exc).__name__).inc()
+
+
+def render() -> Tuple[bytes, str]:
+    """Exposition of every metric, summed over all workers in multiprocess mode"""
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
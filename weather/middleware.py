@@ -0,0 +1,142 @@
+import cProfile
+import hmac
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from . import metrics, profiling
+
+logger = logging.getLogger('weather')
+
+PROFILE_HEADER = 'X-Weather-Profile'
+
+
+class MetricsMiddleware:
+    """Observe every request in weather_http_request_seconds.
+
+    Labelled with the URL name, so the label set stays bounded. Streamed
+    responses are timed until the response object is returned, before the
+    body is sent. Works in sync and async stacks without a thread hop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    @staticmethod
+    def _observe(request, response, started: float) -> None:
+        match = request.resolver_match
+        view = (match.url_name or 'unnamed') if match else 'unmatched'
+        metrics.REQUEST_SECONDS.labels(
+            view=view, method=request.method, status=response.status_code
+        ).observe(time.perf_counter() - started)
+
+
+class ProfilingMiddleware:
+    """Per-phase timings of opted-in requests, returned in a Server-Timing header.
+
+    A request is profiled when it carries PROFILE_HEADER with
+    WEATHER_PROFILING_TOKEN, or when it is picked at
+    WEATHER_PROFILING_SAMPLE_RATE. With WEATHER_PROFILING_DIR set, profiled
+    sync requests are also run under cProfile and their stats dumped there
+    (one at a time; async requests share the event loop thread, so they only
+    get the timings). With neither a token nor a rate configured, Django
+    drops the middleware at startup.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.token = settings.WEATHER_PROFILING_TOKEN
+        self.sample_rate = settings.WEATHER_PROFILING_SAMPLE_RATE
+        if not self.token and not self.sample_rate:
+            raise MiddlewareNotUsed
+        self.dump_dir = settings.WEATHER_PROFILING_DIR
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        self._cprofile_lock = threading.Lock()
+        self._dumped = itertools.count()
+
+    def _wanted(self, request) -> bool:
+        header = request.headers.get(PROFILE_HEADER)
+        if header and self.token and hmac.compare_digest(header, self.token):
+            return True
+        return bool(self.sample_rate) and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self._wanted(request):
+            return self.get_response(request)
+
+        profile = profiling.start()
+        profiler = None
+        if self.dump_dir and self._cprofile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        try:
+            if profiler is None:
+                response = self.get_response(request)
+            else:
+                try:
+                    response = profiler.runcall(self.get_response, request)
+                finally:
+                    self._cprofile_lock.release()
+                self._dump(request, profiler)
+        finally:
+            profiling.stop(profile)
+        response['Server-Timing'] = profile.server_timing()
+        return response
+
+    async def __acall__(self, request):
+        if not self._wanted(request):
+            return await self.get_response(request)
+
+        profile = profiling.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiling.stop(profile)
+        response['Server-Timing'] = profile.server_timing()
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF encodes the body in response.render(), which Django calls after
+        # the view returns; render it here so the bytes count as 'render' too
+        with profiling.phase('render'):
+            response.render()
+        return response
+
+    def _dump(self, request, profiler: cProfile.Profile) -> None:
+        match = request.resolver_match
+        view = (match.url_name or 'unnamed') if match else 'unmatched'
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{view}-{os.getpid()}-{next(self._dumped)}.prof"
+        try:
+            os.makedirs(self.dump_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.dump_dir, name))
+        except OSError as e:
+            logger.warning("Could not write profile %s: %s", name, e)
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeatherAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=100)),
+                ('country', models.CharField(blank=True, max_length=2, null=True)),
+                ('cache_status', models.CharField(max_length=10)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['city', '-timestamp'], name='weather_wea_city_d59283_idx'), models.Index(fields=['-timestamp'], name='weather_wea_timesta_717613_idx')],
+            },
+        ),
+    ]
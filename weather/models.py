@@ -1,4 +1,6 @@
 from django.db import models
+from django.utils import timezone
+from .retention import prune
 
 class WeatherQuery(models.Model):
     city = models.CharField(max_length=100)
@@ -9,7 +11,8 @@ class WeatherQuery(models.Model):
     pressure = models.IntegerField()
     wind_speed = models.FloatField()
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set by the app, not on insert, so write-behind rows keep their request time
+    timestamp = models.DateTimeField(default=timezone.now)
 
     @classmethod
     def get_recent_queries(cls, limit=10):
@@ -17,9 +20,80 @@ class WeatherQuery(models.Model):
 
     @classmethod
     def cleanup_old_queries(cls, keep_last=10):
-        """Mantém apenas os últimos X registros com desempate por ID"""
-        ids_to_keep = cls.objects.order_by('-timestamp', '-id').values_list('id', flat=True)[:keep_last]
-        cls.objects.exclude(id__in=ids_to_keep).delete()
+        """Mantém apenas os últimos X registros (por ID), apagando em faixas de ID"""
+        from . import history
+        deleted = prune(cls, keep_rows=keep_last)
+        if deleted:
+            # Raw deletes send no post_delete signal
+            history.invalidate_recent()
+        return deleted
 
     def __str__(self):
         return f"{self.city} - {self.temperature}°C at {self.timestamp}"
+
+class WeatherAccess(models.Model):
+    """One served weather request, cache hits included.
+
+    Filled in bulk from the access log (weather.access_log) rather than on
+    the request path.
+    """
+    city = models.CharField(max_length=100)
+    country = models.CharField(max_length=2, blank=True, null=True)
+    cache_status = models.CharField(max_length=10)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['city', '-timestamp']),
+            models.Index(fields=['-timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.city} ({self.cache_status}) at {self.timestamp}"
+
+class WeatherRollup(models.Model):
+    """Per-city aggregates for one hour or one day.
+
+    Maintained incrementally from WeatherQuery (upstream samples) and
+    WeatherAccess (served requests) by weather.rollups, so statistics never
+    scan the raw tables and outlive their retention.
+    """
+    HOUR = 'hour'
+    DAY = 'day'
+    PERIOD_CHOICES = [(HOUR, 'Hour'), (DAY, 'Day')]
+
+    city = models.CharField(max_length=100)
+    country = models.CharField(max_length=2, blank=True, default='')
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField()
+    requests = models.PositiveIntegerField(default=0)
+    samples = models.PositiveIntegerField(default=0)
+    temperature_sum = models.FloatField(default=0)
+    temperature_min = models.FloatField(null=True, blank=True)
+    temperature_max = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['city', 'country', 'period', 'bucket'], name='weather_rollup_bucket_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['period', '-bucket']),
+        ]
+
+    @property
+    def temperature_avg(self):
+        return self.temperature_sum / self.samples if self.samples else None
+
+    def __str__(self):
+        return f"{self.city} {self.period} {self.bucket}: {self.requests} requests"
+
+class RollupWatermark(models.Model):
+    """Progress of the rollup maintenance over one source table"""
+    source = models.CharField(max_length=50, unique=True)
+    # Rows with id <= last_id are in the rollups; ids up to pending_id are next
+    last_id = models.BigIntegerField(default=0)
+    pending_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.source}: {self.last_id}"
@@ -0,0 +1,115 @@
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, List, Tuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.utils import timezone
+from . import caching
+from .models import WeatherQuery, WeatherRollup
+from .services import WeatherService
+
+logger = logging.getLogger('weather')
+
+# Backends that keep entries inside one process, invisible to the server workers
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+FALLBACK_CACHE_KEY = 'weather:prewarm:popular'
+FALLBACK_CACHE_TIMEOUT = 3600
+
+
+def cache_is_shared() -> bool:
+    """Whether entries written here are visible to other processes"""
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+def popular_cities(limit: int, window_days: float) -> List[Tuple[str, str]]:
+    """The limit most requested (city, country) pairs of the last window_days.
+
+    Ranked from the daily rollups of WeatherAccess (served requests, cache
+    hits included), so no raw table is scanned on every beat tick. Falls
+    back to WeatherQuery (upstream fetches made for clients) when the access
+    log is off or not rolled up yet; that ranking is cached for an hour.
+    """
+    since = timezone.now() - timedelta(days=window_days)
+    day_start = timezone.localtime(since).replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = (
+        WeatherRollup.objects.filter(period=WeatherRollup.DAY, bucket__gte=day_start)
+        .values('city', 'country').annotate(total=Sum('requests')).filter(total__gt=0)
+        .order_by('-total', 'city')[:limit]
+    )
+    if rows:
+        return [(row['city'], row['country']) for row in rows]
+
+    key = f"{FALLBACK_CACHE_KEY}:{limit}:{window_days}"
+    cities = cache.get(key)
+    if cities is None:
+        rows = (
+            # Rows without an IP were written by refreshes and pre-warming, not clients
+            WeatherQuery.objects.filter(timestamp__gte=since, ip_address__isnull=False)
+            .values('city', 'country').annotate(requests=Count('id')).order_by('-requests')[:limit]
+        )
+        cities = [(row['city'], row['country'] or '') for row in rows]
+        cache.set(key, cities, FALLBACK_CACHE_TIMEOUT)
+    return cities
+
+
+class UpstreamBudget:
+    """At most per_minute upstream fetches per clock minute, shared by all workers through the cache"""
+
+    key_prefix = 'weather:prewarm:budget'
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+
+    def take(self) -> bool:
+        """Use one fetch from the current minute's budget; False if it is spent"""
+        key = f"{self.key_prefix}:{int(time.time() // 60)}"
+        cache.add(key, 0, 120)
+        try:
+            used = cache.incr(key)
+        except ValueError:
+            # Evicted between add and incr
+            cache.set(key, 1, 120)
+            used = 1
+        return used <= self.per_minute
+
+    @staticmethod
+    def seconds_until_next_window() -> float:
+        return 60 - time.time() % 60
+
+
+def warm(cities: List[Tuple[str, str]], budget: UpstreamBudget, horizon: float, block: bool = False) -> Dict:
+    """Refresh the entries of cities that are missing or expire within horizon seconds.
+
+    Stops when the upstream budget is spent, or with block=True waits for
+    the next minute's budget instead. Returns counts of refreshed, skipped
+    (still fresh), failed and deferred (left for lack of budget) cities.
+    """
+    service = WeatherService()
+    weather_cache = caching.get_weather_cache()
+    stats = Counter(refreshed=0, skipped=0, failed=0, deferred=0)
+
+    for position, (city, country) in enumerate(cities):
+        entry = caching.unwrap(weather_cache.get(service._get_cache_key(city, country)))
+        if entry and entry['soft_expires_at'] - time.time() > horizon:
+            stats['skipped'] += 1
+            continue
+
+        while not budget.take():
+            if not block:
+                stats['deferred'] = len(cities) - position
+                logger.info("Pre-warm budget spent, %s cities deferred", stats['deferred'])
+                return dict(stats)
+            time.sleep(budget.seconds_until_next_window())
+
+        if service.refresh(city, country):
+            stats['refreshed'] += 1
+        else:
+            stats['failed'] += 1
+
+    return dict(stats)
@@ -0,0 +1,77 @@
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# Set by ProfilingMiddleware for the requests it profiles. Sync views called
+# from ASGI get a copy of the context, so phases still land in the same Profile.
+_current: ContextVar[Optional['Profile']] = ContextVar('weather_profile', default=None)
+
+
+class Profile:
+    """Time spent in each phase of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, List] = {}
+        self.token = None
+
+    def add(self, name: str, seconds: float) -> None:
+        totals = self.phases.setdefault(name, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: one entry per phase, in milliseconds, then the total"""
+        entries = []
+        for name, (seconds, calls) in self.phases.items():
+            entry = f"{name};dur={seconds * 1000:.3f}"
+            if calls > 1:
+                entry += f';desc="{calls} calls"'
+            entries.append(entry)
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.3f}")
+        return ', '.join(entries)
+
+
+class _Phase:
+    __slots__ = ('profile', 'name', 'started')
+
+    def __init__(self, profile: Profile, name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profile.add(self.name, time.perf_counter() - self.started)
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+def phase(name: str):
+    """Time the block as `name` when the current request is profiled; a shared no-op otherwise"""
+    profile = _current.get()
+    if profile is None:
+        return _NO_PHASE
+    return _Phase(profile, name)
+
+
+def start() -> Profile:
+    profile = Profile()
+    profile.token = _current.set(profile)
+    return profile
+
+
+def stop(profile: Profile) -> None:
+    _current.reset(profile.token)
@@ -0,0 +1,44 @@
+from typing import Dict, Optional, Tuple
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from .caching import LocalCache
+from .serializers import WeatherResponseSerializer
+
+_MARKER = b'"cached":true,"cache_status":"fresh"'
+
+# (city, country, timestamp, time zone) -> JSON before and after the marker
+_encoded = LocalCache(max_entries=5000, max_bytes=8 * 1024 * 1024, ttl=3600)
+
+
+def _encode(weather_data: Dict) -> Tuple[bytes, ...]:
+    """JSON before and after the marker; empty when the marker is not found exactly once"""
+    body = JSONRenderer().render(
+        WeatherResponseSerializer({**weather_data, 'cached': True, 'cache_status': 'fresh'}).data
+    )
+    parts = body.split(_MARKER)
+    return tuple(parts) if len(parts) == 2 else ()
+
+
+def render_weather(weather_data: Dict, is_cached: bool) -> Optional[bytes]:
+    """WeatherResponseSerializer output as JSON bytes, encoded once per fetched payload.
+
+    The payload of a cache entry never changes, so it is serialized the
+    first time it is served by this process and only the cached flag and
+    cache_status are spliced in afterwards. The result is byte-for-byte
+    what Response(WeatherResponseSerializer(...).data) renders as JSON.
+    Returns None when the serialized payload cannot be spliced (the marker
+    is missing or repeated); callers then render through the serializer.
+    """
+    key = (weather_data['city'], weather_data['country'], weather_data['timestamp'],
+           timezone.get_current_timezone_name())
+    parts = _encoded.get(key)
+    if parts is None:
+        parts = _encode(weather_data)
+        _encoded.set(key, parts, sum(map(len, parts)))
+    if not parts:
+        return None
+    head, tail = parts
+    flags = b'"cached":%s,"cache_status":"%s"' % (
+        b'true' if is_cached else b'false', weather_data['cache_status'].encode()
+    )
+    return head + flags + tail
@@ -0,0 +1,108 @@
+import logging
+import time
+from datetime import timedelta
+from typing import List, Optional
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger('weather')
+
+
+def _rolled_up_id(model) -> Optional[int]:
+    """RollupWatermark.last_id of a rollup source table (0 before its first run), None for other tables"""
+    from .models import RollupWatermark
+    from .rollups import SOURCES
+    for source, (source_model, _) in SOURCES.items():
+        if source_model is model:
+            mark = RollupWatermark.objects.filter(source=source).values_list('last_id', flat=True).first()
+            return mark or 0
+    return None
+
+
+def _keep_rows_cutoff(model, keep_rows: int) -> Optional[int]:
+    """Highest id outside the newest keep_rows rows (a primary key index probe), or None"""
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT id FROM {table} ORDER BY id DESC LIMIT 1 OFFSET %s", [keep_rows])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _delete_ids(model, ids: List[int]) -> int:
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+        return cursor.rowcount
+
+
+def _prune_id_range(model, cutoff: int, chunk_size: int, pause: float) -> int:
+    """Delete ids up to cutoff with ``DELETE ... WHERE id BETWEEN`` of at most chunk_size ids"""
+    table = connection.ops.quote_name(model._meta.db_table)
+    deleted = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(id) FROM {table}")
+        low = cursor.fetchone()[0]
+        while low is not None and low <= cutoff:
+            high = min(low + chunk_size - 1, cutoff)
+            cursor.execute(f"DELETE FROM {table} WHERE id BETWEEN %s AND %s", [low, high])
+            deleted += cursor.rowcount
+            low = high + 1
+            if pause:
+                time.sleep(pause)
+    return deleted
+
+
+def _prune_older_than(model, cutoff_time, max_id: Optional[int], chunk_size: int, pause: float) -> int:
+    """Delete rows with timestamp < cutoff_time, chunk_size ids at a time in timestamp order.
+
+    Rows can be inserted late with an earlier timestamp (history write-behind,
+    access log compaction), so ids do not follow timestamps; each batch is
+    selected through the timestamp index and deleted by primary key.
+    """
+    expired = model.objects.filter(timestamp__lt=cutoff_time)
+    if max_id is not None:
+        expired = expired.filter(id__lte=max_id)
+    deleted = 0
+    while True:
+        ids = list(expired.order_by('timestamp').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += _delete_ids(model, ids)
+        if len(ids) < chunk_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+def prune(model, keep_rows: Optional[int] = None, max_age_days: Optional[float] = None,
+          chunk_size: int = 5000, pause: float = 0, keep_unrolled: bool = False) -> int:
+    """Delete rows beyond the retention limits in bounded primary key batches.
+
+    Keeps at most keep_rows rows (the highest ids) and/or none with a
+    timestamp older than max_age_days. Every statement deletes at most
+    chunk_size rows in its own short transaction (autocommit), so concurrent
+    inserts are never blocked for long. With keep_unrolled, rows of a rollup
+    source not yet folded into WeatherRollup (id above its watermark) are
+    kept, with a warning. Returns rows deleted.
+    """
+    max_id = _rolled_up_id(model) if keep_unrolled else None
+    held_back = False
+    deleted = 0
+    if max_age_days is not None:
+        cutoff_time = timezone.now() - timedelta(days=max_age_days)
+        deleted += _prune_older_than(model, cutoff_time, max_id, chunk_size, pause)
+        if max_id is not None:
+            held_back = model.objects.filter(timestamp__lt=cutoff_time, id__gt=max_id).exists()
+    if keep_rows is not None:
+        cutoff = _keep_rows_cutoff(model, keep_rows)
+        if cutoff is not None and max_id is not None and cutoff > max_id:
+            cutoff, held_back = max_id, True
+        if cutoff is not None:
+            deleted += _prune_id_range(model, cutoff, chunk_size, pause)
+
+    if held_back:
+        logger.warning("Retention kept rows of %s above rollup watermark %s; is update_weather_rollups running?",
+                       model._meta.db_table, max_id)
+    if deleted:
+        logger.info("Retention removed %s rows from %s", deleted, model._meta.db_table)
+    return deleted
@@ -0,0 +1,173 @@
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import Trunc
+from .models import RollupWatermark, WeatherAccess, WeatherQuery, WeatherRollup
+
+logger = logging.getLogger('weather')
+
+PERIODS = (WeatherRollup.HOUR, WeatherRollup.DAY)
+
+# source -> (model, whether its rows carry temperature samples)
+SOURCES = {
+    'weather_query': (WeatherQuery, True),
+    'weather_access': (WeatherAccess, False),
+}
+
+
+def _aggregate(model, with_temperature: bool, low: int, high: int, period: str):
+    """Rows with low < id <= high grouped by city and bucket, in the database"""
+    aggregates = {'rows': Count('id')}
+    if with_temperature:
+        aggregates.update(
+            temperature_sum=Sum('temperature'),
+            temperature_min=Min('temperature'),
+            temperature_max=Max('temperature'),
+        )
+    return (
+        model.objects.filter(id__gt=low, id__lte=high)
+        .annotate(bucket=Trunc('timestamp', period))
+        .values('city', 'country', 'bucket')
+        .annotate(**aggregates)
+        .order_by()
+    )
+
+
+def _merge(groups: Iterable[Dict], period: str, with_temperature: bool) -> int:
+    """Add grouped counts into the rollups; returns the number of raw rows merged"""
+    groups = list(groups)
+    if not groups:
+        return 0
+
+    existing = {
+        (r.city, r.country, r.bucket): r
+        for r in WeatherRollup.objects.select_for_update().filter(
+            period=period,
+            city__in={g['city'] for g in groups},
+            bucket__in={g['bucket'] for g in groups},
+        )
+    }
+    touched = []
+    for group in groups:
+        key = (group['city'], group['country'] or '', group['bucket'])
+        rollup = existing.get(key)
+        if rollup is None:
+            rollup = existing[key] = WeatherRollup(city=key[0], country=key[1], period=period, bucket=key[2])
+        touched.append(rollup)
+
+        if with_temperature:
+            rollup.samples += group['rows']
+            rollup.temperature_sum += group['temperature_sum']
+            rollup.temperature_min = min(v for v in (rollup.temperature_min, group['temperature_min']) if v is not None)
+            rollup.temperature_max = max(v for v in (rollup.temperature_max, group['temperature_max']) if v is not None)
+        else:
+            rollup.requests += group['rows']
+
+    WeatherRollup.objects.bulk_create([r for r in touched if r.pk is None])
+    WeatherRollup.objects.bulk_update(
+        [r for r in touched if r.pk is not None],
+        ['requests', 'samples', 'temperature_sum', 'temperature_min', 'temperature_max'],
+    )
+    return sum(group['rows'] for group in groups)
+
+
+def update(source: str, batch_size: int = 50000, lag: bool = True) -> int:
+    """Fold new rows of a source table into the rollups; returns rows folded.
+
+    Works in id ranges of at most batch_size rows, each merged together with
+    its watermark in one transaction, so a crash never counts rows twice.
+    With lag, a run only goes up to the highest id seen by the previous run:
+    inserts still uncommitted then (lower ids become visible late) have had a
+    full interval to commit before their range is read.
+    """
+    model, with_temperature = SOURCES[source]
+    RollupWatermark.objects.get_or_create(source=source)
+    if not lag:
+        RollupWatermark.objects.filter(source=source).update(
+            pending_id=model.objects.aggregate(Max('id'))['id__max'] or 0
+        )
+
+    folded = 0
+    while True:
+        with transaction.atomic():
+            mark = RollupWatermark.objects.select_for_update().get(source=source)
+            high = min(mark.pending_id, mark.last_id + batch_size)
+            if high <= mark.last_id:
+                mark.pending_id = model.objects.aggregate(Max('id'))['id__max'] or 0
+                mark.save(update_fields=['pending_id'])
+                break
+            for period in PERIODS:
+                # Every period sees the same rows, so count them once
+                merged = _merge(_aggregate(model, with_temperature, mark.last_id, high, period), period, with_temperature)
+            folded += merged
+            mark.last_id = high
+            mark.save(update_fields=['last_id'])
+
+    if folded:
+        logger.info("Rolled up %s %s rows", folded, source)
+    return folded
+
+
+def update_all(batch_size: int = 50000) -> Dict[str, int]:
+    return {source: update(source, batch_size) for source in SOURCES}
+
+
+def rebuild(batch_size: int = 50000) -> Dict[str, int]:
+    """Recompute every rollup from the raw rows still in the tables"""
+    with transaction.atomic():
+        WeatherRollup.objects.all().delete()
+        RollupWatermark.objects.all().delete()
+    return {source: update(source, batch_size, lag=False) for source in SOURCES}
+
+
+def bucket_stats(period: str, start: datetime, end: datetime, city: str, country: str = '') -> List[Dict]:
+    """The city's rollups in [start, end), oldest bucket first"""
+    filters = {'period': period, 'city': city, 'bucket__gte': start, 'bucket__lt': end}
+    if country:
+        filters['country'] = country
+    return [
+        {
+            'bucket': rollup.bucket,
+            'country': rollup.country,
+            'requests': rollup.requests,
+            'samples': rollup.samples,
+            'temperature': {
+                'avg': rollup.temperature_avg,
+                'min': rollup.temperature_min,
+                'max': rollup.temperature_max,
+            },
+        }
+        for rollup in WeatherRollup.objects.filter(**filters).order_by('bucket')
+    ]
+
+
+def city_stats(period: str, start: datetime, end: datetime, limit: int = 100) -> List[Dict]:
+    """Totals per city over the rollups in [start, end), most requested first"""
+    rows = (
+        WeatherRollup.objects.filter(period=period, bucket__gte=start, bucket__lt=end)
+        .values('city', 'country')
+        .annotate(
+            total_requests=Sum('requests'),
+            total_samples=Sum('samples'),
+            total_temperature=Sum('temperature_sum'),
+            lowest=Min('temperature_min'),
+            highest=Max('temperature_max'),
+        )
+        .order_by('-total_requests', 'city')[:limit]
+    )
+    return [
+        {
+            'city': row['city'],
+            'country': row['country'],
+            'requests': row['total_requests'],
+            'samples': row['total_samples'],
+            'temperature': {
+                'avg': row['total_temperature'] / row['total_samples'] if row['total_samples'] else None,
+                'min': row['lowest'],
+                'max': row['highest'],
+            },
+        }
+        for row in rows
+    ]
@@ -1,5 +1,10 @@
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
-from .models import WeatherQuery
+from .models import WeatherQuery, WeatherRollup
+from .export import EXPORT_FORMATS
+from .series import BUCKETS
 
 class WeatherQuerySerializer(serializers.ModelSerializer):
     class Meta:
@@ -10,7 +15,7 @@ class WeatherQuerySerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'timestamp']
 
-class WeatherRequestSerializer(serializers.Serializer):
+class WeatherCityRequestSerializer(serializers.Serializer):
     city = serializers.CharField(max_length=100)
     country = serializers.CharField(max_length=2, required=False, allow_blank=True)
 
@@ -19,6 +24,87 @@ class WeatherRequestSerializer(serializers.Serializer):
             raise serializers.ValidationError("City name cannot be empty")
         return value.strip()
 
+class WeatherRequestSerializer(WeatherCityRequestSerializer):
+    """A city name, or coordinates (which take precedence)"""
+    city = serializers.CharField(max_length=100, required=False)
+    lat = serializers.FloatField(min_value=-90, max_value=90, required=False)
+    lon = serializers.FloatField(min_value=-180, max_value=180, required=False)
+
+    def validate(self, attrs):
+        if ('lat' in attrs) != ('lon' in attrs):
+            raise serializers.ValidationError("'lat' and 'lon' must be given together")
+        if 'city' not in attrs and 'lat' not in attrs:
+            raise serializers.ValidationError("Provide a city or 'lat' and 'lon'")
+        return attrs
+
+class TimeRangeSerializer(serializers.Serializer):
+    """Adds the 'from' and 'to' datetime parameters"""
+    from_required = True
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # 'from' is a Python keyword, so the range can't be declared as attributes
+        fields['from'] = serializers.DateTimeField(required=self.from_required)
+        fields['to'] = serializers.DateTimeField(required=False)
+        return fields
+
+    def validate(self, attrs):
+        if 'from' in attrs and 'to' in attrs and attrs['from'] >= attrs['to']:
+            raise serializers.ValidationError("'from' must be before 'to'")
+        return attrs
+
+class WeatherSeriesRequestSerializer(TimeRangeSerializer):
+    city = serializers.CharField(max_length=100)
+    country = serializers.CharField(max_length=2, required=False, allow_blank=True)
+    bucket = serializers.ChoiceField(choices=list(BUCKETS), default='1h')
+
+    def validate_city(self, value):
+        if not value.strip():
+            raise serializers.ValidationError("City name cannot be empty")
+        return value.strip()
+
+    def validate(self, attrs):
+        attrs.setdefault('to', timezone.now())
+        return super().validate(attrs)
+
+class WeatherExportRequestSerializer(TimeRangeSerializer):
+    from_required = False
+    output = serializers.ChoiceField(choices=list(EXPORT_FORMATS), default='csv')
+    city = serializers.CharField(max_length=100, required=False)
+    country = serializers.CharField(max_length=2, required=False, allow_blank=True)
+
+class WeatherStatsRequestSerializer(TimeRangeSerializer):
+    from_required = False
+    city = serializers.CharField(max_length=100, required=False)
+    country = serializers.CharField(max_length=2, required=False, allow_blank=True)
+    period = serializers.ChoiceField(choices=[WeatherRollup.HOUR, WeatherRollup.DAY], default=WeatherRollup.HOUR)
+
+    # Range used when 'from' is left out, per period
+    DEFAULT_SPAN = {WeatherRollup.HOUR: timedelta(days=1), WeatherRollup.DAY: timedelta(days=30)}
+
+    def validate(self, attrs):
+        attrs.setdefault('to', timezone.now())
+        attrs.setdefault('from', attrs['to'] - self.DEFAULT_SPAN[attrs['period']])
+        return super().validate(attrs)
+
+class WeatherAnalyticsRequestSerializer(TimeRangeSerializer):
+    from_required = False
+    city = serializers.CharField(max_length=100, required=False)
+    country = serializers.CharField(max_length=2, required=False, allow_blank=True)
+    window = serializers.IntegerField(min_value=1, max_value=10000, default=24)
+    threshold = serializers.FloatField(min_value=0.5, default=3.0)
+    limit = serializers.IntegerField(min_value=0, max_value=1000, default=50)
+
+    DEFAULT_SPAN = timedelta(days=30)
+
+    def validate(self, attrs):
+        attrs.setdefault('to', timezone.now())
+        attrs.setdefault('from', attrs['to'] - self.DEFAULT_SPAN)
+        return super().validate(attrs)
+
+class WeatherBatchRequestSerializer(serializers.Serializer):
+    items = WeatherCityRequestSerializer(many=True, allow_empty=False, max_length=settings.WEATHER_BATCH_MAX_ITEMS)
+
 class WeatherResponseSerializer(serializers.Serializer):
     city = serializers.CharField()
     country = serializers.CharField()
@@ -28,4 +114,12 @@ class WeatherResponseSerializer(serializers.Serializer):
     pressure = serializers.IntegerField()
     wind_speed = serializers.FloatField()
     cached = serializers.BooleanField()
-    timestamp = serializers.DateTimeField()
\ No newline at end of file
+    cache_status = serializers.ChoiceField(choices=['fresh', 'stale', 'refreshed'], required=False)
+    timestamp = serializers.DateTimeField()
+
+class WeatherBatchItemSerializer(serializers.Serializer):
+    city = serializers.CharField()
+    country = serializers.CharField(allow_blank=True)
+    status = serializers.IntegerField()
+    data = WeatherResponseSerializer(required=False)
+    error = serializers.CharField(required=False)
@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.functions import Trunc
+from . import locations
+from .models import WeatherQuery
+
+# bucket parameter -> date_trunc unit
+BUCKETS = {
+    '1m': 'minute',
+    '1h': 'hour',
+    '1d': 'day',
+    '1w': 'week',
+}
+
+STREAM_CHUNK_SIZE = 2000
+
+
+def resolve_city(city: str, country: str = '') -> Dict:
+    """City and country as stored in WeatherQuery (the names upstream returned)"""
+    alias = locations.resolve(city, country)
+    if alias is not None:
+        return {'city': alias['city'], 'country': alias['country']}
+    return {'city': city.strip(), 'country': country.strip().upper()}
+
+
+def series_rows(city: str, country: str, start: datetime, end: datetime, bucket: str) -> Iterator[Dict]:
+    """Per-bucket aggregates of the city's rows in [start, end), oldest first.
+
+    The database does the bucketing (date_trunc on PostgreSQL) and the
+    aggregation; the city equality plus timestamp range is served by the
+    (city, -timestamp) index. Rows come from a server-side cursor.
+    """
+    filters = {'city': city, 'timestamp__gte': start, 'timestamp__lt': end}
+    if country:
+        filters['country'] = country
+    return (
+        WeatherQuery.objects.filter(**filters)
+        .annotate(bucket=Trunc('timestamp', BUCKETS[bucket]))
+        .values('bucket')
+        .annotate(
+            samples=Count('id'),
+            temperature_avg=Avg('temperature'),
+            temperature_min=Min('temperature'),
+            temperature_max=Max('temperature'),
+            humidity_avg=Avg('humidity'),
+            pressure_avg=Avg('pressure'),
+            wind_speed_avg=Avg('wind_speed'),
+        )
+        .order_by('bucket')
+        .iterator(chunk_size=STREAM_CHUNK_SIZE)
+    )
+
+
+def _point(row: Dict) -> Dict:
+    return {
+        'bucket': row['bucket'],
+        'samples': row['samples'],
+        'temperature': {
+            'avg': round(row['temperature_avg'], 2),
+            'min': row['temperature_min'],
+            'max': row['temperature_max'],
+        },
+        'humidity': round(row['humidity_avg'], 2),
+        'pressure': round(row['pressure_avg'], 2),
+        'wind_speed': round(row['wind_speed_avg'], 2),
+    }
+
+
+def stream_json(header: Dict, rows: Iterable[Dict], batch_size: int = 500) -> Iterator[bytes]:
+    """Encode {**header, "points": [...]} piece by piece, batch_size points per chunk"""
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    yield encoder.encode(header)[:-1].encode() + (b',' if header else b'') + b'"points":['
+    batch = []
+    first = True
+    for row in rows:
+        batch.append(encoder.encode(_point(row)))
+        if len(batch) >= batch_size:
+            yield (b'' if first else b',') + ','.join(batch).encode()
+            batch, first = [], False
+    if batch:
+        yield (b'' if first else b',') + ','.join(batch).encode()
+    yield b']}'
+
+
+def stream_series(city: str, country: str, start: datetime, end: datetime,
+                  bucket: str, header: Optional[Dict] = None) -> Iterator[bytes]:
+    return stream_json(header or {}, series_rows(city, country, start, end, bucket))
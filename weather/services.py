@@ -1,53 +1,373 @@
-import requests
 import logging
-from typing import Dict, Tuple
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Callable, Dict, List, Optional, Tuple
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.cache import cache
+from django.db import connection
+from . import access_log, caching, geo, history, locations, metrics, profiling
+from .grouping import GroupBatcher
+from .http_client import CircuitBreaker, UpstreamUnavailable, get_async_client, get_client
+from .log import HOT
 from .models import WeatherQuery
+from .singleflight import (
+    AsyncSingleFlight, SingleFlight, async_cache_lock, async_wait_for_cache, cache_lock, wait_for_cache
+)
 
 logger = logging.getLogger('weather')
 
+# Shared by every WeatherService instance in this process
+_inflight = SingleFlight()
+_async_inflight = AsyncSingleFlight()
+_group_batcher = None
+_group_batcher_lock = threading.Lock()
+
+
+def _fetch_group(city_ids: List[int]) -> Dict[int, Dict]:
+    """Fetch current weather for up to 20 city IDs with one /group call"""
+    params = {
+        'id': ','.join(str(city_id) for city_id in city_ids),
+        'appid': settings.OPENWEATHER_API_KEY,
+        'units': 'metric'
+    }
+    response = get_client().get(f"{settings.OPENWEATHER_BASE_URL}/group", params=params)
+    if response.status_code != 200:
+        raise ValueError(f"API error: {response.status_code}")
+
+    logger.info("Group API call for %s cities", len(city_ids))
+    return {item['id']: item for item in response.json().get('list', [])}
+
+
+def get_group_batcher() -> GroupBatcher:
+    """Return the process-wide batcher merging lookups by city ID"""
+    global _group_batcher
+    if _group_batcher is None:
+        with _group_batcher_lock:
+            if _group_batcher is None:
+                _group_batcher = GroupBatcher(_fetch_group, window=settings.WEATHER_GROUP_WINDOW)
+    return _group_batcher
+
 class WeatherService:
     def __init__(self):
         self.api_key = settings.OPENWEATHER_API_KEY
         self.base_url = settings.OPENWEATHER_BASE_URL
         self.cache_timeout = settings.WEATHER_CACHE_TIMEOUT
+        self.stale_timeout = settings.WEATHER_CACHE_STALE_TIMEOUT
 
     def get_weather(self, city: str, country: str = '', ip_address: str = None) -> Tuple[Dict, bool]:
         """Get weather data for a city with caching"""
+        weather_data, is_cached = self._get_weather(city, country, ip_address)
+        with profiling.phase('access_log'):
+            access_log.record(weather_data, weather_data['cache_status'], ip_address)
+        return weather_data, is_cached
+
+    def _get_weather(self, city: str, country: str = '', ip_address: str = None) -> Tuple[Dict, bool]:
+        with profiling.phase('cache'):
+            cache_key = self._get_cache_key(city, country)
+            entry = caching.unwrap(caching.get_weather_cache().get(cache_key))
+        if entry:
+            if caching.is_stale(entry):
+                logger.info("Stale cache hit for %s, %s", city, country, extra=HOT)
+                metrics.CACHE_LOOKUPS.labels(result=caching.STALE).inc()
+                self._schedule_refresh(cache_key, city, country)
+                return {**entry['data'], 'cache_status': caching.STALE}, True
+
+            if caching.should_refresh_early(entry, settings.WEATHER_CACHE_XFETCH_BETA):
+                self._schedule_refresh(cache_key, city, country)
+            logger.info("Cache hit for %s, %s", city, country, extra=HOT)
+            metrics.CACHE_LOOKUPS.labels(result=caching.FRESH).inc()
+            return {**entry['data'], 'cache_status': caching.FRESH}, True
+
+        metrics.CACHE_LOOKUPS.labels(result='miss').inc()
+
+        # Concurrent misses for the same key share one upstream fetch
+        (weather_data, is_cached), shared = _inflight.do(
+            cache_key, lambda: self._load(cache_key, city, country, ip_address)
+        )
+        cache_status = caching.FRESH if is_cached or shared else caching.REFRESHED
+        return {**weather_data, 'cache_status': cache_status}, is_cached or shared
+
+    def get_weather_at(self, lat: float, lon: float, ip_address: str = None) -> Tuple[Dict, bool]:
+        """Get weather data for coordinates with caching.
+
+        The point snaps to a geohash cell. A cell already mapped to a place,
+        or whose centre is within WEATHER_GEO_RADIUS_KM of a city this
+        process has fetched, is served that city's cached weather; only
+        unknown areas go upstream, once per cell.
+        """
+        cell, center_lat, center_lon = geo.snap(lat, lon)
+        place = locations.resolve_cell(cell) or self._nearby_place(cell, center_lat, center_lon)
+        if place is not None:
+            return self.get_weather(place['city'], place['country'], ip_address)
+
+        metrics.CACHE_LOOKUPS.labels(result='miss').inc()
+        cache_key = f"weather:@{cell}"
+        (weather_data, is_cached), shared = _inflight.do(cache_key, lambda: self._load(
+            cache_key, f"@{cell}", '', ip_address, fetch=lambda: self._fetch_at(cell, center_lat, center_lon)
+        ))
+        cache_status = caching.FRESH if is_cached or shared else caching.REFRESHED
+        weather_data = {**weather_data, 'cache_status': cache_status}
+        access_log.record(weather_data, cache_status, ip_address)
+        return weather_data, is_cached or shared
+
+    @staticmethod
+    def _nearby_place(cell: str, lat: float, lon: float) -> Optional[Dict]:
+        place = geo.get_index().nearest(lat, lon, settings.WEATHER_GEO_RADIUS_KM)
+        if place is not None:
+            locations.learn_cell(cell, place)
+        return place
+
+    def get_weather_batch(self, queries: List[Dict], ip_address: str = None) -> List:
+        """Get weather for many cities at once.
+
+        Hits are resolved with a single cache.get_many, misses are fetched
+        concurrently (at most WEATHER_BATCH_CONCURRENCY at a time) and their
+        history rows written with one bulk_create. Returns one item per
+        query, in order: a (weather_data, is_cached) tuple or the
+        exception raised for that query.
+        """
+        cache_keys = [self._get_cache_key(query['city'], query.get('country', '')) for query in queries]
+        entries = caching.get_weather_cache().get_many(list(set(cache_keys)))
+
+        resolved = {}
+        misses = {}
+        for cache_key, query in zip(cache_keys, queries):
+            entry = caching.unwrap(entries.get(cache_key))
+            if entry is None:
+                misses.setdefault(cache_key, query)
+            elif cache_key not in resolved:
+                city, country = query['city'], query.get('country', '')
+                if caching.is_stale(entry):
+                    self._schedule_refresh(cache_key, city, country)
+                    resolved[cache_key] = ({**entry['data'], 'cache_status': caching.STALE}, True)
+                else:
+                    if caching.should_refresh_early(entry, settings.WEATHER_CACHE_XFETCH_BETA):
+                        self._schedule_refresh(cache_key, city, country)
+                    resolved[cache_key] = ({**entry['data'], 'cache_status': caching.FRESH}, True)
+
+        for cache_key in cache_keys:
+            result = 'miss' if cache_key in misses else resolved[cache_key][0]['cache_status']
+            metrics.CACHE_LOOKUPS.labels(result=result).inc()
+        if misses:
+            resolved.update(self._load_many(misses, ip_address))
+        logger.info("Batch weather request: %s items, %s upstream fetches", len(queries), len(misses), extra=HOT)
+
+        results = []
+        for cache_key in cache_keys:
+            result = resolved[cache_key]
+            if not isinstance(result, Exception):
+                # Repeated cities each get their own copy of the data
+                result = (dict(result[0]), result[1])
+                access_log.record(result[0], result[0]['cache_status'], ip_address)
+            results.append(result)
+        return results
+
+    def _load_many(self, misses: Dict[str, Dict], ip_address: str = None) -> Dict:
+        """Fetch the missed keys concurrently, then record and cache them in bulk.
+
+        Like _load for a single miss, only keys whose cross-worker lock this
+        call holds are fetched; keys another worker or thread is already
+        fetching (a concurrent batch or get_weather) are waited for, so every
+        city costs one upstream call and one history row.
+        """
+        with ExitStack() as locks:
+            owned, elsewhere = {}, {}
+            for cache_key, query in misses.items():
+                acquired = locks.enter_context(cache_lock(f"{cache_key}:lock", settings.WEATHER_FETCH_LOCK_TIMEOUT))
+                (owned if acquired else elsewhere)[cache_key] = query
+            results = self._fetch_many(owned, ip_address) if owned else {}
+        for cache_key, query in elsewhere.items():
+            results[cache_key] = self._wait_or_load(cache_key, query, ip_address)
+        return results
+
+    def _fetch_many(self, owned: Dict[str, Dict], ip_address: str = None) -> Dict:
+        """Fetch, record and cache keys whose lock is held by the caller"""
+        results = {}
+        # The keys may have been filled between our miss and the lock
+        for cache_key, entry in caching.get_weather_cache().get_many(list(owned)).items():
+            entry = caching.unwrap(entry)
+            if entry and not caching.is_stale(entry):
+                results[cache_key] = ({**entry['data'], 'cache_status': caching.FRESH}, True)
+                del owned[cache_key]
+        if not owned:
+            return results
+
+        def fetch(query):
+            started = time.monotonic()
+            try:
+                return self._fetch_from_api(query['city'], query.get('country', '')), time.monotonic() - started
+            except Exception as e:
+                logger.error("Error fetching weather for %s, %s: %s", query['city'], query.get('country', ''), e)
+                return e, None
+
+        workers = min(settings.WEATHER_BATCH_CONCURRENCY, len(owned))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            fetched = dict(zip(owned, pool.map(fetch, owned.values())))
+
+        results.update((key, data) for key, (data, _) in fetched.items() if isinstance(data, Exception))
+        succeeded = [(key, data, delta) for key, (data, delta) in fetched.items() if key not in results]
+        if not succeeded:
+            return results
+
+        timestamps = history.record_many([self._history_fields(data, ip_address) for _, data, _ in succeeded])
+        entries = {}
+        for (key, data, delta), timestamp in zip(succeeded, timestamps):
+            data['timestamp'] = timestamp
+            entries.update(self._entries_for(key, caching.make_entry(data, self.cache_timeout, delta)))
+            results[key] = ({**data, 'cache_status': caching.REFRESHED}, False)
+        caching.get_weather_cache().set_many(entries, self.stale_timeout)
+        return results
+
+    def _wait_or_load(self, cache_key: str, query: Dict, ip_address: str = None):
+        """Result of a key locked elsewhere: the holder's entry, else a load of our own"""
+        with profiling.phase('wait'):
+            entry = caching.unwrap(caching.get_weather_cache().codec.decode(
+                wait_for_cache(cache_key, f"{cache_key}:lock", settings.WEATHER_FETCH_WAIT_TIMEOUT)
+            ))
+        if entry:
+            return {**entry['data'], 'cache_status': caching.FRESH}, True
+        # The holder failed or timed out
+        city, country = query['city'], query.get('country', '')
+        try:
+            (data, is_cached), shared = _inflight.do(cache_key, lambda: self._load(cache_key, city, country, ip_address))
+        except Exception as e:
+            return e  # Logged by _load
+        cache_status = caching.FRESH if is_cached or shared else caching.REFRESHED
+        return {**data, 'cache_status': cache_status}, is_cached or shared
+
+    @staticmethod
+    def _refresh_key(cache_key: str) -> str:
+        """Marker set while a background refresh of cache_key is scheduled"""
+        return f"{cache_key}:refresh"
+
+    def refresh(self, city: str, country: str = '', scheduled: bool = False) -> bool:
+        """Refetch a cached entry in the background, keeping the stale copy until done.
+
+        scheduled is set when _schedule_refresh started this refresh, which
+        then clears its marker. Returns whether the entry was refetched.
+        """
         cache_key = self._get_cache_key(city, country)
-        
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            logger.info(f"Cache hit for {city}, {country}")
-            return cached_data, True
+        try:
+            (_, is_cached), _ = _inflight.do(cache_key, lambda: self._load(cache_key, city, country, force=True))
+            return not is_cached
+        except Exception:
+            # The stale entry keeps being served until the hard timeout
+            return False
+        finally:
+            if scheduled:
+                cache.delete(self._refresh_key(cache_key))
+
+    def _schedule_refresh(self, cache_key: str, city: str, country: str) -> None:
+        """Start at most one background refresh per key across all workers"""
+        if get_client().breaker.state == CircuitBreaker.OPEN:
+            return  # Keep serving the stale entry until the upstream recovers
+        if not cache.add(self._refresh_key(cache_key), 1, settings.WEATHER_FETCH_LOCK_TIMEOUT):
+            return
+
+        if settings.WEATHER_REFRESH_BACKEND == 'celery':
+            from .tasks import refresh_weather_cache
+            refresh_weather_cache.delay(city, country)
+        else:
+            threading.Thread(target=self._refresh_in_thread, args=(city, country), daemon=True).start()
 
+    def _refresh_in_thread(self, city: str, country: str) -> None:
         try:
-            weather_data = self._fetch_from_api(city, country)
-
-            weather_query = WeatherQuery.objects.create(
-                city=weather_data['city'],
-                country=weather_data['country'],
-                temperature=weather_data['temperature'],
-                description=weather_data['description'],
-                humidity=weather_data['humidity'],
-                pressure=weather_data['pressure'],
-                wind_speed=weather_data['wind_speed'],
-                ip_address=ip_address
-            )
-            
-            weather_data['timestamp'] = weather_query.timestamp
-            cache.set(cache_key, weather_data, self.cache_timeout)
-            
-            logger.info(f"API call successful for {city}, {country}")
-            return weather_data, False
+            self.refresh(city, country, scheduled=True)
+        finally:
+            connection.close()
 
-        except Exception as e:
-            logger.error(f"Error fetching weather for {city}, {country}: {str(e)}")
-            raise  # Re-raise para que a view possa tratar
+    def _load(self, cache_key: str, city: str, country: str, ip_address: str = None,
+              force: bool = False, fetch: Optional[Callable[[], Dict]] = None) -> Tuple[Dict, bool]:
+        """Fetch, record and cache weather data while holding the cross-worker lock"""
+        lock_key = f"{cache_key}:lock"
+        with cache_lock(lock_key, settings.WEATHER_FETCH_LOCK_TIMEOUT) as acquired:
+            if not acquired:
+                # Another worker is fetching this key; wait for its result
+                with profiling.phase('wait'):
+                    entry = caching.unwrap(caching.get_weather_cache().codec.decode(
+                        wait_for_cache(cache_key, lock_key, settings.WEATHER_FETCH_WAIT_TIMEOUT)
+                    ))
+                if entry:
+                    logger.info("Cache filled by another worker for %s, %s", city, country)
+                    return entry['data'], True
+            elif not force:
+                # The key may have been filled between our miss and the lock
+                entry = caching.unwrap(caching.get_weather_cache().get(cache_key))
+                if entry and not caching.is_stale(entry):
+                    return entry['data'], True
+
+            try:
+                started = time.monotonic()
+                with profiling.phase('upstream'):
+                    weather_data = fetch() if fetch else self._fetch_from_api(city, country)
+
+                weather_data['timestamp'] = history.record(self._history_fields(weather_data, ip_address))
+                entry = caching.make_entry(weather_data, self.cache_timeout, time.monotonic() - started)
+                with profiling.phase('cache'):
+                    caching.get_weather_cache().set_many(self._entries_for(cache_key, entry), self.stale_timeout)
+
+                logger.info("API call successful for %s, %s", city, country)
+                return weather_data, False
+
+            except UpstreamUnavailable as e:
+                entry = caching.unwrap(caching.get_weather_cache().get(cache_key))
+                if entry:
+                    logger.warning("Upstream unavailable, serving cached weather for %s, %s: %s", city, country, e)
+                    return entry['data'], True
+                logger.error("Error fetching weather for %s, %s: %s", city, country, e)
+                raise
+            except Exception as e:
+                logger.error("Error fetching weather for %s, %s: %s", city, country, e)
+                raise  # Re-raise para que a view possa tratar
 
     def _fetch_from_api(self, city: str, country: str = '') -> Dict:
         """Fetch weather data from OpenWeatherMap API"""
+        params = self._build_params(city, country)
+
+        if settings.WEATHER_GROUP_WINDOW > 0:
+            alias = locations.resolve(city, country)
+            if alias and alias['id']:
+                try:
+                    return self._parse_weather(get_group_batcher().fetch(alias['id']))
+                except LookupError:
+                    pass  # Not returned by /group; look it up by name instead
+
+        response = get_client().get(f"{self.base_url}/weather", params=params)
+        data = self._check_response(response, params['q'])
+        locations.learn(city, country, data)
+        return self._parse_weather(data)
+
+    def _fetch_at(self, cell: str, lat: float, lon: float) -> Dict:
+        """Fetch weather for the centre of a geohash cell and map the cell to the place returned"""
+        params = self._build_coordinate_params(lat, lon)
+        response = get_client().get(f"{self.base_url}/weather", params=params)
+        data = self._check_place(self._check_response(response, f"{lat:.4f},{lon:.4f}"), lat, lon)
+        locations.learn(data['name'], data['sys']['country'], data)
+        locations.learn_cell(cell, locations.place(data))
+        return self._parse_weather(data)
+
+    def _build_coordinate_params(self, lat: float, lon: float) -> Dict:
+        if not self.api_key:
+            raise ValueError("OpenWeatherMap API key not configured")
+
+        return {
+            'lat': round(lat, 4),
+            'lon': round(lon, 4),
+            'appid': self.api_key,
+            'units': 'metric'
+        }
+
+    @staticmethod
+    def _check_place(data: Dict, lat: float, lon: float) -> Dict:
+        """Coordinates far from any named place (open sea) come back without a name"""
+        if not data.get('name'):
+            raise ValueError(f"City not found near {lat:.4f},{lon:.4f}")
+        return data
+
+    def _build_params(self, city: str, country: str = '') -> Dict:
         if not self.api_key:
             raise ValueError("OpenWeatherMap API key not configured")
 
@@ -55,14 +375,15 @@ class WeatherService:
         if country:
             query += f",{country.strip()}"
 
-        params = {
+        return {
             'q': query,
             'appid': self.api_key,
             'units': 'metric'
         }
 
-        response = requests.get(f"{self.base_url}/weather", params=params, timeout=10)
-
+    @staticmethod
+    def _check_response(response, query: str) -> Dict:
+        """Raise for OpenWeatherMap error statuses, return the decoded body"""
         if response.status_code == 404:
             raise ValueError(f"City '{query}' not found")
         elif response.status_code == 401:
@@ -70,8 +391,11 @@ class WeatherService:
         elif response.status_code != 200:
             raise ValueError(f"API error: {response.status_code}")
 
-        data = response.json()
+        return response.json()
 
+    @staticmethod
+    def _parse_weather(data: Dict) -> Dict:
+        """Map one OpenWeatherMap city payload (/weather or a /group item) to our weather data"""
         return {
             'city': data['name'],
             'country': data['sys']['country'],
@@ -82,14 +406,163 @@ class WeatherService:
             'wind_speed': round(data.get('wind', {}).get('speed', 0), 1),
         }
 
+    @staticmethod
+    def _history_fields(weather_data: Dict, ip_address: str = None) -> Dict:
+        """WeatherQuery fields for a fetched weather payload"""
+        return {
+            'city': weather_data['city'],
+            'country': weather_data['country'],
+            'temperature': weather_data['temperature'],
+            'description': weather_data['description'],
+            'humidity': weather_data['humidity'],
+            'pressure': weather_data['pressure'],
+            'wind_speed': weather_data['wind_speed'],
+            'ip_address': ip_address,
+        }
+
     def _get_cache_key(self, city: str, country: str = '') -> str:
-        """Generate cache key for city/country combination"""
-        key = f"weather:{city.strip().lower()}"
-        if country:
-            key += f":{country.strip().lower()}"
-        return key
+        """Generate cache key for city/country combination.
+
+        Inputs are folded (case, accents, whitespace) and, once an upstream
+        response has shown which place they mean, mapped to that place's
+        canonical key, so every spelling shares one entry.
+        """
+        return locations.key_for(city, country, locations.resolve(city, country))
+
+    @staticmethod
+    def _entries_for(cache_key: str, entry: Dict) -> Dict:
+        """The entry under the requested key and under the canonical key of the place returned"""
+        canonical_key = locations.cache_key(entry['data']['city'], entry['data']['country'])
+        return {cache_key: entry, canonical_key: entry}
 
     @staticmethod
     def get_query_history(limit: int = 10) -> list:
         """Get recent weather queries"""
         return WeatherQuery.get_recent_queries(limit)
+
+
+class AsyncWeatherService(WeatherService):
+    """Non-blocking WeatherService for async views served through ASGI.
+
+    Uses the async HTTP client, async cache calls and the async ORM, so a
+    worker keeps serving other requests while upstream fetches are in flight.
+    """
+
+    async def get_weather(self, city: str, country: str = '', ip_address: str = None) -> Tuple[Dict, bool]:
+        """Get weather data for a city with caching"""
+        weather_data, is_cached = await self._aget_weather(city, country, ip_address)
+        with profiling.phase('access_log'):
+            await access_log.arecord(weather_data, weather_data['cache_status'], ip_address)
+        return weather_data, is_cached
+
+    async def _aget_weather(self, city: str, country: str = '', ip_address: str = None) -> Tuple[Dict, bool]:
+        with profiling.phase('cache'):
+            cache_key = locations.key_for(city, country, await locations.aresolve(city, country))
+            entry = caching.unwrap(await caching.get_weather_cache().aget(cache_key))
+        if entry:
+            if caching.is_stale(entry):
+                logger.info("Stale cache hit for %s, %s", city, country, extra=HOT)
+                metrics.CACHE_LOOKUPS.labels(result=caching.STALE).inc()
+                await self._aschedule_refresh(cache_key, city, country)
+                return {**entry['data'], 'cache_status': caching.STALE}, True
+
+            if caching.should_refresh_early(entry, settings.WEATHER_CACHE_XFETCH_BETA):
+                await self._aschedule_refresh(cache_key, city, country)
+            logger.info("Cache hit for %s, %s", city, country, extra=HOT)
+            metrics.CACHE_LOOKUPS.labels(result=caching.FRESH).inc()
+            return {**entry['data'], 'cache_status': caching.FRESH}, True
+
+        metrics.CACHE_LOOKUPS.labels(result='miss').inc()
+
+        (weather_data, is_cached), shared = await _async_inflight.do(
+            cache_key, lambda: self._aload(cache_key, city, country, ip_address)
+        )
+        cache_status = caching.FRESH if is_cached or shared else caching.REFRESHED
+        return {**weather_data, 'cache_status': cache_status}, is_cached or shared
+
+    async def get_weather_at(self, lat: float, lon: float, ip_address: str = None) -> Tuple[Dict, bool]:
+        """Async variant of WeatherService.get_weather_at"""
+        cell, center_lat, center_lon = geo.snap(lat, lon)
+        place = await locations.aresolve_cell(cell) or await self._anearby_place(cell, center_lat, center_lon)
+        if place is not None:
+            return await self.get_weather(place['city'], place['country'], ip_address)
+
+        metrics.CACHE_LOOKUPS.labels(result='miss').inc()
+        cache_key = f"weather:@{cell}"
+        (weather_data, is_cached), shared = await _async_inflight.do(cache_key, lambda: self._aload(
+            cache_key, f"@{cell}", '', ip_address, fetch=lambda: self._afetch_at(cell, center_lat, center_lon)
+        ))
+        cache_status = caching.FRESH if is_cached or shared else caching.REFRESHED
+        weather_data = {**weather_data, 'cache_status': cache_status}
+        await access_log.arecord(weather_data, cache_status, ip_address)
+        return weather_data, is_cached or shared
+
+    @staticmethod
+    async def _anearby_place(cell: str, lat: float, lon: float) -> Optional[Dict]:
+        place = geo.get_index().nearest(lat, lon, settings.WEATHER_GEO_RADIUS_KM)
+        if place is not None:
+            await locations.alearn_cell(cell, place)
+        return place
+
+    async def _aschedule_refresh(self, cache_key: str, city: str, country: str) -> None:
+        # Refreshes run in a thread or Celery, same as the sync service
+        await sync_to_async(self._schedule_refresh, thread_sensitive=False)(cache_key, city, country)
+
+    async def _aload(self, cache_key: str, city: str, country: str, ip_address: str = None,
+                     fetch: Optional[Callable] = None) -> Tuple[Dict, bool]:
+        """Async variant of WeatherService._load"""
+        lock_key = f"{cache_key}:lock"
+        async with async_cache_lock(lock_key, settings.WEATHER_FETCH_LOCK_TIMEOUT) as acquired:
+            if not acquired:
+                with profiling.phase('wait'):
+                    entry = caching.unwrap(caching.get_weather_cache().codec.decode(
+                        await async_wait_for_cache(cache_key, lock_key, settings.WEATHER_FETCH_WAIT_TIMEOUT)
+                    ))
+                if entry:
+                    logger.info("Cache filled by another worker for %s, %s", city, country)
+                    return entry['data'], True
+            else:
+                entry = caching.unwrap(await caching.get_weather_cache().aget(cache_key))
+                if entry and not caching.is_stale(entry):
+                    return entry['data'], True
+
+            try:
+                started = time.monotonic()
+                with profiling.phase('upstream'):
+                    weather_data = await (fetch() if fetch else self._afetch_from_api(city, country))
+
+                weather_data['timestamp'] = await history.arecord(self._history_fields(weather_data, ip_address))
+                entry = caching.make_entry(weather_data, self.cache_timeout, time.monotonic() - started)
+                with profiling.phase('cache'):
+                    await caching.get_weather_cache().aset_many(self._entries_for(cache_key, entry), self.stale_timeout)
+
+                logger.info("API call successful for %s, %s", city, country)
+                return weather_data, False
+
+            except UpstreamUnavailable as e:
+                entry = caching.unwrap(await caching.get_weather_cache().aget(cache_key))
+                if entry:
+                    logger.warning("Upstream unavailable, serving cached weather for %s, %s: %s", city, country, e)
+                    return entry['data'], True
+                logger.error("Error fetching weather for %s, %s: %s", city, country, e)
+                raise
+            except Exception as e:
+                logger.error("Error fetching weather for %s, %s: %s", city, country, e)
+                raise
+
+    async def _afetch_from_api(self, city: str, country: str = '') -> Dict:
+        """Fetch weather data from OpenWeatherMap API without blocking the event loop"""
+        params = self._build_params(city, country)
+        response = await get_async_client().get(f"{self.base_url}/weather", params=params)
+        data = self._check_response(response, params['q'])
+        await locations.alearn(city, country, data)
+        return self._parse_weather(data)
+
+    async def _afetch_at(self, cell: str, lat: float, lon: float) -> Dict:
+        """Async variant of WeatherService._fetch_at"""
+        params = self._build_coordinate_params(lat, lon)
+        response = await get_async_client().get(f"{self.base_url}/weather", params=params)
+        data = self._check_place(self._check_response(response, f"{lat:.4f},{lon:.4f}"), lat, lon)
+        await locations.alearn(data['name'], data['sys']['country'], data)
+        await locations.alearn_cell(cell, locations.place(data))
+        return self._parse_weather(data)
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import history
+from .models import WeatherQuery
+
+# Rows written through weather.history invalidate the cached payload
+# themselves (bulk_create sends no signals); these cover other writers
+# such as the admin, the shell and tests.
+
+@receiver(post_save, sender=WeatherQuery)
+@receiver(post_delete, sender=WeatherQuery)
+def invalidate_recent_history(sender, **kwargs):
+    history.invalidate_recent()
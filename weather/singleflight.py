@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from django.core.cache import cache
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into a single execution.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait and share its result or exception.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run fn once per key in flight. Returns (result, shared)."""
+        with self._mutex:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._mutex:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight for coroutines on one event loop"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        call = self._calls.get(key)
+        if call is not None:
+            return await asyncio.shield(call), True
+
+        call = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        except Exception as e:
+            call.set_exception(e)
+            call.exception()  # Mark retrieved when no follower is waiting
+            raise
+        finally:
+            del self._calls[key]
+        call.set_result(result)
+        return result, False
+
+
+@contextmanager
+def cache_lock(key: str, timeout: int):
+    """Best-effort cross-worker lock stored in the cache backend.
+
+    Yields True when the lock was acquired. ``cache.add`` is atomic on both
+    Redis (SET NX) and LocMemCache, and the timeout frees the lock if the
+    holder dies.
+    """
+    token = uuid.uuid4().hex
+    acquired = cache.add(key, token, timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired and cache.get(key) == token:
+            cache.delete(key)
+
+
+def wait_for_cache(key: str, lock_key: str, timeout: float, interval: float = 0.05):
+    """Poll the cache until key is filled or the lock holder goes away."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if cache.get(lock_key) is None:
+            return cache.get(key)
+        time.sleep(interval)
+    return None
+
+
+@asynccontextmanager
+async def async_cache_lock(key: str, timeout: int):
+    """Async variant of cache_lock"""
+    token = uuid.uuid4().hex
+    acquired = await cache.aadd(key, token, timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired and await cache.aget(key) == token:
+            await cache.adelete(key)
+
+
+async def async_wait_for_cache(key: str, lock_key: str, timeout: float, interval: float = 0.05):
+    """Async variant of wait_for_cache"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = await cache.aget(key)
+        if value is not None:
+            return value
+        if await cache.aget(lock_key) is None:
+            return await cache.aget(key)
+        await asyncio.sleep(interval)
+    return None
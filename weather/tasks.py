@@ -1,36 +1,109 @@
 
 from celery import shared_task
 import logging
-from .models import WeatherQuery
+from django.conf import settings
+from . import access_log, history, prewarm, rollups
+from .models import WeatherAccess, WeatherQuery
+from .retention import prune
+from .services import WeatherService
 
 logger = logging.getLogger('weather')
 
 @shared_task
 def cleanup_old_weather_queries():
     """
-    Celery task to cleanup old weather queries.
-    Keeps only the last 100 queries to prevent database bloat.
+    Celery task to cleanup old weather queries and access log rows.
+    Applies WEATHER_HISTORY_RETENTION_ROWS / _DAYS and
+    WEATHER_ACCESS_RETENTION_DAYS, deleting in bounded primary key batches
+    so the tables stay writable while it runs. Rows not yet rolled up are
+    kept (with a warning).
     """
     try:
-        initial_count = WeatherQuery.objects.count() 
-
-        keep_last = 100
-        ids_to_keep = WeatherQuery.objects.order_by('-id')[:keep_last].values_list('id', flat=True)
-        deleted_count, _ = WeatherQuery.objects.exclude(id__in=ids_to_keep).delete()
+        deleted = prune(
+            WeatherQuery,
+            keep_rows=settings.WEATHER_HISTORY_RETENTION_ROWS,
+            max_age_days=settings.WEATHER_HISTORY_RETENTION_DAYS,
+            chunk_size=settings.WEATHER_RETENTION_CHUNK_SIZE,
+            pause=settings.WEATHER_RETENTION_CHUNK_PAUSE,
+            keep_unrolled=True,
+        )
+        access_deleted = prune(
+            WeatherAccess,
+            max_age_days=settings.WEATHER_ACCESS_RETENTION_DAYS,
+            chunk_size=settings.WEATHER_RETENTION_CHUNK_SIZE,
+            pause=settings.WEATHER_RETENTION_CHUNK_PAUSE,
+            keep_unrolled=True,
+        )
 
-        final_count = WeatherQuery.objects.count()
+        if deleted:
+            history.invalidate_recent()
 
-        logger.info(
-            f"Cleanup completed. "
-            f"Initial: {initial_count}, Deleted: {deleted_count}, Remaining: {final_count}"
-        )
+        logger.info("Cleanup completed. Deleted: %s queries, %s access rows", deleted, access_deleted)
 
         return {
-            "initial": initial_count,
-            "deleted": deleted_count,
-            "remaining": final_count
+            "deleted": deleted,
+            "access_deleted": access_deleted
         }
 
     except Exception:
         logger.exception("Error in cleanup task")
-        raise
\ No newline at end of file
+        raise
+
+@shared_task
+def refresh_weather_cache(city, country=''):
+    """
+    Celery task to refresh a stale weather cache entry in the background.
+    """
+    WeatherService().refresh(city, country, scheduled=True)
+
+@shared_task
+def flush_weather_history():
+    """
+    Celery task to write queued weather history rows in bulk.
+    Only does work when WEATHER_HISTORY_WRITE_MODE is 'redis' (or 'memory'
+    inside this worker process).
+    """
+    written = history.flush()
+    if written:
+        logger.info("Flushed %s weather history rows", written)
+    return written
+
+@shared_task
+def compact_access_log():
+    """
+    Celery task to move buffered access log entries (cache hits included)
+    into the WeatherAccess table with bulk inserts.
+    """
+    written = access_log.compact()
+    if written:
+        logger.info("Compacted %s access log entries", written)
+    return written
+
+@shared_task
+def prewarm_weather_cache():
+    """
+    Celery task to refresh the entries of the most requested cities before
+    they expire, spending at most WEATHER_PREWARM_BUDGET_PER_MINUTE upstream
+    calls per minute. Cities left over are picked up by the next run.
+    """
+    cities = prewarm.popular_cities(settings.WEATHER_PREWARM_TOP_N, settings.WEATHER_PREWARM_WINDOW_DAYS)
+    stats = prewarm.warm(
+        cities,
+        prewarm.UpstreamBudget(settings.WEATHER_PREWARM_BUDGET_PER_MINUTE),
+        # Entries that would expire before the next run are refreshed now
+        horizon=settings.WEATHER_PREWARM_INTERVAL + 30,
+    )
+    logger.info("Pre-warm completed for %s cities: %s", len(cities), stats)
+    return stats
+
+@shared_task
+def update_weather_rollups():
+    """
+    Celery task to fold the weather queries and access rows written since
+    the last run into the hourly and daily WeatherRollup rows, in batches of
+    WEATHER_ROLLUP_BATCH_SIZE.
+    """
+    folded = rollups.update_all(settings.WEATHER_ROLLUP_BATCH_SIZE)
+    if any(folded.values()):
+        logger.info("Updated weather rollups: %s", folded)
+    return folded
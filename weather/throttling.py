@@ -0,0 +1,112 @@
+import threading
+from typing import Tuple
+from django.core.cache import cache, caches
+from rest_framework.throttling import AnonRateThrottle, SimpleRateThrottle, UserRateThrottle
+from . import metrics
+
+# Sliding window counter, atomically: allow if the previous window's count,
+# weighted by how much of it still overlaps the sliding window, plus the
+# current window's count is below the limit; count the request if allowed.
+SLIDING_WINDOW_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+if previous * tonumber(ARGV[2]) + current >= tonumber(ARGV[1]) then
+    return {0, current, previous}
+end
+current = redis.call('INCR', KEYS[1])
+if current == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return {1, current, previous}
+"""
+
+_script = None
+_script_lock = threading.Lock()
+_local_lock = threading.Lock()
+
+
+def _redis_script():
+    """The registered script when the default cache is django_redis, None otherwise"""
+    global _script
+    if not type(caches['default']).__module__.startswith('django_redis'):
+        return None
+    if _script is None:
+        with _script_lock:
+            if _script is None:
+                from django_redis import get_redis_connection
+                _script = get_redis_connection('default').register_script(SLIDING_WINDOW_SCRIPT)
+    return _script
+
+
+def _hit_local(current_key: str, previous_key: str, limit: int, weight: float, ttl: int) -> Tuple[bool, int, int]:
+    """Same as the script on any Django cache; atomic within this process only"""
+    with _local_lock:
+        counts = cache.get_many([current_key, previous_key])
+        current, previous = counts.get(current_key, 0), counts.get(previous_key, 0)
+        if previous * weight + current >= limit:
+            return False, current, previous
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            cache.set(current_key, 1, ttl)
+            current = 1
+        return True, current, previous
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """SimpleRateThrottle with O(1) cost per request.
+
+    Same rates, scopes and cache keys as DRF's throttles, but instead of a
+    list of request timestamps it keeps one counter per client and window
+    of `duration` seconds. The request count over the last `duration`
+    seconds is estimated as the current window's count plus the previous
+    window's count weighted by its overlap. On django_redis the check and
+    the increment are one Lua script call; other backends fall back to
+    get_many/incr under a process-local lock.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        window = int(now // self.duration)
+        self.elapsed = now - window * self.duration
+        weight = 1 - self.elapsed / self.duration
+        # Hash tag keeps both windows of a client in one Redis Cluster slot
+        current_key, previous_key = f"{{{self.key}}}:{window}", f"{{{self.key}}}:{window - 1}"
+
+        script = _redis_script()
+        if script is not None:
+            allowed, self.current, self.previous = script(
+                keys=[current_key, previous_key], args=[self.num_requests, weight, self.duration * 2]
+            )
+        else:
+            allowed, self.current, self.previous = _hit_local(
+                current_key, previous_key, self.num_requests, weight, self.duration * 2
+            )
+        if not allowed:
+            metrics.THROTTLED.labels(scope=self.scope).inc()
+        return bool(allowed)
+
+    def wait(self):
+        """Seconds until the estimate drops below the limit again"""
+        if self.num_requests == 0:
+            return self.duration  # A '0/<period>' rate never lets a request through
+        if self.current < self.num_requests and self.previous:
+            # The previous window's weight shrinks until one more request fits
+            return max(0.0, self.duration * (1 - (self.num_requests - self.current) / self.previous) - self.elapsed)
+        # This window is full by itself: wait for it to become the previous one and decay
+        return self.duration - self.elapsed + max(0.0, self.duration * (1 - self.num_requests / self.current))
+
+
+class AnonWindowThrottle(SlidingWindowThrottle, AnonRateThrottle):
+    """AnonRateThrottle ('anon' rate, keyed by client IP) on a sliding window counter"""
+
+
+class UserWindowThrottle(SlidingWindowThrottle, UserRateThrottle):
+    """UserRateThrottle ('user' rate, keyed by user or IP) on a sliding window counter"""
@@ -3,6 +3,13 @@ from . import views
 
 urlpatterns = [
     path('weather/', views.get_current_weather, name='current-weather'),
+    path('weather/batch/', views.get_weather_batch, name='weather-batch'),
+    path('weather/async/', views.get_current_weather_async, name='current-weather-async'),
+    path('weather/series/', views.get_weather_series, name='weather-series'),
+    path('weather/stats/', views.get_weather_stats, name='weather-stats'),
+    path('weather/analytics/', views.weather_analytics, name='weather-analytics'),
+    path('weather/export/', views.export_weather_history, name='weather-export'),
     path('weather/history/', views.get_weather_history, name='weather-history'),
+    path('cache/stats/', views.cache_stats, name='cache-stats'),
     path('health/', views.health_check, name='health-check'),
 ]
\ No newline at end of file
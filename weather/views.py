@@ -1,23 +1,54 @@
 from django.shortcuts import render
+import json
 import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import add_never_cache_headers, get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from rest_framework import status
-from rest_framework.decorators import api_view, throttle_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.exceptions import Throttled
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
 from django.views.decorators.cache import never_cache
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from .services import WeatherService
+from . import analytics, caching, export, history, metrics, profiling, rollups, series
+from .services import AsyncWeatherService, WeatherService
+from .http_client import UpstreamUnavailable
+from .log import HOT
+from .renderers import render_weather
+from .throttling import AnonWindowThrottle, UserWindowThrottle
 from .serializers import (
     WeatherRequestSerializer, 
     WeatherResponseSerializer, 
-    WeatherQuerySerializer
+    WeatherQuerySerializer,
+    WeatherBatchRequestSerializer,
+    WeatherBatchItemSerializer,
+    WeatherSeriesRequestSerializer,
+    WeatherExportRequestSerializer,
+    WeatherStatsRequestSerializer,
+    WeatherAnalyticsRequestSerializer
 )
-from .models import WeatherQuery
 
 logger = logging.getLogger('weather')
 
+def error_status(exc):
+    """HTTP status for an error raised while getting weather"""
+    if isinstance(exc, ValueError):
+        return status.HTTP_404_NOT_FOUND if 'not found' in str(exc) else status.HTTP_400_BAD_REQUEST
+    if isinstance(exc, UpstreamUnavailable):
+        return status.HTTP_503_SERVICE_UNAVAILABLE
+    return status.HTTP_500_INTERNAL_SERVER_ERROR
+
+def _location(params):
+    """City and country of a weather request, coordinates standing in for the city in logs"""
+    if 'lat' in params:
+        return f"{params['lat']},{params['lon']}", ''
+    return params['city'], params.get('country', '')
+
 def get_client_ip(request):
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
     if x_forwarded_for:
@@ -33,59 +64,369 @@ def get_client_ip(request):
         200: WeatherResponseSerializer,
         400: 'Bad Request',
         404: 'City not found',
-        429: 'Rate limit exceeded'
+        429: 'Rate limit exceeded',
+        503: 'Weather provider unavailable'
     },
-    operation_description="Get current weather for a city with 10-minute caching"
+    operation_description="Get current weather for a city, or for coordinates (lat/lon), with 10-minute caching"
 )
 @api_view(['POST'])
-@throttle_classes([AnonRateThrottle, UserRateThrottle])
+@throttle_classes([AnonWindowThrottle, UserWindowThrottle])
 @never_cache
 def get_current_weather(request):
-    serializer = WeatherRequestSerializer(data=request.data)
-    if not serializer.is_valid():
+    with profiling.phase('validate'):
+        serializer = WeatherRequestSerializer(data=request.data)
+        valid = serializer.is_valid()
+    if not valid:
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    city = serializer.validated_data['city']
-    country = serializer.validated_data.get('country', '')
+    params = serializer.validated_data
+    city, country = _location(params)
     ip_address = get_client_ip(request)
     
     try:
         weather_service = WeatherService()
-        weather_data, is_cached = weather_service.get_weather(city, country, ip_address)
+        if 'lat' in params:
+            weather_data, is_cached = weather_service.get_weather_at(params['lat'], params['lon'], ip_address)
+        else:
+            weather_data, is_cached = weather_service.get_weather(city, country, ip_address)
         
+        logger.info("Weather request for %s, %s from IP %s - Cached: %s", city, country, ip_address, is_cached,
+                    extra=HOT)
+        if is_cached and settings.WEATHER_FAST_JSON and request.accepted_renderer.format == 'json':
+            # Same bytes as the serializer path, without serializing the payload again
+            with metrics.timed(metrics.SERIALIZE_SECONDS, view='current-weather'), profiling.phase('render'):
+                body = render_weather(weather_data, is_cached)
+            if body is not None:
+                return HttpResponse(body, content_type='application/json')
+
         weather_data['cached'] = is_cached
-        response_serializer = WeatherResponseSerializer(weather_data)
-        
-        logger.info(f"Weather request for {city}, {country} from IP {ip_address} - Cached: {is_cached}")
-        return Response(response_serializer.data, status=status.HTTP_200_OK)
+        with metrics.timed(metrics.SERIALIZE_SECONDS, view='current-weather'), profiling.phase('render'):
+            payload = WeatherResponseSerializer(weather_data).data
+        return Response(payload, status=status.HTTP_200_OK)
     except ValueError as e:
-        logger.warning(f"Weather request failed for {city}, {country}: {str(e)}")
+        logger.warning("Weather request failed for %s, %s: %s", city, country, e)
+        metrics.count_error(e)
         return Response(
             {'error': str(e)}, 
             status=status.HTTP_404_NOT_FOUND if 'not found' in str(e) else status.HTTP_400_BAD_REQUEST
         )
+    except UpstreamUnavailable as e:
+        logger.warning("Weather provider unavailable for %s, %s: %s", city, country, e)
+        metrics.count_error(e)
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     except Exception as e:
-        logger.error(f"Unexpected error for {city}, {country}: {str(e)}")
+        logger.error("Unexpected error for %s, %s: %s", city, country, e)
+        metrics.count_error(e)
         return Response({'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@swagger_auto_schema(
+    method='post',
+    request_body=WeatherBatchRequestSerializer,
+    responses={
+        200: WeatherBatchItemSerializer(many=True),
+        400: 'Bad Request',
+        429: 'Rate limit exceeded'
+    },
+    operation_description="Get current weather for many cities at once. Results (or per-item errors) are returned in request order"
+)
+@api_view(['POST'])
+@throttle_classes([AnonWindowThrottle, UserWindowThrottle])
+@never_cache
+def get_weather_batch(request):
+    serializer = WeatherBatchRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    locations = serializer.validated_data['items']
+    ip_address = get_client_ip(request)
+
+    try:
+        results = WeatherService().get_weather_batch(locations, ip_address)
+    except Exception as e:
+        logger.error("Unexpected error in batch weather request: %s", e)
+        metrics.count_error(e)
+        return Response({'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    items = []
+    for loc, result in zip(locations, results):
+        item = {'city': loc['city'], 'country': loc.get('country', '')}
+        if isinstance(result, Exception):
+            metrics.count_error(result)
+            item['status'] = error_status(result)
+            item['error'] = str(result) if item['status'] != status.HTTP_500_INTERNAL_SERVER_ERROR else 'Internal server error'
+        else:
+            weather_data, is_cached = result
+            weather_data['cached'] = is_cached
+            item['status'] = status.HTTP_200_OK
+            item['data'] = weather_data
+        items.append(item)
+
+    logger.info("Batch weather request for %s cities from IP %s", len(locations), ip_address, extra=HOT)
+    with metrics.timed(metrics.SERIALIZE_SECONDS, view='weather-batch'):
+        payload = WeatherBatchItemSerializer(items, many=True).data
+    return Response(payload, status=status.HTTP_200_OK)
+
+def _check_throttles(request):
+    """Apply the DRF throttles outside of an @api_view, like APIView.check_throttles.
+
+    Every throttle sees the request, so each one records it. Returns None
+    when allowed, else the Throttled error with the longest wait.
+    """
+    durations = [
+        throttle.wait() for throttle in (AnonWindowThrottle(), UserWindowThrottle())
+        if not throttle.allow_request(request, None)
+    ]
+    if not durations:
+        return None
+    return Throttled(max((duration for duration in durations if duration is not None), default=None))
+
+async def get_current_weather_async(request):
+    """Async variant of get_current_weather for ASGI deployments.
+
+    DRF views are sync-only, so this is a plain Django coroutine view that
+    reuses the DRF serializers and throttles with the same responses.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    # Throttles touch request.user (session lookup), so they run in a thread
+    throttled = await sync_to_async(_check_throttles)(request)
+    if throttled:
+        response = JsonResponse({'detail': throttled.detail}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        if throttled.wait:
+            response['Retry-After'] = '%d' % throttled.wait
+        return response
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'detail': 'JSON parse error'}, status=status.HTTP_400_BAD_REQUEST)
+
+    with profiling.phase('validate'):
+        serializer = WeatherRequestSerializer(data=data)
+        valid = serializer.is_valid()
+    if not valid:
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    params = serializer.validated_data
+    city, country = _location(params)
+    ip_address = get_client_ip(request)
+
+    try:
+        service = AsyncWeatherService()
+        if 'lat' in params:
+            weather_data, is_cached = await service.get_weather_at(params['lat'], params['lon'], ip_address)
+        else:
+            weather_data, is_cached = await service.get_weather(city, country, ip_address)
+
+        weather_data['cached'] = is_cached
+        with metrics.timed(metrics.SERIALIZE_SECONDS, view='current-weather-async'), profiling.phase('render'):
+            payload = WeatherResponseSerializer(weather_data).data
+
+        logger.info("Weather request for %s, %s from IP %s - Cached: %s", city, country, ip_address, is_cached,
+                    extra=HOT)
+        response = JsonResponse(payload, status=status.HTTP_200_OK)
+    except ValueError as e:
+        logger.warning("Weather request failed for %s, %s: %s", city, country, e)
+        metrics.count_error(e)
+        response = JsonResponse(
+            {'error': str(e)},
+            status=status.HTTP_404_NOT_FOUND if 'not found' in str(e) else status.HTTP_400_BAD_REQUEST
+        )
+    except UpstreamUnavailable as e:
+        logger.warning("Weather provider unavailable for %s, %s: %s", city, country, e)
+        metrics.count_error(e)
+        response = JsonResponse({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except Exception as e:
+        logger.error("Unexpected error for %s, %s: %s", city, country, e)
+        metrics.count_error(e)
+        response = JsonResponse({'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    add_never_cache_headers(response)
+    return response
+
+# csrf_exempt/never_cache only wrap async views from Django 5.0 on
+get_current_weather_async.csrf_exempt = True
+
 @swagger_auto_schema(
     method='get',
-    responses={200: WeatherQuerySerializer(many=True)},
-    operation_description="Get the last 10 weather queries"
+    responses={200: WeatherQuerySerializer(many=True), 304: 'Not Modified'},
+    operation_description="Get the last 10 weather queries. Supports If-None-Match / If-Modified-Since"
 )
 @api_view(['GET'])
-@throttle_classes([AnonRateThrottle, UserRateThrottle])
+@throttle_classes([AnonWindowThrottle, UserWindowThrottle])
 def get_weather_history(request):
     try:
-        queries = WeatherQuery.get_recent_queries(10)
-        serializer = WeatherQuerySerializer(queries, many=True)
-        
-        logger.info(f"Weather history requested from IP {get_client_ip(request)}")
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Pre-encoded JSON, rebuilt only after new rows are inserted
+        payload = history.recent_payload()
+        last_modified = payload['last_modified']
+
+        response = get_conditional_response(
+            request,
+            etag=payload['etag'],
+            last_modified=int(last_modified) if last_modified else None,
+        )
+        if response is None:
+            response = HttpResponse(payload['body'], content_type='application/json')
+        response['ETag'] = payload['etag']
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+
+        logger.info("Weather history requested from IP %s", get_client_ip(request))
+        return response
     except Exception as e:
-        logger.error(f"Error fetching weather history: {str(e)}")
+        logger.error("Error fetching weather history: %s", e)
         return Response({'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter('city', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True),
+        openapi.Parameter('country', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+        openapi.Parameter('from', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME, required=True),
+        openapi.Parameter('to', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+        openapi.Parameter('bucket', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(series.BUCKETS)),
+    ],
+    responses={200: openapi.Response('Per-bucket temperature, humidity, pressure and wind aggregates'), 400: 'Bad Request'},
+    operation_description="Downsampled series of the stored weather queries of a city. Streamed, oldest bucket first"
+)
+@api_view(['GET'])
+@throttle_classes([AnonWindowThrottle, UserWindowThrottle])
+def get_weather_series(request):
+    serializer = WeatherSeriesRequestSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    params = serializer.validated_data
+    place = series.resolve_city(params['city'], params.get('country', ''))
+    header = {**place, 'bucket': params['bucket'], 'from': params['from'], 'to': params['to']}
+
+    logger.info("Weather series for %s, %s (%s) from IP %s", place['city'], place['country'], params['bucket'], get_client_ip(request))
+    return StreamingHttpResponse(
+        series.stream_series(place['city'], place['country'], params['from'], params['to'], params['bucket'], header),
+        content_type='application/json',
+    )
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter('city', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+        openapi.Parameter('country', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+        openapi.Parameter('period', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['hour', 'day']),
+        openapi.Parameter('from', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+        openapi.Parameter('to', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+    ],
+    responses={200: openapi.Response('Per-bucket stats of a city, or per-city totals without one'), 400: 'Bad Request'},
+    operation_description=(
+        "Request counts and min/max/avg temperature per hour or day, read from the rollups only. "
+        "Defaults to the last day (hour) or 30 days (day); may lag the raw tables by about a minute"
+    )
+)
+@api_view(['GET'])
+@throttle_classes([AnonWindowThrottle, UserWindowThrottle])
+def get_weather_stats(request):
+    serializer = WeatherStatsRequestSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    params = serializer.validated_data
+    body = {'period': params['period'], 'from': params['from'], 'to': params['to']}
+    if params.get('city'):
+        place = series.resolve_city(params['city'], params.get('country', ''))
+        body.update(place)
+        body['buckets'] = rollups.bucket_stats(params['period'], params['from'], params['to'], place['city'], place['country'])
+    else:
+        body['cities'] = rollups.city_stats(params['period'], params['from'], params['to'])
+    return Response(body)
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter('city', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+        openapi.Parameter('country', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+        openapi.Parameter('from', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+        openapi.Parameter('to', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+        openapi.Parameter('window', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='rolling mean window, in samples'),
+        openapi.Parameter('threshold', openapi.IN_QUERY, type=openapi.TYPE_NUMBER, description='z-score flagged as anomaly'),
+        openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='anomalies returned'),
+    ],
+    responses={200: openapi.Response('Per-city statistics and temperature anomalies'), 400: 'Bad Request', 403: 'Staff only'},
+    operation_description=(
+        "Per-city temperature statistics, trend and rolling mean, plus z-score anomalies, "
+        "computed with NumPy over the stored weather queries. Defaults to the last 30 days. Staff only"
+    )
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def weather_analytics(request):
+    serializer = WeatherAnalyticsRequestSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        analytics.check_available()
+    except ImportError:
+        return Response({'error': "Analytics are not available on this server"}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    params = serializer.validated_data
+    place = {'city': None, 'country': None}
+    if params.get('city'):
+        place = series.resolve_city(params['city'], params.get('country', ''))
+    loaded = analytics.load_history(place['city'], place['country'], params['from'], params['to'])
+    body = analytics.report(loaded, params['window'], params['threshold'], params['limit'])
+
+    logger.info("Weather analytics over %s rows requested by %s", len(loaded), request.user)
+    return Response({'from': params['from'], 'to': params['to'], **body})
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter('output', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(export.EXPORT_FORMATS)),
+        openapi.Parameter('city', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+        openapi.Parameter('country', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+        openapi.Parameter('from', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+        openapi.Parameter('to', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+    ],
+    responses={200: openapi.Response('Weather query history file'), 400: 'Bad Request', 403: 'Staff only'},
+    operation_description="Stream the weather query history as CSV, NDJSON or Parquet. Staff only"
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_weather_history(request):
+    serializer = WeatherExportRequestSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    params = serializer.validated_data
+    output = params['output']
+    try:
+        export.check_output(output)
+    except ImportError:
+        return Response({'error': f"{output} export is not available on this server"}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    place = {'city': None, 'country': params.get('country')}
+    if params.get('city'):
+        place = series.resolve_city(params['city'], params.get('country', ''))
+    rows = export.export_rows(place['city'], place['country'], params.get('from'), params.get('to'))
+    content_type, extension = export.EXPORT_FORMATS[output]
+    response = StreamingHttpResponse(export.export_chunks(output, rows), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="weather_history.{extension}"'
+
+    logger.info("Weather history export (%s) requested by %s", output, request.user)
+    return response
+
+@swagger_auto_schema(
+    method='get',
+    responses={200: openapi.Response('Cache hit counters for this worker')},
+    operation_description="Get L1 (per-process) and L2 (shared) cache hit ratios of the serving worker. Staff only"
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@never_cache
+def cache_stats(request):
+    return Response(caching.get_weather_cache().stats())
+
 @swagger_auto_schema(
     method='get',
     responses={200: openapi.Response('API Health Status')},
@@ -98,3 +439,13 @@ def health_check(request):
         'timestamp': timezone.now(),
         'version': '1.0.0'
     })
+
+def prometheus_metrics(request):
+    """Prometheus exposition of the weather metrics, summed over all workers.
+
+    A plain Django view: scrapes must not be throttled or content-negotiated.
+    """
+    body, content_type = metrics.render()
+    response = HttpResponse(body, content_type=content_type)
+    add_never_cache_headers(response)
+    return response
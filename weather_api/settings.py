@@ -21,6 +21,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the request histogram includes every other middleware
+    'weather.middleware.MetricsMiddleware',
+    'weather.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,14 +84,37 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+CELERY_BEAT_SCHEDULE = {
+    'flush-weather-history': {
+        'task': 'weather.tasks.flush_weather_history',
+        'schedule': config('WEATHER_HISTORY_FLUSH_INTERVAL', default=2.0, cast=float),
+    },
+    'compact-access-log': {
+        'task': 'weather.tasks.compact_access_log',
+        'schedule': 60.0,
+    },
+    'cleanup-weather-history': {
+        'task': 'weather.tasks.cleanup_old_weather_queries',
+        'schedule': config('WEATHER_RETENTION_INTERVAL', default=3600.0, cast=float),
+    },
+    'prewarm-weather-cache': {
+        'task': 'weather.tasks.prewarm_weather_cache',
+        'schedule': config('WEATHER_PREWARM_INTERVAL', default=300.0, cast=float),
+    },
+    'update-weather-rollups': {
+        'task': 'weather.tasks.update_weather_rollups',
+        'schedule': config('WEATHER_ROLLUP_INTERVAL', default=60.0, cast=float),
+    },
+}
 
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        # Same rates and scopes as DRF's Anon/UserRateThrottle, O(1) per request
+        'weather.throttling.AnonWindowThrottle',
+        'weather.throttling.UserWindowThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/hour', # 100 requisições por hora para IPs anônimos
@@ -98,12 +124,147 @@ REST_FRAMEWORK = {
 
 # OpenWeatherMap API
 OPENWEATHER_API_KEY = config('OPENWEATHER_API_KEY', default='')
-OPENWEATHER_BASE_URL = 'https://api.openweathermap.org/data/2.5'
+OPENWEATHER_BASE_URL = config('OPENWEATHER_BASE_URL', default='https://api.openweathermap.org/data/2.5')
 
-# Cache timeout (10 minutes)
+# Pooled keep-alive HTTP client shared by all WeatherService instances
+OPENWEATHER_POOL_SIZE = config('OPENWEATHER_POOL_SIZE', default=10, cast=int)
+# Connections kept open by the async client (ASGI), one pool per event loop
+OPENWEATHER_ASYNC_POOL_SIZE = config('OPENWEATHER_ASYNC_POOL_SIZE', default=200, cast=int)
+OPENWEATHER_KEEPALIVE_IDLE = config('OPENWEATHER_KEEPALIVE_IDLE', default=60, cast=int)
+OPENWEATHER_CONNECT_TIMEOUT = config('OPENWEATHER_CONNECT_TIMEOUT', default=3, cast=float)
+OPENWEATHER_READ_TIMEOUT = config('OPENWEATHER_READ_TIMEOUT', default=5, cast=float)
+# Retries on 429/5xx with jittered exponential backoff
+OPENWEATHER_MAX_RETRIES = config('OPENWEATHER_MAX_RETRIES', default=2, cast=int)
+OPENWEATHER_BACKOFF_BASE = config('OPENWEATHER_BACKOFF_BASE', default=0.2, cast=float)
+OPENWEATHER_BACKOFF_MAX = config('OPENWEATHER_BACKOFF_MAX', default=2, cast=float)
+# Circuit breaker: open after N consecutive failures, retry after the reset timeout
+OPENWEATHER_BREAKER_THRESHOLD = config('OPENWEATHER_BREAKER_THRESHOLD', default=5, cast=int)
+OPENWEATHER_BREAKER_RESET_TIMEOUT = config('OPENWEATHER_BREAKER_RESET_TIMEOUT', default=30, cast=float)
+
+# Cache timeout (10 minutes). After this the entry is stale: it is still
+# served while a background refresh runs, until the hard timeout (30 minutes).
 WEATHER_CACHE_TIMEOUT = 600
+WEATHER_CACHE_STALE_TIMEOUT = config('WEATHER_CACHE_STALE_TIMEOUT', default=1800, cast=int)
+# XFetch early refresh factor (0 disables; >1 refreshes earlier)
+WEATHER_CACHE_XFETCH_BETA = config('WEATHER_CACHE_XFETCH_BETA', default=1.0, cast=float)
+# 'thread' or 'celery' (task weather.tasks.refresh_weather_cache)
+WEATHER_REFRESH_BACKEND = config('WEATHER_REFRESH_BACKEND', default='thread')
+
+# Batch endpoint: max cities per request and concurrent upstream fetches
+# (keep the concurrency within OPENWEATHER_POOL_SIZE)
+WEATHER_BATCH_MAX_ITEMS = config('WEATHER_BATCH_MAX_ITEMS', default=250, cast=int)
+WEATHER_BATCH_CONCURRENCY = config('WEATHER_BATCH_CONCURRENCY', default=10, cast=int)
+
+# Misses for cities whose OpenWeatherMap ID is known go through /group. A miss
+# with no group call in flight is sent at once; misses arriving meanwhile are
+# merged (up to 20 IDs) and sent when it returns or after this many seconds at
+# most; 0 disables
+WEATHER_GROUP_WINDOW = config('WEATHER_GROUP_WINDOW', default=0.05, cast=float)
+# How long a learned input -> canonical place (name, country, ID) alias is kept
+WEATHER_CITY_ID_TIMEOUT = 60 * 60 * 24 * 7
+
+# Coordinate requests snap to a geohash cell of WEATHER_GEO_PRECISION
+# characters (5 is about 4.9 x 4.9 km) and are served the weather of the
+# nearest already-fetched city within WEATHER_GEO_RADIUS_KM of its centre
+WEATHER_GEO_PRECISION = config('WEATHER_GEO_PRECISION', default=5, cast=int)
+WEATHER_GEO_RADIUS_KM = config('WEATHER_GEO_RADIUS_KM', default=10.0, cast=float)
+
+# WeatherQuery history writes: 'sync' (inline insert), 'memory' (per-process
+# buffer flushed by a background thread and at exit) or 'redis' (shared
+# queue flushed by the flush_weather_history Celery beat task)
+WEATHER_HISTORY_WRITE_MODE = config('WEATHER_HISTORY_WRITE_MODE', default='sync')
+WEATHER_HISTORY_BATCH_SIZE = config('WEATHER_HISTORY_BATCH_SIZE', default=500, cast=int)
+WEATHER_HISTORY_FLUSH_INTERVAL = config('WEATHER_HISTORY_FLUSH_INTERVAL', default=2.0, cast=float)
+WEATHER_HISTORY_MAX_BUFFER = config('WEATHER_HISTORY_MAX_BUFFER', default=50000, cast=int)
+
+# Access log: every served request (cache hits included) is appended to a
+# buffered sink, 'redis' (stream) or 'file' (NDJSON per process), and moved
+# into WeatherAccess by the compact_access_log Celery task. 'off' disables.
+# Defaults to 'redis' on the django_redis cache, else 'off'. The file sink
+# needs WEATHER_ACCESS_LOG_DIR set to a directory the Celery worker running
+# compact_access_log can read too (a shared volume), or the files are never
+# compacted.
+WEATHER_ACCESS_LOG_SINK = config(
+    'WEATHER_ACCESS_LOG_SINK',
+    default='redis' if CACHES['default']['BACKEND'].startswith('django_redis.') else 'off',
+)
+WEATHER_ACCESS_LOG_DIR = config('WEATHER_ACCESS_LOG_DIR', default='')
+WEATHER_ACCESS_LOG_BUFFER_SIZE = config('WEATHER_ACCESS_LOG_BUFFER_SIZE', default=1000, cast=int)
+WEATHER_ACCESS_LOG_FLUSH_INTERVAL = config('WEATHER_ACCESS_LOG_FLUSH_INTERVAL', default=1.0, cast=float)
+WEATHER_ACCESS_LOG_STREAM_MAXLEN = config('WEATHER_ACCESS_LOG_STREAM_MAXLEN', default=1000000, cast=int)
+
+# Retention (cleanup_old_weather_queries): keep at most N history rows and/or
+# none older than N days (empty disables a limit). Rows are deleted in batches
+# of WEATHER_RETENTION_CHUNK_SIZE ids, pausing between batches. The task only
+# deletes rows update_weather_rollups has folded into WeatherRollup and warns
+# when that holds rows back.
+def _optional_int(value):
+    return int(value) if value else None
+
+WEATHER_HISTORY_RETENTION_ROWS = config('WEATHER_HISTORY_RETENTION_ROWS', default='100', cast=_optional_int)
+WEATHER_HISTORY_RETENTION_DAYS = config('WEATHER_HISTORY_RETENTION_DAYS', default='', cast=_optional_int)
+WEATHER_ACCESS_RETENTION_DAYS = config('WEATHER_ACCESS_RETENTION_DAYS', default='30', cast=_optional_int)
+WEATHER_RETENTION_CHUNK_SIZE = config('WEATHER_RETENTION_CHUNK_SIZE', default=5000, cast=int)
+WEATHER_RETENTION_CHUNK_PAUSE = config('WEATHER_RETENTION_CHUNK_PAUSE', default=0.05, cast=float)
+
+# Format of weather entries in the shared cache: 'struct' (compact binary),
+# 'msgpack' (needs the msgpack package) or 'pickle'. Any format is readable
+# whatever the setting, so it can be changed on a running deployment.
+WEATHER_CACHE_CODEC = config('WEATHER_CACHE_CODEC', default='struct')
+
+# Answer cache hits of /weather/ (JSON clients) with JSON encoded once per
+# entry and process instead of running the serializer and renderer each time
+WEATHER_FAST_JSON = config('WEATHER_FAST_JSON', default=False, cast=bool)
+
+# Pre-warming: the WEATHER_PREWARM_TOP_N most requested cities of the last
+# WEATHER_PREWARM_WINDOW_DAYS are refreshed before they expire, using at most
+# WEATHER_PREWARM_BUDGET_PER_MINUTE upstream calls per minute (all workers)
+WEATHER_PREWARM_TOP_N = config('WEATHER_PREWARM_TOP_N', default=100, cast=int)
+WEATHER_PREWARM_WINDOW_DAYS = config('WEATHER_PREWARM_WINDOW_DAYS', default=7, cast=float)
+WEATHER_PREWARM_BUDGET_PER_MINUTE = config('WEATHER_PREWARM_BUDGET_PER_MINUTE', default=30, cast=int)
+WEATHER_PREWARM_INTERVAL = config('WEATHER_PREWARM_INTERVAL', default=300.0, cast=float)
+
+# Hourly/daily per-city rollups behind /weather/stats/, folded from new
+# WeatherQuery and WeatherAccess rows by the update_weather_rollups beat task
+WEATHER_ROLLUP_BATCH_SIZE = config('WEATHER_ROLLUP_BATCH_SIZE', default=50000, cast=int)
+
+# Per-process L1 cache in front of the shared cache for weather entries.
+# Entries are dropped after WEATHER_L1_TTL seconds or, with pub/sub (needs
+# Redis), as soon as another worker rewrites them. 0 entries disables L1.
+WEATHER_L1_MAX_ENTRIES = config('WEATHER_L1_MAX_ENTRIES', default=500, cast=int)
+WEATHER_L1_MAX_BYTES = config('WEATHER_L1_MAX_BYTES', default=8 * 1024 * 1024, cast=int)
+WEATHER_L1_TTL = config('WEATHER_L1_TTL', default=30, cast=float)
+WEATHER_L1_PUBSUB = config('WEATHER_L1_PUBSUB', default=False, cast=bool)
+
+# Pre-encoded /weather/history/ payload; rebuilt after inserts, this is a backstop
+WEATHER_HISTORY_CACHE_TIMEOUT = 300
+
+# Single-flight: concurrent misses for the same city share one upstream fetch.
+# Lock held in the cache backend so other workers wait instead of refetching.
+WEATHER_FETCH_LOCK_TIMEOUT = config('WEATHER_FETCH_LOCK_TIMEOUT', default=15, cast=int)
+WEATHER_FETCH_WAIT_TIMEOUT = config('WEATHER_FETCH_WAIT_TIMEOUT', default=10, cast=float)
+
+# Profiling: requests sent with X-Weather-Profile: <WEATHER_PROFILING_TOKEN>,
+# and WEATHER_PROFILING_SAMPLE_RATE of all requests, get a Server-Timing header
+# with their per-phase breakdown; with WEATHER_PROFILING_DIR set, also a
+# cProfile dump there. Both unset (the default) turns the middleware off.
+WEATHER_PROFILING_TOKEN = config('WEATHER_PROFILING_TOKEN', default='')
+WEATHER_PROFILING_SAMPLE_RATE = config('WEATHER_PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+WEATHER_PROFILING_DIR = config('WEATHER_PROFILING_DIR', default='')
 
 # Logging
+# The weather logger only queues records; a listener thread formats them and
+# writes them through the handlers of weather_output. The file is JSON lines,
+# rotated at WEATHER_LOG_MAX_BYTES. Rotation is per process: with several
+# gunicorn workers, give each its own WEATHER_LOG_FILE or rotate externally.
+WEATHER_LOG_FILE = config('WEATHER_LOG_FILE', default='weather_api.log')
+WEATHER_LOG_MAX_BYTES = config('WEATHER_LOG_MAX_BYTES', default=50 * 1024 * 1024, cast=int)
+WEATHER_LOG_BACKUP_COUNT = config('WEATHER_LOG_BACKUP_COUNT', default=5, cast=int)
+# Records queued beyond this are dropped rather than blocking requests
+WEATHER_LOG_QUEUE_SIZE = config('WEATHER_LOG_QUEUE_SIZE', default=10000, cast=int)
+# Share of per-request INFO messages (cache hits, request lines) that are kept
+WEATHER_LOG_SAMPLE_RATE = config('WEATHER_LOG_SAMPLE_RATE', default=0.1, cast=float)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -116,26 +277,50 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'weather.log.JsonFormatter',
+        },
+    },
+    'filters': {
+        'sample_hot': {
+            '()': 'weather.log.SampleFilter',
+            'rate': WEATHER_LOG_SAMPLE_RATE,
+        },
     },
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': 'weather_api.log',
-            'formatter': 'verbose',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': WEATHER_LOG_FILE,
+            'maxBytes': WEATHER_LOG_MAX_BYTES,
+            'backupCount': WEATHER_LOG_BACKUP_COUNT,
+            'encoding': 'utf-8',
+            'formatter': 'json',
         },
         'console': {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        'queue': {
+            'class': 'weather.log.QueueingHandler',
+            'sink': 'weather_output',
+            'maxsize': WEATHER_LOG_QUEUE_SIZE,
+        },
     },
     'loggers': {
         'weather': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
+            'filters': ['sample_hot'],
             'level': 'INFO',
             'propagate': True,
         },
+        # Never logged to directly; holds the handlers the queue listener writes to
+        'weather_output': {
+            'handlers': ['file', 'console'],
+            'level': 'DEBUG',
+            'propagate': False,
+        },
     },
 }
 